@@ -0,0 +1,216 @@
+"""CPU-only stand-in for the Tiger Gemma GPU server.
+
+Serves /generate, /generate_batch, /health and /status with the same
+shapes as the real server, but produces filler text at a configurable
+token rate. Use it to load test the frontend and LLMClient on any box:
+
+    python stub_server.py --port 8000 --tokens-per-second 25 --ttft-ms 400 \
+        --error-rate 0.02 --load-delay 30
+
+Every option can also be set through the matching STUB_* environment
+variable (e.g. STUB_TOKENS_PER_SECOND).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+from config import USERS, IDLE_TIMEOUT_MINUTES
+
+class StubSettings:
+    def __init__(self):
+        self.tokens_per_second = float(os.getenv("STUB_TOKENS_PER_SECOND", "30"))
+        self.ttft_ms = float(os.getenv("STUB_TTFT_MS", "300"))
+        self.error_rate = float(os.getenv("STUB_ERROR_RATE", "0"))
+        self.load_delay = float(os.getenv("STUB_LOAD_DELAY", "0"))
+        self.concurrency = int(os.getenv("STUB_CONCURRENCY", "1"))
+        self.search_replay = os.getenv("STUB_SEARCH_REPLAY")
+
+class GenerateRequest(BaseModel):
+    prompt: str
+    user_type: str = "general"
+    max_length: int = 300
+    temperature: float = 0.7
+    search_enabled: bool = False
+
+class BatchRequest(BaseModel):
+    requests: List[GenerateRequest]
+    stream: bool = False
+
+# Canned results shaped like UserAwareSearchEngine output
+CANNED_SEARCH_RESULTS = {
+    "researcher": [
+        {"source": "wikipedia", "title": "Scientific method", "snippet": "The scientific method is an empirical method for acquiring knowledge.",
+         "url": "https://en.wikipedia.org/wiki/Scientific_method", "relevance": 0.95, "type": "academic"},
+        {"source": "duckduckgo", "title": "Peer review - overview", "snippet": "Peer review is the evaluation of work by one or more people with similar competencies.",
+         "url": "https://example.org/peer-review", "relevance": 0.8, "type": "academic"}
+    ],
+    "student": [
+        {"source": "duckduckgo", "title": "Beginner guide", "snippet": "A step-by-step introduction with simple examples.",
+         "url": "https://example.org/beginner-guide", "relevance": 0.85, "type": "educational"}
+    ],
+    "business": [
+        {"source": "duckduckgo", "title": "Market trends analysis 2024", "snippet": "Key market trends and growth drivers for the coming year.",
+         "url": "https://example.org/market-trends", "relevance": 0.8, "type": "business"}
+    ],
+    "shopping": [
+        {"source": "shopping", "title": "Laptop kaufen | Amazon.de", "snippet": "Laptops online kaufen bei Amazon.de.",
+         "url": "https://www.amazon.de/s?k=laptop", "relevance": 1.0, "site": "Amazon", "type": "product_link"},
+        {"source": "shopping", "title": "Laptop Preisvergleich | Idealo", "snippet": "Laptop Preisvergleich bei idealo.de.",
+         "url": "https://www.idealo.de/preisvergleich/laptop", "relevance": 1.0, "site": "Idealo", "type": "product_link"},
+        {"source": "shopping", "title": "Laptop | eBay", "snippet": "Tolle Angebote bei eBay für Laptop.",
+         "url": "https://www.ebay.de/sch/laptop", "relevance": 0.95, "site": "eBay", "type": "product_link"}
+    ]
+}
+
+FILLER_WORDS = ("the model considers the question and outlines a structured answer with "
+                "relevant points sources and examples for the user").split()
+
+class StubModel:
+    """Simulated model: loading phase, token timing, injected failures"""
+
+    def __init__(self, settings: StubSettings):
+        self.settings = settings
+        self.started_at = time.time()
+        self.last_activity = time.time()
+        self.requests_served = 0
+        self.errors_injected = 0
+        self.in_flight = 0
+        self._gpu = asyncio.Semaphore(settings.concurrency)
+        self._replay = self._load_replay(settings.search_replay)
+
+    @property
+    def model_loaded(self) -> bool:
+        return time.time() - self.started_at >= self.settings.load_delay
+
+    def _load_replay(self, path: Optional[str]) -> Dict[str, itertools.cycle]:
+        """Load recorded search results (JSON lines of {"user_type", "search_results"})"""
+        if not path:
+            return {}
+        by_user: Dict[str, List[List[Dict]]] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    by_user.setdefault(entry["user_type"], []).append(entry["search_results"])
+        return {user_type: itertools.cycle(results) for user_type, results in by_user.items()}
+
+    def search_results(self, user_type: str) -> List[Dict]:
+        if user_type in self._replay:
+            return next(self._replay[user_type])
+        return CANNED_SEARCH_RESULTS.get(user_type, [])
+
+    async def generate(self, request: GenerateRequest) -> Dict:
+        if not self.model_loaded:
+            raise HTTPException(status_code=503, detail="Model is still loading")
+
+        self.last_activity = time.time()
+        self.in_flight += 1
+        try:
+            async with self._gpu:
+                started = time.perf_counter()
+                await asyncio.sleep(self.settings.ttft_ms / 1000)
+
+                if random.random() < self.settings.error_rate:
+                    self.errors_injected += 1
+                    raise HTTPException(status_code=500, detail="Injected stub failure")
+
+                tokens = random.randint(max(1, request.max_length // 2), max(1, request.max_length))
+                await asyncio.sleep(tokens / self.settings.tokens_per_second)
+
+                name = USERS.get(request.user_type, {}).get("name", "Assistant")
+                words = [FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(tokens)]
+                search_results = self.search_results(request.user_type) if request.search_enabled else []
+
+                self.requests_served += 1
+                return {
+                    "response": f"[{name} stub] " + " ".join(words),
+                    "search_results": search_results,
+                    "search_used": bool(search_results),
+                    "tokens_generated": tokens,
+                    "generation_time": round(time.perf_counter() - started, 3)
+                }
+        finally:
+            self.in_flight -= 1
+            self.last_activity = time.time()
+
+def create_app(settings: Optional[StubSettings] = None) -> FastAPI:
+    settings = settings or StubSettings()
+    app = FastAPI(title="Tiger Gemma stub server")
+    model = StubModel(settings)
+    app.state.model = model
+
+    @app.get("/health")
+    async def health():
+        if not model.model_loaded:
+            return JSONResponse(status_code=503, content={"status": "loading"})
+        return {"status": "healthy", "model_loaded": True}
+
+    @app.get("/status")
+    async def status():
+        idle_seconds = time.time() - model.last_activity
+        return {
+            "status": "ready" if model.model_loaded else "loading",
+            "model_loaded": model.model_loaded,
+            "uptime_seconds": round(time.time() - model.started_at, 1),
+            "requests_served": model.requests_served,
+            "errors_injected": model.errors_injected,
+            "in_flight": model.in_flight,
+            "idle_seconds": round(idle_seconds, 1),
+            "shutdown_in_seconds": round(IDLE_TIMEOUT_MINUTES * 60 - idle_seconds, 1)
+        }
+
+    @app.post("/generate")
+    async def generate(request: GenerateRequest):
+        return await model.generate(request)
+
+    @app.post("/generate_batch")
+    async def generate_batch(batch: BatchRequest):
+        async def run(index: int, request: GenerateRequest):
+            try:
+                return {"index": index, "result": await model.generate(request)}
+            except HTTPException as e:
+                return {"index": index, "error": e.detail}
+
+        tasks = [asyncio.create_task(run(i, r)) for i, r in enumerate(batch.requests)]
+
+        if not batch.stream:
+            return {"results": [await task for task in tasks]}
+
+        async def stream():
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    return app
+
+def main():
+    defaults = StubSettings()
+    parser = argparse.ArgumentParser(description="CPU-only stand-in for the Tiger Gemma server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--ttft-ms", type=float, default=defaults.ttft_ms, help="time to first token")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="fraction of failed generations")
+    parser.add_argument("--load-delay", type=float, default=defaults.load_delay, help="simulated model loading seconds")
+    parser.add_argument("--concurrency", type=int, default=defaults.concurrency, help="parallel generations")
+    parser.add_argument("--search-replay", default=defaults.search_replay, help="JSON lines of recorded search results")
+    args = parser.parse_args()
+
+    for key in ("tokens_per_second", "ttft_ms", "error_rate", "load_delay", "concurrency", "search_replay"):
+        setattr(defaults, key, getattr(args, key))
+
+    import uvicorn
+    uvicorn.run(create_app(defaults), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+class QueueFull(Exception):
+    pass
+
+class AdmissionTimeout(Exception):
+    pass
+
+class AdmissionCancelled(Exception):
+    pass
+
+class Ticket:
+    """One generation waiting for, or holding, a backend slot"""
+
+    def __init__(self, ticket_id: int, persona: str, owner: str, tag: float, slots: int = 1):
+        self.id = ticket_id
+        self.persona = persona
+        self.owner = owner
+        self.tag = tag
+        # Backend slots held once admitted, e.g. one per prompt of a batch
+        self.slots = slots
+        self.state = "waiting"  # waiting, admitted, cancelled, done
+        self.enqueued_at = time.time()
+        self.admitted_at: Optional[float] = None
+        self.heartbeat = time.monotonic()
+        self.admitted = threading.Event()
+
+class AdmissionQueue:
+    """Bounded, fair admission control in front of the GPU server.
+
+    At most concurrency generations reach the backend at once; the rest
+    wait in a queue of at most max_queue tickets, max_per_owner of them
+    per session. Waiting tickets are ordered by weighted fair queueing:
+    each owner's tickets get increasing virtual tags, so sessions take
+    turns instead of first come first served, and a persona with a larger
+    weight (USERS queue_weight) gets proportionally more turns. A ticket
+    for several slots (a batch) advances its owner's tags by as many
+    turns and is admitted once that many slots are free.
+
+    Waiters poll with a heartbeat. A ticket whose waiter stopped polling
+    for abandon_seconds, e.g. because its session went away, is dropped
+    instead of taking a slot.
+    """
+
+    def __init__(self, concurrency: int = 1, max_queue: int = 32, max_per_owner: int = 2,
+                 weights: Optional[Dict[str, float]] = None, abandon_seconds: float = 15,
+                 concurrency_source: Optional[Callable[[], int]] = None):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_per_owner = max_per_owner
+        self.weights = weights or {}
+        self.abandon_seconds = abandon_seconds
+        self.concurrency_source = concurrency_source
+        self.waiting: List[Ticket] = []
+        self.running: Dict[int, Ticket] = {}
+        self.virtual_time = 0.0
+        self.last_tag: Dict[str, float] = {}
+        # Moving average of the time a generation holds its slot, for wait estimates
+        self.avg_service_seconds = 20.0
+        self.admitted_total = 0
+        self.rejected_total = 0
+        self.abandoned_total = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def limit(self) -> int:
+        """Current number of backend slots"""
+        return max(1, self.concurrency_source() if self.concurrency_source else self.concurrency)
+
+    def depth(self) -> int:
+        """Waiting tickets, e.g. as BackendPool.waiting_source"""
+        with self._lock:
+            return len(self.waiting)
+
+    def submit(self, persona: str, owner: str, slots: int = 1) -> Ticket:
+        """Queue a request for slots backend slots, or raise QueueFull"""
+        with self._lock:
+            queued = sum(1 for t in self.waiting if t.owner == owner)
+            if len(self.waiting) >= self.max_queue or queued >= self.max_per_owner:
+                self.rejected_total += 1
+                raise QueueFull("The GPU server is busy, please try again in a moment")
+            tag = max(self.virtual_time, self.last_tag.get(owner, 0.0)) + slots / self.weights.get(persona, 1.0)
+            self.last_tag[owner] = tag
+            ticket = Ticket(next(self._ids), persona, owner, tag, slots)
+            self.waiting.append(ticket)
+        self._dispatch()
+        return ticket
+
+    def _dispatch(self):
+        """Admit the lowest-tag waiting tickets while slots are free"""
+        limit = self.limit()
+        with self._lock:
+            now = time.monotonic()
+            abandoned = [t for t in self.waiting if now - t.heartbeat > self.abandon_seconds]
+            for ticket in abandoned:
+                ticket.state = "cancelled"
+                self.waiting.remove(ticket)
+            self.abandoned_total += len(abandoned)
+
+            while self.waiting:
+                ticket = min(self.waiting, key=lambda t: (t.tag, t.id))
+                # A ticket larger than the whole limit runs alone rather than never
+                if self._used() + min(ticket.slots, limit) > limit:
+                    break
+                self.waiting.remove(ticket)
+                self.virtual_time = ticket.tag
+                ticket.state = "admitted"
+                ticket.admitted_at = time.time()
+                self.running[ticket.id] = ticket
+                self.admitted_total += 1
+                ticket.admitted.set()
+            # Owners whose last tag is behind the virtual clock no longer affect ordering
+            self.last_tag = {owner: tag for owner, tag in self.last_tag.items() if tag > self.virtual_time}
+
+    def _used(self) -> int:
+        return sum(t.slots for t in self.running.values())
+
+    def position(self, ticket: Ticket) -> Dict:
+        """1-based place in line and estimated seconds until admission"""
+        limit = self.limit()
+        with self._lock:
+            if ticket.state != "waiting":
+                return {"position": 0, "eta_seconds": 0.0, "waiting": len(self.waiting)}
+            ahead = sum(1 for t in self.waiting if (t.tag, t.id) < (ticket.tag, ticket.id))
+            rounds = math.ceil((ahead + 1) / limit)
+            return {"position": ahead + 1, "eta_seconds": round(rounds * self.avg_service_seconds, 1),
+                    "waiting": len(self.waiting)}
+
+    def wait(self, ticket: Ticket, timeout: float = 120, poll_seconds: float = 1.0,
+             on_wait: Optional[Callable[[Dict], None]] = None):
+        """Block until admitted; on_wait gets the position on every poll"""
+        deadline = time.monotonic() + timeout
+        while not ticket.admitted.is_set():
+            if ticket.state == "cancelled":
+                raise AdmissionCancelled("Request was cancelled while waiting")
+            if time.monotonic() >= deadline:
+                raise AdmissionTimeout(f"Still waiting for the GPU server after {timeout:.0f}s")
+            ticket.heartbeat = time.monotonic()
+            if on_wait:
+                on_wait(self.position(ticket))
+            # Picks up slots added by a scaled-out pool as well as released ones
+            self._dispatch()
+            ticket.admitted.wait(min(poll_seconds, max(0.0, deadline - time.monotonic())))
+
+    def release(self, ticket: Ticket):
+        """Give the slot back, or withdraw a ticket that is still waiting"""
+        with self._lock:
+            if ticket.state == "admitted":
+                self.running.pop(ticket.id, None)
+                service = time.time() - ticket.admitted_at
+                self.avg_service_seconds = 0.8 * self.avg_service_seconds + 0.2 * service
+                ticket.state = "done"
+            elif ticket.state == "waiting":
+                self.waiting.remove(ticket)
+                ticket.state = "cancelled"
+        self._dispatch()
+
+    def cancel_owner(self, owner: str) -> int:
+        """Withdraw every waiting ticket of a session, e.g. when it ends"""
+        with self._lock:
+            cancelled = [t for t in self.waiting if t.owner == owner]
+            for ticket in cancelled:
+                ticket.state = "cancelled"
+                self.waiting.remove(ticket)
+            self.last_tag.pop(owner, None)
+        return len(cancelled)
+
+    @contextmanager
+    def slot(self, persona: str, owner: str, timeout: float = 120,
+             on_wait: Optional[Callable[[Dict], None]] = None, slots: int = 1) -> Iterator[Ticket]:
+        """Hold backend slots for the duration of the block.
+
+        Any exception while waiting, including the one Streamlit raises in
+        on_wait when the session reruns or disconnects, withdraws the ticket.
+        """
+        ticket = self.submit(persona, owner, slots)
+        try:
+            self.wait(ticket, timeout, on_wait=on_wait)
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def status(self) -> Dict:
+        limit = self.limit()
+        with self._lock:
+            return {
+                "limit": limit,
+                "running": self._used(),
+                "waiting": len(self.waiting),
+                "waiting_by_persona": {p: sum(1 for t in self.waiting if t.persona == p)
+                                       for p in sorted({t.persona for t in self.waiting})},
+                "avg_service_seconds": round(self.avg_service_seconds, 1),
+                "admitted": self.admitted_total,
+                "rejected": self.rejected_total,
+                "abandoned": self.abandoned_total
+            }
@@ -0,0 +1,136 @@
+import csv
+import json
+from typing import Dict, Iterator, List, Optional, TextIO
+
+from database import DatabaseManager
+
+# strftime patterns that truncate a rollup hour to the requested bucket
+GRANULARITIES = {
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d",
+    "week": "%Y-W%W",
+    "month": "%Y-%m"
+}
+
+USAGE_FIELDS = ["period", "user_type", "messages", "user_messages", "searches",
+                "shopping_links", "responses", "avg_response_chars"]
+
+class UsageAnalytics:
+    """Read-only queries over the usage_hourly rollups.
+
+    Never touches messages or conversations, so reports and exports stay
+    cheap however large the chat history gets.
+    """
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+
+    def _filters(self, since: Optional[str], until: Optional[str],
+                 user_types: Optional[List[str]]) -> tuple:
+        clauses, params = [], []
+        if since:
+            clauses.append("hour >= ?")
+            params.append(since)
+        if until:
+            clauses.append("hour < ?")
+            params.append(until)
+        if user_types:
+            clauses.append(f"user_type IN ({','.join('?' * len(user_types))})")
+            params.extend(user_types)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def iter_usage(self, granularity: str = "hour", since: Optional[str] = None,
+                   until: Optional[str] = None, user_types: Optional[List[str]] = None,
+                   batch_size: int = 500) -> Iterator[Dict]:
+        """Yield usage rows per period and persona, oldest first"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}")
+
+        where, params = self._filters(since, until, user_types)
+        with self.db_manager.connection() as conn:
+            cursor = conn.execute(f'''
+                SELECT strftime(?, hour) AS period, user_type, SUM(messages), SUM(user_messages),
+                       SUM(searches), SUM(shopping_links), SUM(responses), SUM(response_chars)
+                FROM usage_hourly{where}
+                GROUP BY period, user_type
+                ORDER BY period, user_type
+            ''', (GRANULARITIES[granularity], *params))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for period, user_type, messages, user_messages, searches, links, responses, chars in rows:
+                    yield {
+                        "period": period,
+                        "user_type": user_type,
+                        "messages": messages,
+                        "user_messages": user_messages,
+                        "searches": searches,
+                        "shopping_links": links,
+                        "responses": responses,
+                        "avg_response_chars": round(chars / responses, 1) if responses else 0.0
+                    }
+
+    def get_usage(self, granularity: str = "hour", since: Optional[str] = None,
+                  until: Optional[str] = None, user_types: Optional[List[str]] = None) -> List[Dict]:
+        return list(self.iter_usage(granularity, since, until, user_types))
+
+    def get_totals(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, Dict]:
+        """Totals per persona over the whole range"""
+        where, params = self._filters(since, until, None)
+        with self.db_manager.connection() as conn:
+            rows = conn.execute(f'''
+                SELECT user_type, SUM(messages), SUM(searches), SUM(shopping_links),
+                       SUM(responses), SUM(response_chars), COUNT(*)
+                FROM usage_hourly{where} GROUP BY user_type
+            ''', params).fetchall()
+
+        return {
+            user_type: {
+                "messages": messages,
+                "searches": searches,
+                "shopping_links": links,
+                "avg_response_chars": round(chars / responses, 1) if responses else 0.0,
+                "active_hours": active_hours
+            }
+            for user_type, messages, searches, links, responses, chars, active_hours in rows
+        }
+
+    def get_demand_profile(self, since: Optional[str] = None, until: Optional[str] = None,
+                           user_types: Optional[List[str]] = None) -> Dict[tuple, float]:
+        """Mean messages per (weekday, hour of day), weekday 0 = Sunday as in strftime('%w')"""
+        where, params = self._filters(since, until, user_types)
+        with self.db_manager.connection() as conn:
+            span = conn.execute(f'''
+                SELECT julianday(MAX(hour)) - julianday(MIN(hour)) FROM usage_hourly{where}
+            ''', params).fetchone()[0]
+            rows = conn.execute(f'''
+                SELECT CAST(strftime('%w', hour) AS INTEGER), CAST(strftime('%H', hour) AS INTEGER),
+                       SUM(messages)
+                FROM usage_hourly{where} GROUP BY 1, 2
+            ''', params).fetchall()
+
+        # Every weekday occurs about span/7 times in the covered range
+        weeks = max(1.0, ((span or 0) + 1) / 7)
+        return {(weekday, hour): round(messages / weeks, 3) for weekday, hour, messages in rows}
+
+    def export(self, out: TextIO, fmt: str = "csv", granularity: str = "hour",
+               since: Optional[str] = None, until: Optional[str] = None,
+               user_types: Optional[List[str]] = None) -> int:
+        """Stream usage rows to a file object as CSV or NDJSON, return the row count"""
+        if fmt not in ("csv", "ndjson"):
+            raise ValueError(f"Unknown export format: {fmt}")
+
+        writer = None
+        if fmt == "csv":
+            writer = csv.DictWriter(out, fieldnames=USAGE_FIELDS)
+            writer.writeheader()
+
+        count = 0
+        for row in self.iter_usage(granularity, since, until, user_types):
+            if writer:
+                writer.writerow(row)
+            else:
+                out.write(json.dumps(row) + "\n")
+            count += 1
+        return count
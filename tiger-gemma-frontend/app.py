@@ -2,11 +2,37 @@ import streamlit as st
 import time
 from datetime import datetime
 import requests
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
-from config import USERS, EC2_INSTANCE_ID, AWS_REGION, SERVER_PORT
+from config import (USERS, EC2_INSTANCE_ID, AWS_REGION, SERVER_PORT, AWS_STATUS_CACHE_SECONDS, EC2_BACKEND,
+                    INSTANCE_START_TIMEOUT_SECONDS, STARTUP_POLL_SECONDS, GPU_HOURLY_RATE,
+                    PREWARM_ENABLED, PREWARM_THRESHOLD, PREWARM_LEAD_MINUTES, PREWARM_MAX_DAILY_COST,
+                    PREWARM_HISTORY_DAYS, PREWARM_CHECK_MINUTES, IDLE_TIMEOUT_MINUTES,
+                    WARNING_TIMEOUT_MINUTES, SHUTDOWN_GRACE_MINUTES, IDLE_CHECK_SECONDS,
+                    EC2_INSTANCE_IDS, GPU_POOL_URLS, GPU_POOL_ENABLED, POOL_MIN_INSTANCES,
+                    POOL_SCALE_UP_DEPTH, POOL_SCALE_DOWN_IDLE_MINUTES, POOL_CHECK_SECONDS,
+                    ADMISSION_CONCURRENCY, ADMISSION_MAX_QUEUE, ADMISSION_MAX_PER_SESSION,
+                    ADMISSION_MAX_WAIT_SECONDS, LLM_CONNECT_TIMEOUT_SECONDS, LLM_READ_TIMEOUT_SECONDS,
+                    METERING_DB, UPTIME_SAMPLE_SECONDS,
+                    DATABASE_NAME, DATABASE_POOL_SIZE, DATABASE_BUSY_TIMEOUT_MS, HISTORY_PAGE_SIZE,
+                    HISTORY_SEARCH_PAGE_SIZE, MAINTENANCE_INTERVAL_MINUTES, ARCHIVE_AFTER_DAYS,
+                    ARCHIVE_CODEC, VACUUM_PAGES_PER_RUN, RETENTION_DAYS, DELETE_CHUNK_SIZE,
+                    WRITE_QUEUE_MAX_SIZE, WRITE_BATCH_MAX_MESSAGES,
+                    RESPONSE_CACHE_DB, RESPONSE_CACHE_MAX_ENTRIES, SEARCH_CACHE_BUCKET_SECONDS,
+                    SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MIN_TOKENS, SEMANTIC_EVENTS_RETENTION_DAYS)
+from admission import AdmissionCancelled, AdmissionQueue, AdmissionTimeout, QueueFull
 from aws_manager import AWSInstanceManager
-from llm_client import LLMClient, get_server_url
+from llm_client import LLMClient, get_server_url, search_fingerprint
 from database import DatabaseManager
+from write_queue import WriteBehindQueue
+from maintenance import MaintenanceScheduler
+from prewarm import PrewarmPolicy, PrewarmScheduler
+from idle_shutdown import ActivityTracker, IdleShutdownScheduler
+from gpu_pool import BackendPool, PooledLLMClient
+from metering import RequestMeter, UptimeRecorder
+from resources import ResourceRegistry
+from response_cache import ResponseCache
+from semantic_cache import SemanticCache
 
 # Page config
 st.set_page_config(
@@ -16,6 +42,178 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource
+def get_resources():
+    """Registry of the resources all sessions share, one per process"""
+    registry = ResourceRegistry()
+    registry.register("db_manager",
+                      lambda: DatabaseManager(DATABASE_NAME, DATABASE_POOL_SIZE, DATABASE_BUSY_TIMEOUT_MS),
+                      health=DatabaseManager.is_healthy, close=DatabaseManager.close)
+    registry.register("aws_manager",
+                      lambda: AWSInstanceManager(EC2_INSTANCE_ID, AWS_REGION, AWS_STATUS_CACHE_SECONDS,
+                                                 GPU_HOURLY_RATE),
+                      health=lambda manager: manager.get_snapshot() is not None)
+    registry.register("response_cache", lambda: ResponseCache(RESPONSE_CACHE_DB, RESPONSE_CACHE_MAX_ENTRIES))
+    registry.register("semantic_cache",
+                      lambda: SemanticCache(RESPONSE_CACHE_DB, SEMANTIC_CACHE_THRESHOLD,
+                                            SEMANTIC_CACHE_MIN_TOKENS, RESPONSE_CACHE_MAX_ENTRIES,
+                                            SEMANTIC_EVENTS_RETENTION_DAYS))
+    registry.register("admission_queue", create_admission_queue)
+    registry.register("llm_client",
+                      lambda server_url: LLMClient(server_url, cache=get_response_cache(),
+                                                   semantic_cache=get_semantic_cache(),
+                                                   admission=get_admission_queue(),
+                                                   timeout=(LLM_CONNECT_TIMEOUT_SECONDS, LLM_READ_TIMEOUT_SECONDS),
+                                                   queue_timeout=ADMISSION_MAX_WAIT_SECONDS),
+                      health=LLMClient.is_server_healthy, latest_only=True)
+    registry.register("pooled_llm_client",
+                      lambda: PooledLLMClient(get_backend_pool(), cache=get_response_cache(),
+                                              semantic_cache=get_semantic_cache(),
+                                              admission=get_admission_queue(),
+                                              timeout=(LLM_CONNECT_TIMEOUT_SECONDS, LLM_READ_TIMEOUT_SECONDS),
+                                              queue_timeout=ADMISSION_MAX_WAIT_SECONDS),
+                      health=PooledLLMClient.is_server_healthy)
+    registry.register("activity_tracker", ActivityTracker)
+    registry.register("backend_pool", create_backend_pool, health=BackendPool.is_running, close=BackendPool.stop)
+    registry.register("maintenance_scheduler", create_maintenance_scheduler,
+                      health=MaintenanceScheduler.is_running, close=MaintenanceScheduler.stop)
+    registry.register("prewarm_scheduler", create_prewarm_scheduler,
+                      health=PrewarmScheduler.is_running, close=PrewarmScheduler.stop)
+    registry.register("idle_shutdown", create_idle_shutdown,
+                      health=IdleShutdownScheduler.is_running, close=IdleShutdownScheduler.stop)
+    registry.register("request_meter", lambda: RequestMeter(METERING_DB), close=RequestMeter.close)
+    registry.register("uptime_recorder", create_uptime_recorder,
+                      health=UptimeRecorder.is_running, close=UptimeRecorder.stop)
+    # Created after db_manager, so close_all flushes it before the database closes
+    registry.register("write_queue",
+                      lambda: WriteBehindQueue(get_db_manager(), WRITE_QUEUE_MAX_SIZE, WRITE_BATCH_MAX_MESSAGES),
+                      health=WriteBehindQueue.is_running, close=WriteBehindQueue.close)
+    return registry
+
+def get_db_manager():
+    """One pooled database manager shared by all sessions"""
+    return get_resources().get("db_manager")
+
+def get_aws_manager():
+    """One instance manager (and EC2 client) shared by all sessions"""
+    return get_resources().get("aws_manager")
+
+def get_response_cache():
+    """One response cache shared by all sessions"""
+    return get_resources().get("response_cache")
+
+def get_semantic_cache():
+    """One near-duplicate cache shared by all sessions"""
+    return get_resources().get("semantic_cache")
+
+def create_admission_queue():
+    """Fair queue for GPU slots; with a pool, one slot set per healthy server"""
+    weights = {name: user["queue_weight"] for name, user in USERS.items()}
+    if not GPU_POOL_ENABLED:
+        return AdmissionQueue(ADMISSION_CONCURRENCY, ADMISSION_MAX_QUEUE, ADMISSION_MAX_PER_SESSION, weights)
+    
+    pool = get_backend_pool()
+    queue = AdmissionQueue(ADMISSION_CONCURRENCY, ADMISSION_MAX_QUEUE, ADMISSION_MAX_PER_SESSION, weights,
+                           concurrency_source=lambda: ADMISSION_CONCURRENCY * len(pool.healthy_backends()))
+    # Queued requests count towards the pool's scale-up depth
+    pool.waiting_source = queue.depth
+    return queue
+
+def get_admission_queue():
+    """One admission queue in front of the GPU servers, shared by all sessions"""
+    return get_resources().get("admission_queue")
+
+def get_session_key():
+    """Identifies the browser session, the unit of fair queueing"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "local"
+
+def withdraw_queued_requests():
+    """Drop this session's waiting tickets, e.g. left behind by an interrupted run"""
+    get_admission_queue().cancel_owner(get_session_key())
+
+def get_llm_client(server_url):
+    """The LLM client for the current server URL, shared by all sessions"""
+    return get_resources().get("llm_client", server_url)
+
+def get_pooled_llm_client():
+    """One client routing across the GPU pool, shared by all sessions"""
+    return get_resources().get("pooled_llm_client")
+
+def create_maintenance_scheduler():
+    scheduler = MaintenanceScheduler(get_db_manager(), MAINTENANCE_INTERVAL_MINUTES,
+                                     ARCHIVE_AFTER_DAYS, ARCHIVE_CODEC,
+                                     vacuum_pages=VACUUM_PAGES_PER_RUN,
+                                     retention_days=RETENTION_DAYS,
+                                     delete_chunk_size=DELETE_CHUNK_SIZE)
+    scheduler.start()
+    return scheduler
+
+def get_maintenance_scheduler():
+    """Background archival and compaction, one per process"""
+    return get_resources().get("maintenance_scheduler")
+
+def create_prewarm_scheduler():
+    policy = PrewarmPolicy(PREWARM_THRESHOLD, PREWARM_LEAD_MINUTES, PREWARM_MAX_DAILY_COST, GPU_HOURLY_RATE)
+    scheduler = PrewarmScheduler(get_aws_manager(), get_db_manager(), policy, SERVER_PORT, PREWARM_HISTORY_DAYS,
+                                 PREWARM_CHECK_MINUTES, IDLE_TIMEOUT_MINUTES, INSTANCE_START_TIMEOUT_SECONDS)
+    scheduler.start()
+    return scheduler
+
+def get_prewarm_scheduler():
+    """Starts the GPU ahead of demand predicted from chat history, one per process"""
+    return get_resources().get("prewarm_scheduler")
+
+def get_activity_tracker():
+    """Last generation across all sessions, drives the idle shutdown"""
+    return get_resources().get("activity_tracker")
+
+def create_idle_shutdown():
+    keep_warm = get_prewarm_scheduler().wants_warm if PREWARM_ENABLED else None
+    scheduler = IdleShutdownScheduler(get_aws_manager(), get_activity_tracker(), IDLE_TIMEOUT_MINUTES, WARNING_TIMEOUT_MINUTES,
+                                      SHUTDOWN_GRACE_MINUTES, IDLE_CHECK_SECONDS, keep_warm)
+    scheduler.start()
+    return scheduler
+
+def get_idle_shutdown():
+    """Stops the GPU instance after IDLE_TIMEOUT_MINUTES without activity, one per process"""
+    return get_resources().get("idle_shutdown")
+
+def create_backend_pool():
+    settings = dict(check_seconds=POOL_CHECK_SECONDS, scale_up_depth=POOL_SCALE_UP_DEPTH,
+                    scale_down_idle_minutes=POOL_SCALE_DOWN_IDLE_MINUTES, min_active=POOL_MIN_INSTANCES)
+    if GPU_POOL_URLS:
+        pool = BackendPool.from_urls(GPU_POOL_URLS, **settings)
+    else:
+        pool = BackendPool.from_instances(EC2_INSTANCE_IDS, AWS_REGION, SERVER_PORT, AWS_STATUS_CACHE_SECONDS,
+                                          GPU_HOURLY_RATE, start_timeout=INSTANCE_START_TIMEOUT_SECONDS,
+                                          idle_shutdown_minutes=IDLE_TIMEOUT_MINUTES, **settings)
+        tracker = get_activity_tracker()
+        pool.activity_source = lambda: tracker.snapshot()["last_activity"]
+    pool.start()
+    return pool
+
+def get_backend_pool():
+    """GPU servers shared by all sessions, with health checks and scaling"""
+    return get_resources().get("backend_pool")
+
+def create_uptime_recorder():
+    if GPU_POOL_ENABLED:
+        managers = [b.manager for b in get_backend_pool().backends if b.manager]
+    else:
+        managers = [get_aws_manager()]
+    recorder = UptimeRecorder(get_resources().get("request_meter"), managers, UPTIME_SAMPLE_SECONDS)
+    recorder.start()
+    return recorder
+
+def get_request_meter():
+    """Per-request latency, token and cache metrics, with instance uptime sampled alongside"""
+    return get_resources().get("uptime_recorder").meter
+
+def get_write_queue():
+    """One background writer for chat turns, shared by all sessions"""
+    return get_resources().get("write_queue")
+
 def apply_user_theme(username):
     """Apply user-specific theme"""
     user_config = USERS[username]
@@ -159,7 +357,7 @@ def login_user(username, user_info):
     st.session_state.username = username
     
     # Create/get user in database
-    st.session_state.user_id = st.session_state.db_manager.create_or_get_user(
+    st.session_state.user_id = get_db_manager().create_or_get_user(
         username=username,
         display_name=user_info['name'],
         icon=user_info['icon'],
@@ -167,14 +365,16 @@ def login_user(username, user_info):
     )
     
     # Get/create conversation
-    st.session_state.conversation_id = st.session_state.db_manager.get_or_create_conversation(
+    st.session_state.conversation_id = get_db_manager().get_or_create_conversation(
         st.session_state.user_id
     )
     
-    # Load existing messages
-    st.session_state.messages = st.session_state.db_manager.get_conversation_messages(
-        st.session_state.conversation_id
+    # Load the latest page of messages, older ones on demand
+    st.session_state.messages = get_db_manager().get_conversation_page(
+        st.session_state.conversation_id, limit=HISTORY_PAGE_SIZE
     )
+    st.session_state.has_older_messages = len(st.session_state.messages) == HISTORY_PAGE_SIZE
+    st.session_state.history_window = HISTORY_PAGE_SIZE
     
     st.rerun()
 
@@ -193,6 +393,7 @@ def show_sidebar():
         """, unsafe_allow_html=True)
         
         if st.button("🚪 Switch Assistant", use_container_width=True):
+            withdraw_queued_requests()
             for key in list(st.session_state.keys()):
                 del st.session_state[key]
             st.rerun()
@@ -210,12 +411,25 @@ def show_sidebar():
         st.divider()
         
         # AWS Instance Control
-        show_instance_control()
+        if GPU_POOL_ENABLED:
+            show_pool_control()
+        else:
+            show_instance_control()
+        
+        st.divider()
+        
+        show_cost_summary()
+        show_resource_health()
         
         st.divider()
         
         # User Statistics
         show_user_stats()
+        
+        st.divider()
+        
+        # Search past conversations
+        show_history_search()
 
 def show_use_cases():
     """Show user-specific use cases"""
@@ -307,9 +521,20 @@ def show_main_chat():
     </div>
     """, unsafe_allow_html=True)
     
+    if GPU_POOL_ENABLED:
+        show_pool_chat(user_data)
+        return
+    
     # Check instance status
-    status = st.session_state.aws_manager.get_status()
-    public_ip = st.session_state.aws_manager.get_public_ip()
+    status = get_aws_manager().get_status()
+    public_ip = get_aws_manager().get_public_ip()
+    if get_aws_manager().last_error:
+        st.error(get_aws_manager().last_error)
+    
+    startup_job = get_aws_manager().get_startup_job()
+    if startup_job and not startup_job.done:
+        show_startup_progress(startup_job)
+        return
     
     if status != "running":
         st.warning("""
@@ -325,7 +550,7 @@ def show_main_chat():
     
     # Check server health
     server_url = get_server_url(public_ip, SERVER_PORT)
-    llm_client = LLMClient(server_url)
+    llm_client = get_llm_client(server_url)
     
     if not llm_client.is_server_healthy():
         st.warning(f"""
@@ -338,14 +563,39 @@ def show_main_chat():
             st.rerun()
         return
     
+    show_chat(llm_client)
+
+def show_pool_chat(user_data):
+    """Chat against the GPU pool: ready as soon as any backend is healthy"""
+    llm_client = get_pooled_llm_client()
+    
+    if not llm_client.is_server_healthy():
+        pool = get_backend_pool()
+        st.warning(f"""
+        🟡 **{user_data['name']} is asleep**
+        
+        No GPU server is ready. Servers stop after {IDLE_TIMEOUT_MINUTES} minutes without activity
+        and do not start on their own; wake one up below or from the sidebar. The model takes
+        3-5 minutes to load.
+        """)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if any(b.manager for b in pool.backends) and st.button("🚀 Wake up a GPU server",
+                                                                   use_container_width=True):
+                pool.wake()
+                st.rerun()
+        with col2:
+            if st.button("🔄 Check Status", use_container_width=True):
+                st.rerun()
+        return
+    
+    show_chat(llm_client)
+
+def show_chat(llm_client):
+    """Chat history and input for a ready LLM client"""
     # Display chat messages
-    for message in st.session_state.messages:
-        with st.chat_message("user" if message["is_user"] else "assistant"):
-            st.markdown(message["content"])
-            
-            # Enhanced search results display for shopping
-            if not message["is_user"] and message["search_results"]:
-                show_enhanced_search_results(message["search_results"])
+    show_chat_history()
     
     # Enhanced chat input with user-specific placeholder
     chat_placeholder = get_chat_placeholder(st.session_state.username)
@@ -353,6 +603,53 @@ def show_main_chat():
     if prompt := st.chat_input(chat_placeholder):
         handle_user_input(prompt, llm_client)
 
+def show_chat_history():
+    """Render the newest window of messages with a "load older" control"""
+    db_manager = get_db_manager()
+    messages = st.session_state.messages
+    window = st.session_state.history_window
+    
+    if len(messages) > window or st.session_state.has_older_messages:
+        if st.button("⬆️ Load older messages", use_container_width=True):
+            load_older_messages()
+            st.rerun()
+    
+    for message in messages[-window:]:
+        with st.chat_message("user" if message["is_user"] else "assistant"):
+            st.markdown(message["content"])
+            
+            # Enhanced search results display for shopping
+            if not message["is_user"] and db_manager.has_search_results(message):
+                show_enhanced_search_results(db_manager.load_search_results(message))
+            
+            # Let the user reject a near-duplicate cache hit
+            if message.get("semantic_entry_id"):
+                show_cache_feedback(message)
+
+def load_older_messages():
+    """Widen the history window, fetching an older page when needed"""
+    messages = st.session_state.messages
+    hidden = len(messages) - st.session_state.history_window
+    
+    if hidden < HISTORY_PAGE_SIZE and st.session_state.has_older_messages:
+        oldest_id = next((m["id"] for m in messages if m.get("id")), None)
+        older = get_db_manager().get_conversation_page(
+            st.session_state.conversation_id, before_id=oldest_id, limit=HISTORY_PAGE_SIZE
+        )
+        st.session_state.messages = older + messages
+        st.session_state.has_older_messages = len(older) == HISTORY_PAGE_SIZE
+    
+    st.session_state.history_window += HISTORY_PAGE_SIZE
+
+def show_cache_feedback(message):
+    """Offer to flag a near-duplicate cached answer as a mismatch"""
+    entry_id = message["semantic_entry_id"]
+    st.caption(f"⚡ Answered from a similar earlier question ({message.get('similarity', 0):.0%} match)")
+    if st.button("👎 Not what I asked", key=f"false_hit_{entry_id}_{id(message)}"):
+        get_semantic_cache().report_false_hit(entry_id)
+        message["semantic_entry_id"] = None
+        st.info("Thanks! This answer won't be reused for similar questions.")
+
 def get_chat_placeholder(username):
     """Get user-specific chat placeholder"""
     placeholders = {
@@ -403,6 +700,8 @@ def show_enhanced_search_results(search_results):
 def handle_user_input(prompt: str, llm_client: LLMClient):
     """Enhanced user input handling with user-specific processing"""
     user_config = USERS[st.session_state.username]
+    # A session runs one script at a time, so a ticket still waiting is from a run this one replaced
+    withdraw_queued_requests()
     
     # Add user message to chat
     st.session_state.messages.append({
@@ -424,14 +723,40 @@ def handle_user_input(prompt: str, llm_client: LLMClient):
                 # Enhanced prompt with user-specific context
                 enhanced_prompt = build_enhanced_prompt(prompt, st.session_state.username)
                 
+                # Place in line while other sessions hold the GPU
+                queue_box = st.empty()
+                
+                def show_queue_position(place):
+                    queue_box.info(f"⏳ You are #{place['position']} in line · "
+                                   f"about {place['eta_seconds']:.0f}s until it's your turn")
+                
                 # Call LLM API
-                response_data = llm_client.generate_text(
-                    prompt=enhanced_prompt,
-                    user_type=st.session_state.username, # <--- DIESE ZEILE HINZUFÜGEN
-                    max_length=user_config["max_length"],
-                    temperature=user_config["temperature"],
-                    search_enabled=True
-                )
+                started = time.perf_counter()
+                try:
+                    with get_activity_tracker().generation():
+                        response_data = llm_client.generate_text(
+                            prompt=enhanced_prompt,
+                            user_type=st.session_state.username, # <--- DIESE ZEILE HINZUFÜGEN
+                            max_length=user_config["max_length"],
+                            temperature=user_config["temperature"],
+                            search_enabled=True,
+                            search_fingerprint=search_fingerprint(True, SEARCH_CACHE_BUCKET_SECONDS),
+                            cache_query=prompt,
+                            queue_owner=get_session_key(),
+                            on_queue=show_queue_position
+                        )
+                except (QueueFull, AdmissionTimeout, AdmissionCancelled):
+                    raise
+                except Exception:
+                    get_request_meter().record(st.session_state.username, st.session_state.conversation_id,
+                                               time.perf_counter() - started, enhanced_prompt, error=True)
+                    raise
+                finally:
+                    queue_box.empty()
+                # Metered latency is generation time; the wait in line is not GPU time
+                get_request_meter().record(st.session_state.username, st.session_state.conversation_id,
+                                           time.perf_counter() - started - response_data.get("queue_seconds", 0),
+                                           enhanced_prompt, response_data)
                 
                 response = response_data["response"]
                 search_results = response_data.get("search_results", [])
@@ -449,8 +774,11 @@ def handle_user_input(prompt: str, llm_client: LLMClient):
                     show_enhanced_search_results(search_results)
                 
                 # Save to database
-                save_conversation(prompt, response, search_results, search_used)
+                save_conversation(prompt, response, search_results, search_used,
+                                  response_data.get("semantic_entry_id"), response_data.get("similarity"))
                 
+            except (QueueFull, AdmissionTimeout, AdmissionCancelled) as e:
+                st.warning(f"⏳ {e}")
             except Exception as e:
                 show_error_message(str(e), st.session_state.username)
 
@@ -524,23 +852,17 @@ def enhance_shopping_response(response, search_results):
     
     return response
 
-def save_conversation(prompt, response, search_results, search_used):
-    """Save conversation to database"""
-    # Save user message
-    st.session_state.db_manager.save_message(
-        st.session_state.conversation_id,
-        is_user=True,
-        content=prompt
-    )
-    
-    # Save assistant message
-    st.session_state.db_manager.save_message(
-        st.session_state.conversation_id,
-        is_user=False,
-        content=response,
-        search_results=search_results,
-        search_used=search_used
-    )
+def save_conversation(prompt, response, search_results, search_used,
+                      semantic_entry_id=None, similarity=None):
+    """Queue the turn for the background writer"""
+    conversation_id = st.session_state.conversation_id
+    get_write_queue().submit_many([
+        # User message
+        {"conversation_id": conversation_id, "is_user": True, "content": prompt},
+        # Assistant message
+        {"conversation_id": conversation_id, "is_user": False, "content": response,
+         "search_results": search_results, "search_used": search_used}
+    ])
     
     # Add to session messages
     st.session_state.messages.extend([
@@ -548,7 +870,9 @@ def save_conversation(prompt, response, search_results, search_used):
             "is_user": False,
             "content": response,
             "search_results": search_results,
-            "search_used": search_used
+            "search_used": search_used,
+            "semantic_entry_id": semantic_entry_id,
+            "similarity": similarity
         }
     ])
 
@@ -568,13 +892,20 @@ def show_error_message(error_str, username):
 def show_instance_control():
     """Instance control (same as before but with enhanced styling)"""
     st.markdown("### 🖥️ GPU Instance Control")
+    if EC2_BACKEND == "simulator":
+        st.caption("🧪 Simulated EC2 (offline)")
     
-    aws_manager = st.session_state.aws_manager
+    aws_manager = get_aws_manager()
     
     try:
         with st.spinner("Checking instance status..."):
             status = aws_manager.get_status()
             public_ip = aws_manager.get_public_ip()
+        if aws_manager.last_error:
+            st.error(aws_manager.last_error)
+        
+        startup_job = aws_manager.get_startup_job()
+        starting = startup_job is not None and not startup_job.done
         
         # Status display with better styling
         status_colors = {
@@ -593,15 +924,21 @@ def show_instance_control():
         </div>
         """, unsafe_allow_html=True)
         
-        if public_ip and status == "running":
+        if starting:
+            show_startup_progress(startup_job)
+        elif startup_job and startup_job.status()["error"]:
+            st.error(f"Last start failed: {startup_job.status()['error']}")
+        
+        if public_ip and status == "running" and not starting:
             st.success(f"🌐 **Server IP:** {public_ip}")
             
             # Check server health
             server_url = get_server_url(public_ip, SERVER_PORT)
-            llm_client = LLMClient(server_url)
+            llm_client = get_llm_client(server_url)
             
             if llm_client.is_server_healthy():
                 st.success("✅ AI Assistant Ready!")
+                show_queue_status()
             else:
                 st.warning("⏳ AI Assistant Loading...")
         
@@ -610,12 +947,10 @@ def show_instance_control():
         
         with col1:
             if st.button("🚀 START", 
-                        disabled=(status in ["running", "starting", "pending"]), 
+                        disabled=(starting or status in ["running", "starting", "pending"]), 
                         use_container_width=True):
                 try:
-                    new_ip = aws_manager.start_instance()
-                    st.success(f"Instance started! IP: {new_ip}")
-                    time.sleep(2)
+                    aws_manager.start_instance_async(SERVER_PORT, INSTANCE_START_TIMEOUT_SECONDS)
                     st.rerun()
                 except Exception as e:
                     st.error(f"Start failed: {e}")
@@ -638,34 +973,113 @@ def show_instance_control():
     except Exception as e:
         st.error(f"Cannot connect to AWS: {e}")
 
+def show_pool_control():
+    """Per-server health and load of the GPU pool"""
+    st.markdown("### 🖥️ GPU Pool")
+    pool = get_backend_pool()
+    
+    for backend in pool.backends:
+        info = backend.to_dict()
+        if info["draining"]:
+            icon = "🟡"
+        elif info["healthy"]:
+            icon = "🟢"
+        else:
+            icon = "🔴"
+        st.markdown(f"{icon} **{info['name']}** · {info['in_flight']} active · {info['served']} served")
+        
+        startup_job = backend.manager.get_startup_job() if backend.manager else None
+        if startup_job and not startup_job.done:
+            show_startup_progress(startup_job)
+        elif backend.manager:
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("🚀 START", key=f"start_{info['name']}", disabled=info["healthy"],
+                             use_container_width=True):
+                    backend.manager.start_instance_async(SERVER_PORT, INSTANCE_START_TIMEOUT_SECONDS)
+                    st.rerun()
+            with col2:
+                if st.button("⏹️ DRAIN", key=f"drain_{info['name']}", disabled=not info["healthy"],
+                             use_container_width=True):
+                    pool.drain(info["name"])
+                    st.rerun()
+    
+    st.caption(f"Load per server: {pool.queue_depth():.1f}")
+    show_queue_status()
+
+def show_queue_status():
+    """Generations running and waiting for a GPU slot"""
+    queue = get_admission_queue().status()
+    if queue["waiting"] or queue["running"]:
+        st.caption(f"⏳ {queue['running']}/{queue['limit']} generating · {queue['waiting']} in line")
+
+def show_cost_summary():
+    """GPU cost per answer, utilization and idle waste over the last 24 hours"""
+    with st.expander("💰 GPU Cost (24h)"):
+        report = get_request_meter().report(time.time() - 24 * 3600, hourly_rate=GPU_HOURLY_RATE)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Instance cost", f"${report['instance_cost']:.2f}")
+            st.metric("Per answer", f"${report['cost_per_request']:.3f}" if report["cost_per_request"] else "–")
+        with col2:
+            utilization = report["gpu_utilization"]
+            st.metric("GPU busy", f"{utilization:.0%}" if utilization is not None else "–")
+            st.metric("Idle waste", f"${report['idle_waste_cost']:.2f}")
+        
+        persona = report["by_user_type"].get(st.session_state.username)
+        if persona:
+            st.caption(f"{persona['requests']} answers for you, {persona['avg_latency_ms'] / 1000:.1f}s average, "
+                       f"{persona['cache_hit_rate']:.0%} from cache")
+
+def show_resource_health():
+    """Process-wide shared resources and their last health check"""
+    with st.expander("🩺 Shared Resources"):
+        registry = get_resources()
+        status = registry.check_health() if st.button("Check health", use_container_width=True) else registry.status()
+        for name, info in status.items():
+            icon = {True: "🟢", False: "🔴"}.get(info["healthy"], "⚪")
+            st.caption(f"{icon} {name} · up {info['age_seconds'] / 60:.0f} min" +
+                       (f" · {info['error']}" if info["error"] else ""))
+
+def show_startup_progress(startup_job):
+    """Progress of the background instance start"""
+    status = startup_job.status()
+    minutes, seconds = divmod(int(status["elapsed_seconds"]), 60)
+    st.progress(status["progress"], text=f"{status['label']} ({minutes}m {seconds:02d}s)")
+
 def show_auto_shutdown_info(public_ip):
     """Show auto-shutdown information"""
-    server_url = get_server_url(public_ip, SERVER_PORT)
-    llm_client = LLMClient(server_url)
-    server_status = llm_client.get_server_status()
-    
-    if server_status:
-        shutdown_in = max(0, server_status.get("shutdown_in_seconds", 0))
+    shutdown_status = get_idle_shutdown().status()
+    shutdown_in = shutdown_status["shutdown_in_seconds"]
+    
+    if shutdown_status["state"] == "held":
+        st.info("⏰ Kept warm for expected usage")
+    elif shutdown_status["state"] == "busy":
+        st.info(f"⏰ Auto-shutdown paused: {shutdown_status['in_flight']} answer(s) in progress")
+    elif shutdown_in is not None:
+        minutes = int(shutdown_in // 60)
+        seconds = int(shutdown_in % 60)
         
-        if shutdown_in > 0:
-            minutes = int(shutdown_in // 60)
-            seconds = int(shutdown_in % 60)
+        if shutdown_in > WARNING_TIMEOUT_MINUTES * 60:
             st.info(f"⏰ Auto-shutdown: {minutes}m {seconds}s")
+        elif shutdown_in > 0:
+            st.warning(f"⚠️ Auto-shutdown in {minutes}m {seconds}s!")
         else:
             st.warning("⚠️ May shutdown soon!")
-            
-        if st.button("🔄 Reset Timer", use_container_width=True):
-            llm_client.is_server_healthy()
-            st.success("Timer reset!")
-            time.sleep(1)
-            st.rerun()
+    
+    if st.button("🔄 Reset Timer", use_container_width=True):
+        get_activity_tracker().record("reset")
+        st.success("Timer reset!")
+        time.sleep(1)
+        st.rerun()
 
 def show_user_stats():
     """Enhanced user statistics"""
     st.markdown("### 📊 Your Statistics")
     
     try:
-        stats = st.session_state.db_manager.get_user_stats(st.session_state.user_id)
+        stats = get_db_manager().get_user_stats(st.session_state.user_id)
         user_data = USERS[st.session_state.username]
         
         # Enhanced metrics display
@@ -687,6 +1101,11 @@ def show_user_stats():
             </div>
             """, unsafe_allow_html=True)
         
+        cache_stats = get_response_cache().get_stats().get(st.session_state.username)
+        if cache_stats:
+            st.caption(f"⚡ Cache hit rate: {cache_stats['hit_rate']:.0%} "
+                       f"({cache_stats['hits']} of {cache_stats['hits'] + cache_stats['misses']})")
+        
         if stats["last_activity"]:
             last_activity = datetime.fromisoformat(stats["last_activity"].replace('Z', '+00:00'))
             st.markdown(f"**Last Active:** {last_activity.strftime('%Y-%m-%d %H:%M')}")
@@ -699,6 +1118,42 @@ def show_user_stats():
     except Exception as e:
         st.error(f"Cannot load stats: {e}")
 
+def show_history_search():
+    """Full-text search over the user's chat history"""
+    st.markdown("### 🔎 Search Your Chats")
+    
+    query = st.text_input("Search past messages", key="history_query",
+                          placeholder="e.g. laptop, photosynthesis...",
+                          label_visibility="collapsed")
+    
+    if not query:
+        return
+    
+    # Start over when the query changes
+    if st.session_state.get("history_search_for") != query:
+        st.session_state.history_search_for = query
+        st.session_state.history_hits = get_db_manager().search_messages(
+            st.session_state.user_id, query, limit=HISTORY_SEARCH_PAGE_SIZE
+        )
+    
+    hits = st.session_state.history_hits
+    if not hits:
+        st.caption("No matching messages.")
+        return
+    
+    for hit in hits:
+        speaker = "🧑 You" if hit["is_user"] else "🤖 Assistant"
+        st.markdown(f"**{speaker}** · {hit['timestamp'][:16]}  \n{hit['snippet']}")
+        if hit["source_snippet"]:
+            st.caption(f"🔗 {hit['source_snippet']}")
+    
+    if len(hits) % HISTORY_SEARCH_PAGE_SIZE == 0:
+        if st.button("More results", use_container_width=True):
+            st.session_state.history_hits = hits + get_db_manager().search_messages(
+                st.session_state.user_id, query, limit=HISTORY_SEARCH_PAGE_SIZE, after=hits[-1]["cursor"]
+            )
+            st.rerun()
+
 # Initialize session state
 def init_session_state():
     if 'logged_in' not in st.session_state:
@@ -711,10 +1166,19 @@ def init_session_state():
         st.session_state.conversation_id = None
     if 'messages' not in st.session_state:
         st.session_state.messages = []
-    if 'aws_manager' not in st.session_state:
-        st.session_state.aws_manager = AWSInstanceManager(EC2_INSTANCE_ID, AWS_REGION)
-    if 'db_manager' not in st.session_state:
-        st.session_state.db_manager = DatabaseManager()
+    if 'has_older_messages' not in st.session_state:
+        st.session_state.has_older_messages = False
+    if 'history_window' not in st.session_state:
+        st.session_state.history_window = HISTORY_PAGE_SIZE
+    if 'services_started' not in st.session_state:
+        # Shared per process: the first session starts them, later ones find them running
+        get_maintenance_scheduler()
+        if PREWARM_ENABLED:
+            get_prewarm_scheduler()
+        # The pool stops its own idle instances
+        if not GPU_POOL_ENABLED:
+            get_idle_shutdown()
+        st.session_state.services_started = True
 
 def main():
     """Main application with enhanced 4-user system"""
@@ -725,6 +1189,12 @@ def main():
     else:
         show_sidebar()
         show_main_chat()
+        
+        # Poll the background start until it settles
+        startup_job = get_aws_manager().get_startup_job()
+        if startup_job and not startup_job.done:
+            time.sleep(STARTUP_POLL_SECONDS)
+            st.rerun()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
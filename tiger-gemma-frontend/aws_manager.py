@@ -1,67 +1,143 @@
 import boto3
 import time
-from typing import Optional
+import threading
+from typing import Dict, Optional, Tuple
 import streamlit as st
 
+from config import EC2_BACKEND
+from ec2_simulator import get_simulator
+from instance_startup import StartupJob
+
+def create_ec2_client(region: str, backend: str = "aws"):
+    """boto3 EC2 client, or the process-wide offline simulator when backend is simulator"""
+    if backend == "simulator":
+        return get_simulator(region)
+    return boto3.client('ec2', region_name=region)
+
 class AWSInstanceManager:
-    def __init__(self, instance_id: str, region: str = "eu-central-1"):
+    # describe_instances results shared by every manager in the process,
+    # keyed by (region, instance_id) -> (fetched_at, instance)
+    _snapshots: Dict[Tuple[str, str], Tuple[float, dict]] = {}
+    # Guards the dicts only; describe_instances runs under the per-instance fetch lock
+    _snapshot_lock = threading.Lock()
+    _fetch_locks: Dict[Tuple[str, str], threading.Lock] = {}
+    # Background start per (region, instance_id), so sessions never start twice
+    _startup_jobs: Dict[Tuple[str, str], StartupJob] = {}
+    _startup_lock = threading.Lock()
+    
+    def __init__(self, instance_id: str, region: str = "eu-central-1", snapshot_ttl: float = 10,
+                 hourly_rate: float = 0.526, ec2_client=None):
         self.instance_id = instance_id
         self.region = region
-        self.ec2_client = boto3.client('ec2', region_name=region)
+        self.snapshot_ttl = snapshot_ttl
+        # g4dn.xlarge pricing in eu-central-1
+        self.hourly_rate = hourly_rate
+        self.ec2_client = ec2_client or create_ec2_client(region, EC2_BACKEND)
+        # Last failed status or IP lookup, for the UI to show; these run in background threads too
+        self.last_error: Optional[str] = None
+    
+    def get_snapshot(self, max_age: Optional[float] = None) -> dict:
+        """Return the instance description, calling describe_instances at most once per TTL
+        
+        Concurrent callers for the same instance wait for a single in-flight
+        request; other instances and startup jobs are not blocked by it. If
+        the call fails (e.g. throttling) and an older snapshot exists, that
+        one is returned instead of the error.
+        """
+        key = (self.region, self.instance_id)
+        max_age = self.snapshot_ttl if max_age is None else max_age
+        
+        with self._snapshot_lock:
+            cached = self._snapshots.get(key)
+            if cached and time.monotonic() - cached[0] < max_age:
+                return cached[1]
+            fetch_lock = self._fetch_locks.setdefault(key, threading.Lock())
         
+        with fetch_lock:
+            # Another caller may have refreshed it while this one waited
+            with self._snapshot_lock:
+                cached = self._snapshots.get(key)
+            if cached and time.monotonic() - cached[0] < max_age:
+                return cached[1]
+            
+            try:
+                response = self.ec2_client.describe_instances(InstanceIds=[self.instance_id])
+            except Exception:
+                if cached:
+                    return cached[1]
+                raise
+            instance = response['Reservations'][0]['Instances'][0]
+            with self._snapshot_lock:
+                self._snapshots[key] = (time.monotonic(), instance)
+            return instance
+    
+    def invalidate_snapshot(self):
+        """Force the next accessor to fetch a fresh description"""
+        with self._snapshot_lock:
+            self._snapshots.pop((self.region, self.instance_id), None)
+    
     def get_status(self) -> str:
-        """Get current instance status"""
+        """Get current instance status, "unknown" if it cannot be fetched (see last_error)"""
         try:
-            response = self.ec2_client.describe_instances(InstanceIds=[self.instance_id])
-            instance = response['Reservations'][0]['Instances'][0]
-            return instance['State']['Name']
+            status = self.get_snapshot()['State']['Name']
         except Exception as e:
-            st.error(f"Error getting instance status: {e}")
+            self.last_error = f"Error getting instance status: {e}"
+            print(self.last_error)
             return "unknown"
+        self.last_error = None
+        return status
     
     def get_public_ip(self) -> Optional[str]:
-        """Get public IP address"""
+        """Get public IP address, None if it cannot be fetched (see last_error)"""
         try:
-            response = self.ec2_client.describe_instances(InstanceIds=[self.instance_id])
-            instance = response['Reservations'][0]['Instances'][0]
-            return instance.get('PublicIpAddress')
+            public_ip = self.get_snapshot().get('PublicIpAddress')
         except Exception as e:
-            st.error(f"Error getting IP address: {e}")
+            self.last_error = f"Error getting IP address: {e}"
+            print(self.last_error)
             return None
+        self.last_error = None
+        return public_ip
     
-    def start_instance(self) -> str:
-        """Start the instance and return public IP"""
-        try:
-            st.info("🚀 Starting GPU instance...")
-            self.ec2_client.start_instances(InstanceIds=[self.instance_id])
-            
-            # Wait for running state
-            st.info("⏳ Waiting for instance to start (this takes 2-3 minutes)...")
-            waiter = self.ec2_client.get_waiter('instance_running')
-            waiter.wait(
-                InstanceIds=[self.instance_id],
-                WaiterConfig={'Delay': 15, 'MaxAttempts': 40}
-            )
-            
-            # Get public IP
-            public_ip = self.get_public_ip()
-            st.success(f"✅ Instance started! Public IP: {public_ip}")
-            
-            # Wait additional time for services to start
-            st.info("⏳ Waiting for services to initialize (30 seconds)...")
-            time.sleep(30)
-            
-            return public_ip
-            
-        except Exception as e:
-            st.error(f"Failed to start instance: {e}")
-            raise
+    def start_instance_async(self, server_port: int, timeout: float = 900) -> StartupJob:
+        """Start the instance in the background, or return the start already in progress"""
+        key = (self.region, self.instance_id)
+        with self._startup_lock:
+            job = self._startup_jobs.get(key)
+            if job is None or job.done:
+                job = StartupJob(self, server_port, timeout)
+                self._startup_jobs[key] = job
+                job.start()
+            return job
+    
+    def get_startup_job(self) -> Optional[StartupJob]:
+        """The current or most recent background start of this instance"""
+        with self._startup_lock:
+            return self._startup_jobs.get((self.region, self.instance_id))
+    
+    def start_instance(self, server_port: int = 8000) -> str:
+        """Start the instance, wait until the model answers and return public IP"""
+        st.info("🚀 Starting GPU instance...")
+        job = self.start_instance_async(server_port)
+        job.wait()
+        
+        status = job.status()
+        if status["error"]:
+            st.error(f"Failed to start instance: {status['error']}")
+            raise RuntimeError(status["error"])
+        
+        st.success(f"✅ Instance started! Public IP: {status['public_ip']}")
+        return status["public_ip"]
+    
+    def request_stop(self):
+        """Stop the instance without UI output, for background schedulers"""
+        self.ec2_client.stop_instances(InstanceIds=[self.instance_id])
+        self.invalidate_snapshot()
     
     def stop_instance(self) -> bool:
         """Stop the instance"""
         try:
             st.info("⏹️ Stopping GPU instance...")
-            self.ec2_client.stop_instances(InstanceIds=[self.instance_id])
+            self.request_stop()
             st.success("✅ Instance stop initiated!")
             return True
             
@@ -72,8 +148,7 @@ class AWSInstanceManager:
     def get_instance_info(self) -> dict:
         """Get detailed instance information"""
         try:
-            response = self.ec2_client.describe_instances(InstanceIds=[self.instance_id])
-            instance = response['Reservations'][0]['Instances'][0]
+            instance = self.get_snapshot()
             
             return {
                 "instance_id": instance['InstanceId'],
@@ -90,8 +165,7 @@ class AWSInstanceManager:
     
     def estimate_cost(self) -> dict:
         """Estimate running costs"""
-        # g4dn.xlarge pricing in eu-central-1
-        hourly_rate = 0.526
+        hourly_rate = self.hourly_rate
         
         try:
             info = self.get_instance_info()
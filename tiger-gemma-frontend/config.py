@@ -6,9 +6,39 @@ load_dotenv()
 # AWS Configuration
 AWS_REGION = "eu-central-1"
 EC2_INSTANCE_ID = "i-0c18ec623d1063fb9"  # DEINE Instance ID
+AWS_STATUS_CACHE_SECONDS = 10  # describe_instances snapshot shared by all sessions
+EC2_BACKEND = os.getenv("EC2_BACKEND", "aws")  # "simulator" runs start/stop offline against ec2_simulator.py
+EC2_SIM_PENDING_SECONDS = float(os.getenv("EC2_SIM_PENDING_SECONDS", "45"))
+EC2_SIM_STOPPING_SECONDS = float(os.getenv("EC2_SIM_STOPPING_SECONDS", "30"))
+EC2_SIM_JITTER = 0.2  # +/- fraction applied to both delays
+EC2_SIM_API_LATENCY_MS = float(os.getenv("EC2_SIM_API_LATENCY_MS", "0"))
+EC2_SIM_THROTTLE_RATE = float(os.getenv("EC2_SIM_THROTTLE_RATE", "0"))  # fraction of calls throttled
+EC2_SIM_MAX_CALLS_PER_SECOND = float(os.getenv("EC2_SIM_MAX_CALLS_PER_SECOND", "0"))  # 0 = unlimited
+EC2_SIM_PUBLIC_IP = os.getenv("EC2_SIM_PUBLIC_IP", "127.0.0.1")  # a local stub_server.py plays the GPU server
+
+# GPU pool: more than one instance (or fixed server URLs) routes each
+# request to the least-loaded healthy server
+EC2_INSTANCE_IDS = [i for i in os.getenv("EC2_INSTANCE_IDS", EC2_INSTANCE_ID).split(",") if i]
+GPU_POOL_URLS = [u for u in os.getenv("GPU_POOL_URLS", "").split(",") if u]  # e.g. local stub servers
+GPU_POOL_ENABLED = len(EC2_INSTANCE_IDS) > 1 or bool(GPU_POOL_URLS)
+POOL_MIN_INSTANCES = 1
+POOL_SCALE_UP_DEPTH = 4  # in-flight plus queued requests per healthy server
+POOL_SCALE_DOWN_IDLE_MINUTES = 15
+POOL_CHECK_SECONDS = 10
+
+# Admission control: generations wait in a bounded, fair queue for a GPU slot
+ADMISSION_CONCURRENCY = 1  # generations at once per GPU server
+ADMISSION_MAX_QUEUE = 32
+ADMISSION_MAX_PER_SESSION = 2
+ADMISSION_MAX_WAIT_SECONDS = 120
+LLM_CONNECT_TIMEOUT_SECONDS = 5
+LLM_READ_TIMEOUT_SECONDS = 300
 
 # Server Configuration  
 SERVER_PORT = 8000
+INSTANCE_START_TIMEOUT_SECONDS = 900  # instance boot plus model load
+STARTUP_POLL_SECONDS = 3  # UI refresh while a start is in progress
+GPU_HOURLY_RATE = 0.526  # g4dn.xlarge on-demand, eu-central-1
 
 # 4 Users mit spezifischen Configs
 USERS = {
@@ -21,6 +51,9 @@ USERS = {
         "temperature": 0.3,
         "max_length": 500,
         "search_priority": "academic",
+        "cache_enabled": True,
+        "cache_ttl_seconds": 86400,
+        "queue_weight": 1.0,  # share of GPU turns relative to other personas
         "system_prompt": """You are Dr. Researcher, a precise academic researcher. 
         Always cite sources, provide detailed explanations, and focus on factual accuracy. 
         Prefer academic and scientific sources.""",
@@ -43,6 +76,9 @@ USERS = {
         "temperature": 0.7,
         "max_length": 300,
         "search_priority": "educational",
+        "cache_enabled": True,
+        "cache_ttl_seconds": 86400,
+        "queue_weight": 1.0,  # share of GPU turns relative to other personas
         "system_prompt": """You are Student Sam, a patient and encouraging tutor. 
         Explain concepts clearly with simple examples. Break down complex topics into digestible parts. 
         Always encourage learning and curiosity.""",
@@ -65,6 +101,9 @@ USERS = {
         "temperature": 0.5,
         "max_length": 400,
         "search_priority": "business",
+        "cache_enabled": True,
+        "cache_ttl_seconds": 21600,
+        "queue_weight": 1.0,  # share of GPU turns relative to other personas
         "system_prompt": """You are Business Pro, a strategic business consultant. 
         Focus on actionable insights, market trends, and ROI. Provide structured, 
         data-driven advice for business decisions.""",
@@ -87,6 +126,9 @@ USERS = {
         "temperature": 0.6,
         "max_length": 350,
         "search_priority": "shopping",
+        "cache_enabled": True,
+        "cache_ttl_seconds": 3600,
+        "queue_weight": 1.0,  # share of GPU turns relative to other personas
         "system_prompt": """You are Shopping Scout, a helpful personal shopping assistant. 
         Help users find the best products and deals. Always provide 3 specific product links 
         when users want to buy something. Focus on value, quality, and user needs.""",
@@ -104,7 +146,51 @@ USERS = {
 
 # Database Configuration
 DATABASE_NAME = "chat_history.db"
+DATABASE_POOL_SIZE = 8
+DATABASE_BUSY_TIMEOUT_MS = 5000
+
+# Write-behind persistence of chat turns
+WRITE_QUEUE_MAX_SIZE = 1000
+WRITE_BATCH_MAX_MESSAGES = 200
+
+# Chat history paging (messages per "load older" step)
+HISTORY_PAGE_SIZE = 20
+HISTORY_SEARCH_PAGE_SIZE = 5
+
+# Archival and compaction of the chat history database
+MAINTENANCE_INTERVAL_MINUTES = 60
+ARCHIVE_AFTER_DAYS = 30
+ARCHIVE_CODEC = "zlib"  # or "lzma": smaller, slower
+VACUUM_PAGES_PER_RUN = 2000
+
+# Retention: delete messages older than this many days (None keeps everything)
+RETENTION_DAYS = None
+DELETE_CHUNK_SIZE = 500  # rows per delete transaction
+
+# Response cache (per-assistant flags and TTLs are in USERS)
+RESPONSE_CACHE_DB = "response_cache.db"
+RESPONSE_CACHE_MAX_ENTRIES = 5000
+SEARCH_CACHE_BUCKET_SECONDS = 900  # answers with live search results are reused within one such window
+
+# Near-duplicate cache: minimum Jaccard similarity of the prompt wording
+SEMANTIC_CACHE_THRESHOLD = 0.8
+SEMANTIC_CACHE_MIN_TOKENS = 3
+SEMANTIC_EVENTS_RETENTION_DAYS = 30  # hit/miss log behind the cache statistics
+
+# Predictive pre-warming (times are UTC, like message timestamps)
+PREWARM_ENABLED = False
+PREWARM_THRESHOLD = 0.3  # minimum probability that an hour sees users
+PREWARM_LEAD_MINUTES = 10  # start this early to cover boot and model load
+PREWARM_MAX_DAILY_COST = 6.0  # dollars of pre-warmed instance time per day
+PREWARM_HISTORY_DAYS = 28
+PREWARM_CHECK_MINUTES = 5
+
+# Per-request metering and instance uptime sampling
+METERING_DB = "metering.db"
+UPTIME_SAMPLE_SECONDS = 60
 
 # Auto-shutdown settings
 IDLE_TIMEOUT_MINUTES = 10
-WARNING_TIMEOUT_MINUTES = 2
\ No newline at end of file
+WARNING_TIMEOUT_MINUTES = 2
+SHUTDOWN_GRACE_MINUTES = 5  # extra time for generations still running at the deadline
+IDLE_CHECK_SECONDS = 15
\ No newline at end of file
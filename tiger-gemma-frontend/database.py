@@ -1,205 +1,704 @@
 import sqlite3
 import streamlit as st
+import queue
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 import json
+import lzma
+import zlib
+from collections import OrderedDict
+
+from migrations import migrate, get_schema_version, MIGRATIONS, REBUILD_USER_STATS_SQL, FTS_SOURCES_SQL
+from search_store import intern_search_results, fetch_search_results
 
 class DatabaseManager:
-    def __init__(self, db_name: str = "chat_history.db"):
+    # Applied to every pooled connection
+    PRAGMAS = {
+        "synchronous": "NORMAL",     # safe with WAL, no fsync per commit
+        "cache_size": -16000,        # 16 MB page cache per connection
+        "mmap_size": 134217728,      # 128 MB memory-mapped reads
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",        # enables the ON DELETE CASCADE constraints
+    }
+    
+    # Decoded search results kept in memory; they are immutable once stored
+    RESULT_CACHE_SIZE = 10000
+    # Decompressed archived conversations kept in memory
+    ARCHIVE_CACHE_SIZE = 8
+    
+    CODECS = {
+        "zlib": (lambda data: zlib.compress(data, 9), zlib.decompress),
+        "lzma": (lambda data: lzma.compress(data, preset=6), lzma.decompress),
+    }
+    
+    def __init__(self, db_name: str = "chat_history.db", pool_size: int = 8,
+                 busy_timeout_ms: int = 5000, read_only: bool = False):
         self.db_name = db_name
+        self.pool_size = pool_size
+        self.busy_timeout_ms = busy_timeout_ms
+        # For tools that only read, e.g. exports from the live history: no migrations, no writes
+        self.read_only = read_only
+        self._result_cache = OrderedDict()
+        self._result_cache_lock = threading.Lock()
+        self._archive_cache = OrderedDict()
+        self._archive_cache_lock = threading.Lock()
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._pool_lock = threading.Lock()
         self.init_database()
     
+    def _connect(self) -> sqlite3.Connection:
+        """Open and tune a new pooled connection"""
+        # Connections move between Streamlit script threads, but the pool
+        # only ever hands one to a single thread at a time.
+        if self.read_only:
+            conn = sqlite3.connect(f"file:{self.db_name}?mode=ro", uri=True, timeout=self.busy_timeout_ms / 1000,
+                                   check_same_thread=False, cached_statements=256)
+        else:
+            conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout_ms / 1000,
+                                   check_same_thread=False, cached_statements=256)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        for pragma, value in self.PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
+    
+    @contextmanager
+    def connection(self):
+        """Check a connection out of the pool for the duration of the block"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                can_create = self._created < self.pool_size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._pool_lock:
+                        self._created -= 1
+                    raise
+            else:
+                conn = self._pool.get(timeout=self.busy_timeout_ms / 1000)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+    
+    @contextmanager
+    def transaction(self):
+        """Pooled cursor whose work is committed as one transaction"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                yield cursor
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+    
+    def is_healthy(self) -> bool:
+        """Round trip through the connection pool"""
+        try:
+            with self.connection() as conn:
+                conn.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+    
+    def close(self):
+        """Checkpoint the WAL and close idle pooled connections"""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if not self.read_only:
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                conn.close()
+                with self._pool_lock:
+                    self._created -= 1
+    
     def init_database(self):
-        """Initialize database with required tables"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        """Bring the database schema up to date, or check it is current when read-only"""
+        if self.read_only:
+            conn = sqlite3.connect(f"file:{self.db_name}?mode=ro", uri=True)
+            try:
+                self.schema_version = get_schema_version(conn)
+            finally:
+                conn.close()
+            latest = MIGRATIONS[-1][0]
+            if self.schema_version < latest:
+                raise RuntimeError(f"{self.db_name} has schema version {self.schema_version}, {latest} is needed; "
+                                   f"open it once without read_only to migrate")
+            return
         
-        # Users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                display_name TEXT NOT NULL,
-                icon TEXT,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Conversations table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS conversations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                title TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # Messages table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                conversation_id INTEGER NOT NULL,
-                is_user BOOLEAN NOT NULL,
-                content TEXT NOT NULL,
-                search_results TEXT,  -- JSON string
-                search_used BOOLEAN DEFAULT FALSE,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (conversation_id) REFERENCES conversations (id)
-            )
-        ''')
-        
-        conn.commit()
+        # WAL lets readers and a writer from different sessions run concurrently.
+        # The journal mode is persistent, so this only has an effect once per file.
+        conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout_ms / 1000)
+        conn.execute("PRAGMA journal_mode = WAL")
         conn.close()
+        
+        self.schema_version = migrate(self.db_name, self.busy_timeout_ms / 1000)
     
     def create_or_get_user(self, username: str, display_name: str, 
                           icon: str = "👤", description: str = "") -> int:
         """Create user or get existing user ID"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        # Try to get existing user
-        cursor.execute('SELECT id FROM users WHERE username = ?', (username,))
-        result = cursor.fetchone()
-        
-        if result:
-            user_id = result[0]
-        else:
-            # Create new user
-            cursor.execute('''
-                INSERT INTO users (username, display_name, icon, description)
-                VALUES (?, ?, ?, ?)
-            ''', (username, display_name, icon, description))
-            user_id = cursor.lastrowid
+        with self.transaction() as cursor:
+            # Try to get existing user
+            cursor.execute('SELECT id FROM users WHERE username = ?', (username,))
+            result = cursor.fetchone()
+            
+            if result:
+                user_id = result[0]
+            else:
+                # Create new user
+                cursor.execute('''
+                    INSERT INTO users (username, display_name, icon, description)
+                    VALUES (?, ?, ?, ?)
+                ''', (username, display_name, icon, description))
+                user_id = cursor.lastrowid
         
-        conn.commit()
-        conn.close()
         return user_id
     
     def get_or_create_conversation(self, user_id: int, title: str = "New Conversation") -> int:
         """Get the current conversation for a user or create a new one"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        # For simplicity, each user has one main conversation
-        cursor.execute('''
-            SELECT id FROM conversations WHERE user_id = ? ORDER BY updated_at DESC LIMIT 1
-        ''', (user_id,))
-        result = cursor.fetchone()
-        
-        if result:
-            conversation_id = result[0]
-            # Update the updated_at timestamp
-            cursor.execute('''
-                UPDATE conversations SET updated_at = CURRENT_TIMESTAMP WHERE id = ?
-            ''', (conversation_id,))
-        else:
-            # Create new conversation
+        with self.transaction() as cursor:
+            # For simplicity, each user has one main conversation
             cursor.execute('''
-                INSERT INTO conversations (user_id, title) VALUES (?, ?)
-            ''', (user_id, title))
-            conversation_id = cursor.lastrowid
+                SELECT id FROM conversations WHERE user_id = ? ORDER BY updated_at DESC LIMIT 1
+            ''', (user_id,))
+            result = cursor.fetchone()
+            
+            if result:
+                conversation_id = result[0]
+                # Update the updated_at timestamp
+                cursor.execute('''
+                    UPDATE conversations SET updated_at = CURRENT_TIMESTAMP WHERE id = ?
+                ''', (conversation_id,))
+            else:
+                # Create new conversation
+                cursor.execute('''
+                    INSERT INTO conversations (user_id, title) VALUES (?, ?)
+                ''', (user_id, title))
+                conversation_id = cursor.lastrowid
         
-        conn.commit()
-        conn.close()
         return conversation_id
     
     def save_message(self, conversation_id: int, is_user: bool, content: str,
                     search_results: Optional[List[Dict]] = None, search_used: bool = False):
         """Save a message to the database"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        with self.transaction() as cursor:
+            self._insert_message(cursor, conversation_id, is_user, content, search_results, search_used)
+    
+    def save_messages(self, messages: List[Dict]):
+        """Save several messages in one transaction
         
-        search_results_json = json.dumps(search_results) if search_results else None
+        Each dict takes the save_message() arguments as keys, plus an
+        optional "timestamp" for imported or synthetic history.
+        """
+        with self.transaction() as cursor:
+            for message in messages:
+                self._insert_message(cursor, message["conversation_id"], message["is_user"],
+                                     message["content"], message.get("search_results"),
+                                     message.get("search_used", False), message.get("timestamp"))
+    
+    def _insert_message(self, cursor: sqlite3.Cursor, conversation_id: int, is_user: bool, content: str,
+                        search_results: Optional[List[Dict]], search_used: bool,
+                        timestamp: Optional[str] = None):
+        # Results are stored once and referenced by id
+        result_ids = intern_search_results(cursor, search_results) if search_results else []
         
         cursor.execute('''
-            INSERT INTO messages (conversation_id, is_user, content, search_results, search_used)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (conversation_id, is_user, content, search_results_json, search_used))
-        
-        conn.commit()
-        conn.close()
+            INSERT INTO messages (conversation_id, is_user, content, search_result_ids, search_used, timestamp)
+            VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        ''', (conversation_id, is_user, content, json.dumps(result_ids) if result_ids else None,
+              search_used, timestamp))
     
     def get_conversation_messages(self, conversation_id: int) -> List[Dict]:
         """Get all messages for a conversation"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        archived = [{key: value for key, value in m.items() if key != "id"}
+                    for m in self._get_archived_messages(conversation_id)]
         
-        cursor.execute('''
-            SELECT is_user, content, search_results, search_used, timestamp
-            FROM messages
-            WHERE conversation_id = ?
-            ORDER BY timestamp ASC
-        ''', (conversation_id,))
+        with self.connection() as conn:
+            rows = conn.execute('''
+                SELECT is_user, content, search_result_ids, search_used, timestamp
+                FROM messages
+                WHERE conversation_id = ?
+                ORDER BY timestamp ASC
+            ''', (conversation_id,)).fetchall()
+        
+        id_lists = [json.loads(row[2]) if row[2] else [] for row in rows]
+        results = self._get_search_results([i for ids in id_lists for i in ids])
         
         messages = []
-        for row in cursor.fetchall():
-            search_results = json.loads(row[2]) if row[2] else []
+        for row, ids in zip(rows, id_lists):
             messages.append({
                 "is_user": bool(row[0]),
                 "content": row[1],
-                "search_results": search_results,
+                "search_results": [results[i] for i in ids if i in results],
                 "search_used": bool(row[3]),
                 "timestamp": row[4]
             })
         
-        conn.close()
+        return archived + messages
+    
+    def get_conversation_page(self, conversation_id: int, before_id: Optional[int] = None,
+                              limit: int = 20) -> List[Dict]:
+        """Get the newest `limit` messages older than before_id, oldest first
+        
+        Search results are left unresolved; use load_search_results() when a
+        message's sources are actually shown.
+        """
+        if before_id is None:
+            before_id = 2 ** 63 - 1  # largest SQLite integer
+        
+        with self.connection() as conn:
+            rows = conn.execute('''
+                SELECT id, is_user, content, search_result_ids, search_used, timestamp
+                FROM messages
+                WHERE conversation_id = ? AND id < ?
+                ORDER BY id DESC
+                LIMIT ?
+            ''', (conversation_id, before_id, limit)).fetchall()
+        
+        messages = []
+        for row in reversed(rows):
+            messages.append({
+                "id": row[0],
+                "is_user": bool(row[1]),
+                "content": row[2],
+                "search_result_ids": row[3],
+                "search_used": bool(row[4]),
+                "timestamp": row[5]
+            })
+        
+        # Older messages of an archived conversation come from the archive
+        if len(messages) < limit:
+            oldest_id = messages[0]["id"] if messages else before_id
+            archived = [m for m in self._get_archived_messages(conversation_id) if m["id"] < oldest_id]
+            messages = archived[-(limit - len(messages)):] + messages if archived else messages
+        
         return messages
     
+    def has_search_results(self, message: Dict) -> bool:
+        """Check for sources without decoding them"""
+        return bool(message.get("search_results") or message.get("search_result_ids"))
+    
+    def load_search_results(self, message: Dict) -> List[Dict]:
+        """Resolve a message's search results on first access"""
+        if "search_results" not in message:
+            raw = message.pop("search_result_ids", None)
+            ids = json.loads(raw) if raw else []
+            results = self._get_search_results(ids)
+            message["search_results"] = [results[i] for i in ids if i in results]
+        return message["search_results"]
+    
+    def _get_search_results(self, ids: List[int]) -> Dict[int, Dict]:
+        """Look up stored results by id, through the in-memory LRU"""
+        found = {}
+        with self._result_cache_lock:
+            for result_id in ids:
+                if result_id in self._result_cache:
+                    self._result_cache.move_to_end(result_id)
+                    found[result_id] = self._result_cache[result_id]
+        
+        missing = [i for i in ids if i not in found]
+        if missing:
+            with self.connection() as conn:
+                loaded = fetch_search_results(conn, missing)
+            found.update(loaded)
+            with self._result_cache_lock:
+                self._result_cache.update(loaded)
+                while len(self._result_cache) > self.RESULT_CACHE_SIZE:
+                    self._result_cache.popitem(last=False)
+        
+        return found
+    
     def get_user_stats(self, user_id: int) -> Dict:
         """Get statistics for a user"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        # user_stats is kept current by triggers on messages and conversations
+        with self.connection() as conn:
+            row = conn.execute('''
+                SELECT message_count, search_count, last_activity FROM user_stats WHERE user_id = ?
+            ''', (user_id,)).fetchone()
         
-        # Message count
-        cursor.execute('''
-            SELECT COUNT(*) FROM messages m
-            JOIN conversations c ON m.conversation_id = c.id
-            WHERE c.user_id = ?
-        ''', (user_id,))
-        message_count = cursor.fetchone()[0]
+        if not row:
+            return {"message_count": 0, "search_count": 0, "last_activity": None}
         
-        # Searches performed
-        cursor.execute('''
-            SELECT COUNT(*) FROM messages m
-            JOIN conversations c ON m.conversation_id = c.id
-            WHERE c.user_id = ? AND m.search_used = TRUE
-        ''', (user_id,))
-        search_count = cursor.fetchone()[0]
+        return {
+            "message_count": row[0],
+            "search_count": row[1],
+            "last_activity": row[2]
+        }
+    
+    def rebuild_user_stats(self):
+        """Recompute user_stats from the messages table"""
+        with self.transaction() as cursor:
+            for statement in REBUILD_USER_STATS_SQL:
+                cursor.execute(statement)
+    
+    def search_messages(self, user_id: int, query: str, limit: int = 10,
+                        after: Optional[tuple] = None) -> List[Dict]:
+        """Full-text search over a user's messages and their sources
         
-        # Last activity
-        cursor.execute('''
-            SELECT MAX(m.timestamp) FROM messages m
-            JOIN conversations c ON m.conversation_id = c.id
-            WHERE c.user_id = ?
-        ''', (user_id,))
-        last_activity = cursor.fetchone()[0]
+        Hits are ordered by relevance and include archived conversations.
+        Pass the "cursor" of the last hit as `after` to get the next page.
+        """
+        match = self._fts_query(query)
+        if not match:
+            return []
         
-        conn.close()
+        rank_after, id_after = after if after else (float("-inf"), 0)
+        
+        with self.connection() as conn:
+            rows = conn.execute('''
+                SELECT f.rowid, COALESCE(m.conversation_id, a.conversation_id),
+                       COALESCE(m.is_user, a.is_user), COALESCE(m.timestamp, a.timestamp), f.rank,
+                       snippet(messages_fts, 0, '**', '**', '…', 16),
+                       snippet(messages_fts, 1, '**', '**', '…', 12)
+                FROM messages_fts f
+                LEFT JOIN messages m ON m.id = f.rowid
+                LEFT JOIN archived_messages a ON a.message_id = f.rowid
+                JOIN conversations c ON c.id = COALESCE(m.conversation_id, a.conversation_id)
+                WHERE messages_fts MATCH ? AND c.user_id = ?
+                  AND (f.rank > ? OR (f.rank = ? AND f.rowid > ?))
+                ORDER BY f.rank, f.rowid
+                LIMIT ?
+            ''', (match, user_id, rank_after, rank_after, id_after, limit)).fetchall()
+        
+        hits = []
+        for row in rows:
+            hits.append({
+                "message_id": row[0],
+                "conversation_id": row[1],
+                "is_user": bool(row[2]),
+                "timestamp": row[3],
+                "snippet": row[5],
+                "source_snippet": row[6] if "**" in (row[6] or "") else None,
+                "cursor": (row[4], row[0])
+            })
+        
+        return hits
+    
+    def _fts_query(self, query: str) -> str:
+        """Quote user input as FTS5 terms, prefix-matching the last word"""
+        terms = [term.replace('"', '""') for term in query.split() if term.strip('"')]
+        if not terms:
+            return ""
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += "*"
+        return " ".join(quoted)
+    
+    def backfill_fts(self, chunk_size: int = 500) -> Dict:
+        """Index one chunk of messages that predate the FTS triggers
+        
+        Each call is its own short transaction; call repeatedly until
+        "done" is True.
+        """
+        with self.transaction() as cursor:
+            cursor.execute('''
+                SELECT name, CAST(value AS INTEGER) FROM maintenance_state
+                WHERE name IN ('fts_backfill_last', 'fts_backfill_target')
+            ''')
+            state = dict(cursor.fetchall())
+            last_id = state.get("fts_backfill_last", 0)
+            target_id = state.get("fts_backfill_target", 0)
+            
+            if last_id >= target_id:
+                return {"indexed": 0, "last_message_id": last_id, "target_message_id": target_id, "done": True}
+            
+            cursor.execute('''
+                SELECT id FROM messages WHERE id > ? AND id <= ? ORDER BY id LIMIT ?
+            ''', (last_id, target_id, chunk_size))
+            ids = [row[0] for row in cursor.fetchall()]
+            chunk_end = ids[-1] if ids else target_id
+            
+            cursor.execute(f'''
+                INSERT OR REPLACE INTO messages_fts (rowid, content, sources)
+                SELECT m.id, m.content, ({FTS_SOURCES_SQL.format(ids="m.search_result_ids")})
+                FROM messages m WHERE m.id > ? AND m.id <= ?
+            ''', (last_id, chunk_end))
+            cursor.execute('''
+                UPDATE maintenance_state SET value = ? WHERE name = 'fts_backfill_last'
+            ''', (chunk_end,))
+        
+        return {"indexed": len(ids), "last_message_id": chunk_end, "target_message_id": target_id,
+                "done": chunk_end >= target_id}
+    
+    def archive_idle_conversations(self, idle_days: float, codec: str = "zlib", limit: int = 50) -> Dict:
+        """Move messages of conversations idle for idle_days into compressed archive rows
+        
+        Each conversation is archived in its own short transaction. Messages
+        added to an archived conversation later are merged into the archive
+        the next time it goes idle.
+        """
+        if codec not in self.CODECS:
+            raise ValueError(f"Unknown archive codec: {codec}")
+        
+        with self.connection() as conn:
+            conversation_ids = [row[0] for row in conn.execute('''
+                SELECT c.id FROM conversations c
+                WHERE c.updated_at < datetime('now', ?)
+                  AND EXISTS (SELECT 1 FROM messages m WHERE m.conversation_id = c.id)
+                  AND NOT EXISTS (SELECT 1 FROM messages m WHERE m.conversation_id = c.id
+                                  AND m.timestamp >= datetime('now', ?))
+                ORDER BY c.updated_at
+                LIMIT ?
+            ''', (f"-{idle_days} days", f"-{idle_days} days", limit)).fetchall()]
+        
+        archived_messages = 0
+        raw_bytes = 0
+        stored_bytes = 0
+        for conversation_id in conversation_ids:
+            result = self._archive_conversation(conversation_id, codec)
+            archived_messages += result["messages"]
+            raw_bytes += result["raw_size"]
+            stored_bytes += result["stored_size"]
         
         return {
-            "message_count": message_count,
-            "search_count": search_count,
-            "last_activity": last_activity
+            "conversations": len(conversation_ids),
+            "messages": archived_messages,
+            "raw_bytes": raw_bytes,
+            "stored_bytes": stored_bytes
         }
     
+    def _archive_conversation(self, conversation_id: int, codec: str) -> Dict:
+        compress = self.CODECS[codec][0]
+        
+        with self.transaction() as cursor:
+            cursor.execute('''
+                SELECT id, is_user, content, search_result_ids, search_used, timestamp
+                FROM messages WHERE conversation_id = ? ORDER BY id
+            ''', (conversation_id,))
+            rows = cursor.fetchall()
+            if not rows:
+                return {"messages": 0, "raw_size": 0, "stored_size": 0}
+            
+            id_lists = [json.loads(row[3]) if row[3] else [] for row in rows]
+            results = fetch_search_results(cursor.connection, [i for ids in id_lists for i in ids])
+            
+            # The archive is self-contained: search results are embedded
+            messages = self._get_archived_messages(conversation_id, cursor.connection)
+            for row, ids in zip(rows, id_lists):
+                messages.append({
+                    "id": row[0],
+                    "is_user": bool(row[1]),
+                    "content": row[2],
+                    "search_results": [results[i] for i in ids if i in results],
+                    "search_used": bool(row[4]),
+                    "timestamp": row[5]
+                })
+            
+            raw = json.dumps(messages, ensure_ascii=False).encode("utf-8")
+            payload = compress(raw)
+            
+            # Messages archived before the FTS backfill reached them get indexed now;
+            # the archived_messages rows keep the index entries through the delete
+            cursor.execute(f'''
+                INSERT INTO messages_fts (rowid, content, sources)
+                SELECT m.id, m.content, ({FTS_SOURCES_SQL.format(ids="m.search_result_ids")})
+                FROM messages m
+                WHERE m.conversation_id = ? AND NOT EXISTS (SELECT 1 FROM messages_fts f WHERE f.rowid = m.id)
+            ''', (conversation_id,))
+            cursor.execute('''
+                INSERT OR REPLACE INTO archived_messages (message_id, conversation_id, is_user, timestamp)
+                SELECT id, conversation_id, is_user, timestamp FROM messages WHERE conversation_id = ?
+            ''', (conversation_id,))
+            
+            # Written before the delete so the stats trigger treats it as a move
+            cursor.execute('''
+                INSERT OR REPLACE INTO archived_conversations
+                    (conversation_id, message_count, search_count, last_message_id, last_timestamp,
+                     codec, payload, raw_size)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (conversation_id, len(messages), sum(1 for m in messages if m["search_used"]),
+                  messages[-1]["id"], max(m["timestamp"] for m in messages), codec, payload, len(raw)))
+            cursor.execute('DELETE FROM messages WHERE conversation_id = ?', (conversation_id,))
+        
+        with self._archive_cache_lock:
+            self._archive_cache.pop(conversation_id, None)
+        
+        return {"messages": len(rows), "raw_size": len(raw), "stored_size": len(payload)}
+    
+    def _get_archived_messages(self, conversation_id: int, conn: Optional[sqlite3.Connection] = None) -> List[Dict]:
+        """Decompress an archived conversation, [] if it has no archive"""
+        with self._archive_cache_lock:
+            if conversation_id in self._archive_cache:
+                self._archive_cache.move_to_end(conversation_id)
+                return [dict(m) for m in self._archive_cache[conversation_id]]
+        
+        query = 'SELECT codec, payload FROM archived_conversations WHERE conversation_id = ?'
+        if conn is not None:
+            row = conn.execute(query, (conversation_id,)).fetchone()
+        else:
+            with self.connection() as pooled:
+                row = pooled.execute(query, (conversation_id,)).fetchone()
+        if not row:
+            return []
+        
+        messages = json.loads(self.CODECS[row[0]][1](row[1]).decode("utf-8"))
+        with self._archive_cache_lock:
+            self._archive_cache[conversation_id] = messages
+            while len(self._archive_cache) > self.ARCHIVE_CACHE_SIZE:
+                self._archive_cache.popitem(last=False)
+        return [dict(m) for m in messages]
+    
+    def compact(self, max_pages: int = 2000, allow_full_vacuum: bool = False) -> Dict:
+        """Return free pages to the file system a bounded amount at a time
+        
+        Incremental vacuum needs auto_vacuum=INCREMENTAL, which an existing
+        database only gets through one full VACUUM (allow_full_vacuum).
+        """
+        # VACUUM cannot run inside a transaction, use a dedicated autocommit connection
+        conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+        try:
+            mode = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+            if mode != 2:
+                if not allow_full_vacuum:
+                    return {"mode": mode, "freed_pages": 0, "full_vacuum": False}
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.execute('VACUUM')
+                return {"mode": 2, "freed_pages": None, "full_vacuum": True}
+            
+            before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            conn.execute(f'PRAGMA incremental_vacuum({int(max_pages)})').fetchall()
+            after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+            conn.execute('PRAGMA optimize')
+            return {"mode": mode, "freed_pages": before - after, "remaining_free_pages": after,
+                    "full_vacuum": False}
+        finally:
+            conn.close()
+    
     def clear_user_data(self, user_id: int):
         """Clear all data for a user (for testing)"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        self.delete_user_data(user_id)
+    
+    def delete_user_data(self, user_id: int, chunk_size: int = 500,
+                         progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Delete a user's conversations and messages in short transactions
         
-        # Delete messages
-        cursor.execute('''
-            DELETE FROM messages WHERE conversation_id IN (
-                SELECT id FROM conversations WHERE user_id = ?
-            )
-        ''', (user_id,))
+        Messages go in chunks of chunk_size so live sessions can write in
+        between; each emptied conversation is then deleted, cascading to
+        its archive. progress, if given, is called after every chunk.
+        """
+        with self.connection() as conn:
+            conversation_ids = [row[0] for row in conn.execute(
+                'SELECT id FROM conversations WHERE user_id = ?', (user_id,))]
+        
+        # deleted_messages includes archived ones, reported again in deleted_archived_messages
+        status = {"deleted_messages": 0, "deleted_archived_messages": 0, "deleted_conversations": 0,
+                  "total_messages": self.get_user_stats(user_id)["message_count"]}
+        
+        for conversation_id in conversation_ids:
+            status["deleted_messages"] += self._delete_messages_chunked(
+                'conversation_id = ?', (conversation_id,), chunk_size, status, progress)
+            with self.transaction() as cursor:
+                cursor.execute('SELECT message_count FROM archived_conversations WHERE conversation_id = ?',
+                               (conversation_id,))
+                row = cursor.fetchone()
+                cursor.execute('DELETE FROM conversations WHERE id = ?', (conversation_id,))
+                status["deleted_conversations"] += cursor.rowcount
+                if row and cursor.rowcount:
+                    status["deleted_messages"] += row[0]
+                    status["deleted_archived_messages"] += row[0]
+            if progress:
+                progress(dict(status))
+        
+        return status
+    
+    def apply_retention(self, max_age_days: float, chunk_size: int = 500,
+                        progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Delete messages older than max_age_days and conversations left with nothing
+        
+        Archives are kept or dropped whole: an archived conversation goes
+        once it has no newer messages and its archive is entirely expired.
+        """
+        cutoff = f"-{max_age_days} days"
+        status = {"deleted_messages": 0, "deleted_conversations": 0}
+        
+        status["deleted_messages"] = self._delete_messages_chunked(
+            "timestamp < datetime('now', ?)", (cutoff,), chunk_size, status, progress, order_by="timestamp")
+        
+        while True:
+            with self.transaction() as cursor:
+                cursor.execute('''
+                    DELETE FROM conversations WHERE id IN (
+                        SELECT c.id FROM conversations c
+                        LEFT JOIN archived_conversations a ON a.conversation_id = c.id
+                        WHERE c.updated_at < datetime('now', ?)
+                          AND NOT EXISTS (SELECT 1 FROM messages m WHERE m.conversation_id = c.id)
+                          AND (a.conversation_id IS NULL OR a.last_timestamp < datetime('now', ?))
+                        LIMIT ?
+                    )
+                ''', (cutoff, cutoff, chunk_size))
+                deleted = cursor.rowcount
+            status["deleted_conversations"] += deleted
+            if progress:
+                progress(dict(status))
+            if deleted < chunk_size:
+                break
+        
+        status["purged_search_results"] = self.purge_orphan_search_results(chunk_size)
+        return status
+    
+    def _delete_messages_chunked(self, where: str, params: tuple, chunk_size: int, status: Dict,
+                                 progress: Optional[Callable[[Dict], None]], order_by: str = "id") -> int:
+        """DELETE matching messages chunk_size rows per transaction, return the count"""
+        deleted_total = 0
+        while True:
+            with self.transaction() as cursor:
+                cursor.execute(f'''
+                    DELETE FROM messages WHERE id IN (
+                        SELECT id FROM messages WHERE {where} ORDER BY {order_by} LIMIT ?
+                    )
+                ''', (*params, chunk_size))
+                deleted = cursor.rowcount
+            deleted_total += deleted
+            if progress and deleted:
+                progress(dict(status, deleted_messages=status["deleted_messages"] + deleted_total))
+            if deleted < chunk_size:
+                return deleted_total
+    
+    def purge_orphan_search_results(self, chunk_size: int = 500) -> int:
+        """Delete stored search results no message references any more"""
+        # One read-only pass collects references; the short delete
+        # transactions then only re-check messages written since.
+        with self.connection() as conn:
+            scanned_upto = conn.execute('SELECT COALESCE(MAX(id), 0) FROM messages').fetchone()[0]
+            referenced = {row[0] for row in conn.execute('''
+                SELECT DISTINCT j.value FROM messages m, json_each(m.search_result_ids) j
+                WHERE m.search_result_ids IS NOT NULL AND m.id <= ?
+            ''', (scanned_upto,))}
+            candidates = [row[0] for row in conn.execute('SELECT id FROM search_result_store')
+                          if row[0] not in referenced]
+        
+        purged = 0
+        for start in range(0, len(candidates), chunk_size):
+            chunk = candidates[start:start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            with self.transaction() as cursor:
+                cursor.execute(f'''
+                    DELETE FROM search_result_store WHERE id IN ({placeholders})
+                      AND id NOT IN (
+                          SELECT j.value FROM messages m, json_each(m.search_result_ids) j
+                          WHERE m.id > ? AND m.search_result_ids IS NOT NULL
+                      )
+                ''', (*chunk, scanned_upto))
+                purged += cursor.rowcount
         
-        # Delete conversations
-        cursor.execute('DELETE FROM conversations WHERE user_id = ?', (user_id,))
+        with self._result_cache_lock:
+            for result_id in candidates:
+                self._result_cache.pop(result_id, None)
         
-        conn.commit()
-        conn.close()
\ No newline at end of file
+        return purged
\ No newline at end of file
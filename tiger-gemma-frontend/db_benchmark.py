@@ -0,0 +1,328 @@
+"""Benchmark DatabaseManager against synthetic chat histories.
+
+Generates users, conversations and messages (with search results shaped
+like UserAwareSearchEngine output) into a scratch database, then times the
+hot DatabaseManager calls single-threaded and under concurrent access and
+writes a JSON report. Reports from two runs can be compared side by side.
+
+    python db_benchmark.py generate --db bench.db --users 200 --conversations 5 --messages 1000
+    python db_benchmark.py run --db bench.db --iterations 2000 --threads 8
+    python db_benchmark.py compare db_bench_before.json db_bench_after.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from config import USERS
+from database import DatabaseManager
+from load_test import StageStats, persona_prompts
+
+OPERATIONS = ["save_message", "get_conversation_messages", "get_user_stats",
+              "get_or_create_conversation", "clear_user_data"]
+
+# Share of assistant answers that used search, per persona
+SEARCH_RATIO = {"researcher": 0.7, "student": 0.5, "business": 0.6, "shopping": 0.95}
+
+SHOPPING_SITES = [("Amazon", "https://www.amazon.de/s?k="), ("Idealo", "https://www.idealo.de/preisvergleich/"),
+                  ("eBay", "https://www.ebay.de/sch/"), ("Geizhals", "https://geizhals.de/?fs=")]
+
+FILLER = ("the analysis shows several relevant points sources examples data trends results "
+          "price quality overview summary method study market product comparison learning").split()
+
+class HistoryGenerator:
+    """Synthetic users, conversations and messages at configurable scale"""
+
+    def __init__(self, db_manager: DatabaseManager, seed: int = 42, distinct_results: int = 2000,
+                 days: int = 90, batch_size: int = 1000):
+        self.db_manager = db_manager
+        self.rng = random.Random(seed)
+        self.days = days
+        self.batch_size = batch_size
+        self.words = {user_type: " ".join(persona_prompts(user_type)).lower().split() + FILLER
+                      for user_type in USERS}
+        # A bounded pool per persona, so result deduplication behaves like real traffic
+        self.result_pool = {user_type: [self._search_result(user_type, i) for i in range(distinct_results)]
+                            for user_type in USERS}
+
+    def _text(self, user_type: str, low: int, high: int) -> str:
+        return " ".join(self.rng.choice(self.words[user_type]) for _ in range(self.rng.randint(low, high)))
+
+    def _search_result(self, user_type: str, index: int) -> Dict:
+        title = self._text(user_type, 3, 8).title()
+        if user_type == "shopping":
+            site, url = SHOPPING_SITES[index % len(SHOPPING_SITES)]
+            return {"source": "shopping", "title": f"{title} | {site}", "snippet": f"{title} bei {site} kaufen.",
+                    "url": f"{url}{index}", "relevance": 1.0, "site": site, "type": "product_link"}
+        source = "wikipedia" if user_type == "researcher" and index % 2 else "duckduckgo"
+        result_type = {"researcher": "academic", "student": "educational", "business": "business"}[user_type]
+        return {"source": source, "title": title, "snippet": self._text(user_type, 15, 40),
+                "url": f"https://example.org/{user_type}/{index}", "relevance": round(self.rng.uniform(0.5, 1.0), 2),
+                "type": result_type}
+
+    def _conversation_messages(self, conversation_id: int, user_type: str, count: int, start: datetime) -> List[Dict]:
+        messages = []
+        timestamp = start
+        for i in range(count):
+            is_user = i % 2 == 0
+            search_used = not is_user and self.rng.random() < SEARCH_RATIO[user_type]
+            messages.append({
+                "conversation_id": conversation_id,
+                "is_user": is_user,
+                "content": self._text(user_type, 8, 30) if is_user else self._text(user_type, 60, 300),
+                "search_results": self.rng.sample(self.result_pool[user_type], self.rng.randint(3, 5))
+                                  if search_used else None,
+                "search_used": search_used,
+                "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S")
+            })
+            timestamp += timedelta(seconds=self.rng.randint(5, 600))
+        return messages
+
+    def create_user(self, username: str, user_type: str, conversations: int, messages: int) -> int:
+        """Create one user with its conversations and messages, return the user id"""
+        user_info = USERS[user_type]
+        user_id = self.db_manager.create_or_get_user(username, user_info["name"], user_info["icon"],
+                                                     user_info["description"])
+        pending = []
+        for _ in range(conversations):
+            start = datetime.utcnow() - timedelta(days=self.rng.uniform(0, self.days))
+            with self.db_manager.transaction() as cursor:
+                cursor.execute('''
+                    INSERT INTO conversations (user_id, title, created_at, updated_at) VALUES (?, ?, ?, ?)
+                ''', (user_id, "Benchmark Conversation", start.strftime("%Y-%m-%d %H:%M:%S"),
+                      start.strftime("%Y-%m-%d %H:%M:%S")))
+                conversation_id = cursor.lastrowid
+            pending.extend(self._conversation_messages(conversation_id, user_type, messages, start))
+            while len(pending) >= self.batch_size:
+                self.db_manager.save_messages(pending[:self.batch_size])
+                del pending[:self.batch_size]
+        if pending:
+            self.db_manager.save_messages(pending)
+        return user_id
+
+    def generate(self, users: int, conversations: int, messages: int):
+        started = time.perf_counter()
+        user_types = list(USERS)
+        for i in range(users):
+            user_type = user_types[i % len(user_types)]
+            self.create_user(f"{user_type}_bench_{i}", user_type, conversations, messages)
+            done = (i + 1) * conversations * messages
+            print(f"🧪 {i + 1}/{users} users, {done} messages "
+                  f"({done / (time.perf_counter() - started):.0f}/s)", end="\r", flush=True)
+        print()
+
+def dataset_summary(db_manager: DatabaseManager) -> Dict:
+    with db_manager.connection() as conn:
+        counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                  for table in ("users", "conversations", "messages", "search_result_store",
+                                "archived_conversations")}
+    counts["db_bytes"] = os.path.getsize(db_manager.db_name)
+    counts["schema_version"] = db_manager.schema_version
+    return counts
+
+class DatabaseBenchmark:
+    def __init__(self, db_name: str, iterations: int, threads: int, clear_users: int = 20,
+                 clear_messages: int = 200, seed: int = 7):
+        self.db_name = db_name
+        self.iterations = iterations
+        self.threads = threads
+        self.clear_users = clear_users
+        self.clear_messages = clear_messages
+        self.seed = seed
+
+    def _targets(self, db_manager: DatabaseManager):
+        with db_manager.connection() as conn:
+            users = [row[0] for row in conn.execute("SELECT id FROM users WHERE username LIKE '%_bench_%'")]
+            conversations = [row[0] for row in conn.execute('''
+                SELECT c.id FROM conversations c JOIN users u ON c.user_id = u.id
+                WHERE u.username LIKE '%_bench_%'
+            ''')]
+        if not users or not conversations:
+            raise SystemExit("No benchmark data found, run the generate command first")
+        return users, conversations
+
+    def _operation(self, name: str, db_manager: DatabaseManager, generator: HistoryGenerator,
+                   users: List[int], conversations: List[int], victims: List[int], rng: random.Random):
+        if name == "save_message":
+            conversation_id = rng.choice(conversations)
+            message = generator._conversation_messages(conversation_id, "researcher", 2, datetime.utcnow())[1]
+            return lambda: db_manager.save_message(conversation_id, False, message["content"],
+                                                   message["search_results"], message["search_used"])
+        if name == "get_conversation_messages":
+            conversation_id = rng.choice(conversations)
+            return lambda: db_manager.get_conversation_messages(conversation_id)
+        if name == "get_user_stats":
+            user_id = rng.choice(users)
+            return lambda: db_manager.get_user_stats(user_id)
+        if name == "get_or_create_conversation":
+            user_id = rng.choice(users)
+            return lambda: db_manager.get_or_create_conversation(user_id)
+        if not victims:
+            return None
+        user_id = victims.pop()
+        return lambda: db_manager.clear_user_data(user_id)
+
+    def _phase(self, db_manager: DatabaseManager, generator: HistoryGenerator, users: List[int],
+               conversations: List[int], victims: List[int], threads: int) -> Dict:
+        results = {}
+        for name in OPERATIONS:
+            stats = StageStats()
+            lock = threading.Lock()
+            iterations = min(self.iterations, len(victims)) if name == "clear_user_data" else self.iterations
+
+            def worker(worker_index: int, count: int):
+                rng = random.Random(self.seed * 1000 + worker_index)
+                for _ in range(count):
+                    with lock:
+                        call = self._operation(name, db_manager, generator, users, conversations, victims, rng)
+                    if call is None:
+                        return
+                    started = time.perf_counter()
+                    try:
+                        call()
+                    except sqlite3.Error:
+                        with lock:
+                            stats.errors += 1
+                        continue
+                    with lock:
+                        stats.samples.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            workers = [threading.Thread(target=worker, args=(i, iterations // threads + (i < iterations % threads)))
+                       for i in range(threads)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            results[name] = stats.report(time.perf_counter() - started)
+        return results
+
+    def run(self) -> Dict:
+        db_manager = DatabaseManager(self.db_name)
+        generator = HistoryGenerator(db_manager, seed=self.seed, distinct_results=200)
+        started_at = datetime.now().isoformat(timespec="seconds")
+        try:
+            users, conversations = self._targets(db_manager)
+            dataset = dataset_summary(db_manager)
+
+            # Throwaway users for clear_user_data, half for each phase
+            print(f"🧪 Creating {self.clear_users} users to delete")
+            victims = [generator.create_user(f"clear_target_{started_at}_{i}", list(USERS)[i % len(USERS)],
+                                             1, self.clear_messages)
+                       for i in range(self.clear_users)]
+            half = len(victims) // 2
+
+            print("⏱️ Single-threaded phase")
+            single = self._phase(db_manager, generator, users, conversations, victims[:half], 1)
+            print(f"⏱️ Concurrent phase ({self.threads} threads)")
+            concurrent = self._phase(db_manager, generator, users, conversations, victims[half:], self.threads)
+        finally:
+            db_manager.close()
+
+        return {
+            "started_at": started_at,
+            "config": {
+                "db_name": self.db_name,
+                "iterations": self.iterations,
+                "threads": self.threads,
+                "clear_users": self.clear_users,
+                "clear_messages": self.clear_messages
+            },
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "sqlite": sqlite3.sqlite_version
+            },
+            "dataset": dataset,
+            "results": {"single": single, "concurrent": concurrent}
+        }
+
+def print_summary(report: Dict):
+    dataset = report["dataset"]
+    print(f"\n{dataset['messages']} messages, {dataset['conversations']} conversations, "
+          f"{dataset['db_bytes'] / 1e6:.1f} MB")
+    print(f"{'operation':<28}{'mode':<12}{'count':>7}{'err':>5}{'p50':>10}{'p99':>10}{'per s':>10}")
+    for mode, operations in report["results"].items():
+        for name, stats in operations.items():
+            print(f"{name:<28}{mode:<12}{stats['count']:>7}{stats['errors']:>5}"
+                  f"{stats['p50_ms'] or 0:>10.2f}{stats['p99_ms'] or 0:>10.2f}{stats['throughput_per_s']:>10.1f}")
+
+def compare(before: Dict, after: Dict):
+    """Print p50/p99/throughput of two reports with relative change"""
+    def delta(old, new):
+        return f"{(new - old) / old:+.0%}" if old and new is not None else "n/a"
+
+    print(f"{'operation':<28}{'mode':<12}{'p50 before':>11}{'after':>9}{'Δ':>7}"
+          f"{'p99 before':>12}{'after':>9}{'Δ':>7}{'per s Δ':>9}")
+    for mode, operations in after["results"].items():
+        for name, new in operations.items():
+            old = before["results"].get(mode, {}).get(name)
+            if not old:
+                continue
+            print(f"{name:<28}{mode:<12}{old['p50_ms'] or 0:>11.2f}{new['p50_ms'] or 0:>9.2f}"
+                  f"{delta(old['p50_ms'], new['p50_ms']):>7}{old['p99_ms'] or 0:>12.2f}{new['p99_ms'] or 0:>9.2f}"
+                  f"{delta(old['p99_ms'], new['p99_ms']):>7}"
+                  f"{delta(old['throughput_per_s'], new['throughput_per_s']):>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="DatabaseManager benchmark with synthetic chat histories")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="fill a scratch database with synthetic history")
+    generate_parser.add_argument("--db", default="bench.db", help="scratch database (never the real history)")
+    generate_parser.add_argument("--users", type=int, default=100)
+    generate_parser.add_argument("--conversations", type=int, default=5, help="per user")
+    generate_parser.add_argument("--messages", type=int, default=200, help="per conversation")
+    generate_parser.add_argument("--distinct-results", type=int, default=2000, help="search result pool per persona")
+    generate_parser.add_argument("--days", type=int, default=90, help="spread timestamps over this many days")
+    generate_parser.add_argument("--seed", type=int, default=42)
+
+    run_parser = subparsers.add_parser("run", help="time DatabaseManager operations")
+    run_parser.add_argument("--db", default="bench.db")
+    run_parser.add_argument("--iterations", type=int, default=1000, help="calls per operation and phase")
+    run_parser.add_argument("--threads", type=int, default=8, help="threads in the concurrent phase")
+    run_parser.add_argument("--clear-users", type=int, default=20, help="users created for clear_user_data")
+    run_parser.add_argument("--clear-messages", type=int, default=200, help="messages per deleted user")
+    run_parser.add_argument("--report", help="JSON report path (default: db_bench_<timestamp>.json)")
+
+    compare_parser = subparsers.add_parser("compare", help="compare two JSON reports")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        db_manager = DatabaseManager(args.db)
+        try:
+            HistoryGenerator(db_manager, args.seed, args.distinct_results, args.days).generate(
+                args.users, args.conversations, args.messages)
+            print(json.dumps(dataset_summary(db_manager), indent=2))
+        finally:
+            db_manager.close()
+        return
+
+    if args.command == "compare":
+        with open(args.before, encoding="utf-8") as f:
+            before = json.load(f)
+        with open(args.after, encoding="utf-8") as f:
+            after = json.load(f)
+        compare(before, after)
+        return
+
+    report = DatabaseBenchmark(args.db, args.iterations, args.threads,
+                               args.clear_users, args.clear_messages).run()
+    report_path = args.report or f"db_bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print_summary(report)
+    print(f"\nReport written to {report_path}")
+
+if __name__ == "__main__":
+    main()
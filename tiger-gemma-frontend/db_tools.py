@@ -0,0 +1,142 @@
+"""Maintenance commands for the chat history database.
+
+    python db_tools.py rebuild-stats [--db chat_history.db]
+    python db_tools.py backfill-fts [--chunk-size 500] [--pause 0.05]
+    python db_tools.py archive [--idle-days 30] [--codec zlib|lzma]
+    python db_tools.py compact [--pages 2000] [--full]
+    python db_tools.py purge-user --username shopping [--chunk-size 500]
+    python db_tools.py retention --max-age-days 365 [--chunk-size 500]
+    python db_tools.py export-usage [--format csv|ndjson] [--granularity day] [--since 2025-01-01]
+"""
+import argparse
+import sys
+import time
+
+from config import (DATABASE_NAME, ARCHIVE_AFTER_DAYS, ARCHIVE_CODEC, VACUUM_PAGES_PER_RUN,
+                    RETENTION_DAYS, DELETE_CHUNK_SIZE)
+from database import DatabaseManager
+from analytics import UsageAnalytics, GRANULARITIES
+
+def rebuild_stats(db_manager: DatabaseManager, args):
+    db_manager.rebuild_user_stats()
+    print("✅ user_stats rebuilt")
+
+def backfill_fts(db_manager: DatabaseManager, args):
+    while True:
+        progress = db_manager.backfill_fts(args.chunk_size)
+        print(f"🔎 Indexed up to message {progress['last_message_id']} of {progress['target_message_id']}")
+        if progress["done"]:
+            break
+        # Give live sessions a chance at the write lock between chunks
+        time.sleep(args.pause)
+    print("✅ Full-text index backfilled")
+
+def archive(db_manager: DatabaseManager, args):
+    total = {"conversations": 0, "messages": 0, "raw_bytes": 0, "stored_bytes": 0}
+    while True:
+        result = db_manager.archive_idle_conversations(args.idle_days, args.codec)
+        for key in total:
+            total[key] += result[key]
+        if not result["conversations"]:
+            break
+    ratio = total["stored_bytes"] / total["raw_bytes"] if total["raw_bytes"] else 0
+    print(f"📦 Archived {total['messages']} messages from {total['conversations']} conversations "
+          f"({total['raw_bytes']} → {total['stored_bytes']} bytes, {ratio:.0%})")
+
+def compact(db_manager: DatabaseManager, args):
+    result = db_manager.compact(args.pages, allow_full_vacuum=args.full)
+    if result["full_vacuum"]:
+        print("✅ Switched to incremental auto-vacuum (full VACUUM done)")
+    elif result["mode"] != 2:
+        print("⚠️ Incremental vacuum not enabled yet, run once with --full")
+    else:
+        print(f"✅ Freed {result['freed_pages']} pages, {result['remaining_free_pages']} free pages left")
+
+def print_progress(status):
+    print(f"🗑️ Deleted {status['deleted_messages']} messages, "
+          f"{status['deleted_conversations']} conversations", end="\r", flush=True)
+
+def purge_user(db_manager: DatabaseManager, args):
+    with db_manager.connection() as conn:
+        row = conn.execute('SELECT id FROM users WHERE username = ?', (args.username,)).fetchone()
+    if not row:
+        print(f"❌ Unknown user {args.username}")
+        return
+    status = db_manager.delete_user_data(row[0], args.chunk_size, print_progress)
+    purged = db_manager.purge_orphan_search_results(args.chunk_size)
+    print(f"\n✅ Removed {status['deleted_messages']} messages, {status['deleted_conversations']} "
+          f"conversations and {purged} unreferenced search results for {args.username}")
+
+def retention(db_manager: DatabaseManager, args):
+    if not args.max_age_days:
+        print("⚠️ No retention period given (set RETENTION_DAYS or pass --max-age-days)")
+        return
+    status = db_manager.apply_retention(args.max_age_days, args.chunk_size, print_progress)
+    print(f"\n✅ Removed {status['deleted_messages']} messages, {status['deleted_conversations']} "
+          f"conversations and {status['purged_search_results']} unreferenced search results")
+
+def export_usage(db_manager: DatabaseManager, args):
+    user_types = args.user_type or None
+    if args.out:
+        with open(args.out, "w", encoding="utf-8", newline="") as out:
+            count = UsageAnalytics(db_manager).export(out, args.format, args.granularity,
+                                                      args.since, args.until, user_types)
+        print(f"📊 Wrote {count} rows to {args.out}")
+    else:
+        UsageAnalytics(db_manager).export(sys.stdout, args.format, args.granularity,
+                                          args.since, args.until, user_types)
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat history database maintenance")
+    parser.add_argument("--db", default=DATABASE_NAME)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("rebuild-stats", help="recompute per-user statistics from messages")
+
+    fts_parser = subparsers.add_parser("backfill-fts", help="index messages that predate full-text search")
+    fts_parser.add_argument("--chunk-size", type=int, default=500)
+    fts_parser.add_argument("--pause", type=float, default=0.05, help="seconds between chunks")
+
+    archive_parser = subparsers.add_parser("archive", help="compress idle conversations into the archive")
+    archive_parser.add_argument("--idle-days", type=float, default=ARCHIVE_AFTER_DAYS)
+    archive_parser.add_argument("--codec", choices=["zlib", "lzma"], default=ARCHIVE_CODEC)
+
+    compact_parser = subparsers.add_parser("compact", help="free unused pages with incremental vacuum")
+    compact_parser.add_argument("--pages", type=int, default=VACUUM_PAGES_PER_RUN)
+    compact_parser.add_argument("--full", action="store_true", help="allow the one-time full VACUUM")
+
+    purge_parser = subparsers.add_parser("purge-user", help="delete one user's conversations in chunks")
+    purge_parser.add_argument("--username", required=True)
+    purge_parser.add_argument("--chunk-size", type=int, default=DELETE_CHUNK_SIZE)
+
+    retention_parser = subparsers.add_parser("retention", help="delete messages older than the retention period")
+    retention_parser.add_argument("--max-age-days", type=float, default=RETENTION_DAYS)
+    retention_parser.add_argument("--chunk-size", type=int, default=DELETE_CHUNK_SIZE)
+
+    usage_parser = subparsers.add_parser("export-usage", help="stream hourly usage rollups as CSV or NDJSON")
+    usage_parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    usage_parser.add_argument("--granularity", choices=list(GRANULARITIES), default="hour")
+    usage_parser.add_argument("--since", help="inclusive start, e.g. 2025-01-01")
+    usage_parser.add_argument("--until", help="exclusive end")
+    usage_parser.add_argument("--user-type", action="append", help="repeat to select several personas")
+    usage_parser.add_argument("--out", help="output file (default: stdout)")
+
+    args = parser.parse_args()
+    db_manager = DatabaseManager(args.db)
+
+    commands = {
+        "rebuild-stats": rebuild_stats,
+        "backfill-fts": backfill_fts,
+        "archive": archive,
+        "compact": compact,
+        "purge-user": purge_user,
+        "retention": retention,
+        "export-usage": export_usage,
+    }
+    try:
+        commands[args.command](db_manager, args)
+    finally:
+        db_manager.close()
+
+if __name__ == "__main__":
+    main()
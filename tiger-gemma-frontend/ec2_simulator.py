@@ -0,0 +1,338 @@
+"""Offline stand-in for the EC2 API used by AWSInstanceManager.
+
+Models the instance lifecycle (stopped -> pending -> running -> stopping
+-> stopped) with configurable delays, public IP assignment on start and
+RequestLimitExceeded throttling, so start/stop flows and the UI can run
+without AWS credentials. Select it with EC2_BACKEND=simulator, or
+benchmark it directly:
+
+    python stub_server.py --port 8000 --load-delay 20 &
+    python ec2_simulator.py coldstart --cycles 3 --pending 30 --port 8000
+    python ec2_simulator.py throttle --sessions 50 --max-calls-per-second 5 --ttl 0
+
+The simulated public IP defaults to 127.0.0.1, so a local stub server
+plays the model server during a cold start.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+from config import (EC2_SIM_PENDING_SECONDS, EC2_SIM_STOPPING_SECONDS, EC2_SIM_JITTER,
+                    EC2_SIM_API_LATENCY_MS, EC2_SIM_THROTTLE_RATE, EC2_SIM_MAX_CALLS_PER_SECOND,
+                    EC2_SIM_PUBLIC_IP)
+
+# EC2 state codes
+STATE_CODES = {"pending": 0, "running": 16, "shutting-down": 32, "terminated": 48,
+               "stopping": 64, "stopped": 80}
+
+class SimulatedInstance:
+    def __init__(self, instance_id: str, region: str, state: str = "stopped",
+                 instance_type: str = "g4dn.xlarge"):
+        self.instance_id = instance_id
+        self.instance_type = instance_type
+        self.availability_zone = f"{region}a"
+        self.private_ip = f"172.31.{random.randint(0, 255)}.{random.randint(1, 254)}"
+        self.state = state
+        self.transition_at: Optional[float] = None  # when pending/stopping completes
+        self.public_ip: Optional[str] = None
+        self.launch_time: Optional[datetime] = None
+        self.transitions: List[Dict] = []
+
+class SimulatedEC2:
+    """Thread-safe EC2 client double with the boto3 call and response shapes.
+
+    State advances lazily on each call, so no background thread is needed.
+    Unknown instance ids are created stopped on first use. Throttling is
+    either random (throttle_rate) or a token bucket refilled at
+    max_calls_per_second; both raise the ClientError the real API returns,
+    before any retries botocore would add.
+    """
+
+    def __init__(self, region: str = "eu-central-1", pending_seconds: float = 45,
+                 stopping_seconds: float = 30, jitter: float = 0.2, api_latency_ms: float = 0,
+                 throttle_rate: float = 0, max_calls_per_second: float = 0,
+                 public_ip: Optional[str] = "127.0.0.1", seed: Optional[int] = None):
+        self.region = region
+        self.pending_seconds = pending_seconds
+        self.stopping_seconds = stopping_seconds
+        self.jitter = jitter
+        self.api_latency = api_latency_ms / 1000
+        self.throttle_rate = throttle_rate
+        self.max_calls_per_second = max_calls_per_second
+        self.public_ip = public_ip
+        self.instances: Dict[str, SimulatedInstance] = {}
+        self.calls: Dict[str, int] = {}
+        self.throttled: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._tokens = max_calls_per_second
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add_instance(self, instance_id: str, state: str = "stopped") -> SimulatedInstance:
+        with self._lock:
+            instance = SimulatedInstance(instance_id, self.region, state)
+            if state == "running":
+                instance.public_ip = self._assign_ip()
+                instance.launch_time = datetime.now(timezone.utc)
+            self.instances[instance_id] = instance
+            return instance
+
+    def _assign_ip(self) -> str:
+        if self.public_ip:
+            return self.public_ip
+        return f"3.{self._random.randint(64, 127)}.{self._random.randint(0, 255)}.{self._random.randint(1, 254)}"
+
+    def _delay(self, seconds: float) -> float:
+        return max(0.0, seconds * (1 + self._random.uniform(-self.jitter, self.jitter)))
+
+    def _set_state(self, instance: SimulatedInstance, state: str, at: float):
+        instance.transitions.append({"from": instance.state, "to": state, "at": at})
+        instance.state = state
+
+    def _advance(self, instance: SimulatedInstance, now: float):
+        if instance.transition_at is None or now < instance.transition_at:
+            return
+        if instance.state == "pending":
+            self._set_state(instance, "running", instance.transition_at)
+        elif instance.state == "stopping":
+            self._set_state(instance, "stopped", instance.transition_at)
+            # Auto-assigned public IPs are released on stop
+            instance.public_ip = None
+        instance.transition_at = None
+
+    def _call(self, operation: str, instance_ids: List[str]) -> List[SimulatedInstance]:
+        """Count the call, apply latency and throttling, return the advanced instances"""
+        if self.api_latency:
+            time.sleep(self.api_latency)
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            now = time.monotonic()
+            if self.max_calls_per_second:
+                self._tokens = min(self.max_calls_per_second,
+                                   self._tokens + (now - self._refilled_at) * self.max_calls_per_second)
+                self._refilled_at = now
+            limited = self.max_calls_per_second and self._tokens < 1
+            if limited or self._random.random() < self.throttle_rate:
+                self.throttled[operation] = self.throttled.get(operation, 0) + 1
+                raise ClientError({"Error": {"Code": "RequestLimitExceeded",
+                                             "Message": "Request limit exceeded."}}, operation)
+            if self.max_calls_per_second:
+                self._tokens -= 1
+
+            instances = []
+            for instance_id in instance_ids:
+                instance = self.instances.get(instance_id)
+                if instance is None:
+                    instance = SimulatedInstance(instance_id, self.region)
+                    self.instances[instance_id] = instance
+                self._advance(instance, now)
+                instances.append(instance)
+            return instances
+
+    def _describe(self, instance: SimulatedInstance) -> Dict:
+        description = {
+            "InstanceId": instance.instance_id,
+            "InstanceType": instance.instance_type,
+            "State": {"Code": STATE_CODES[instance.state], "Name": instance.state},
+            "PrivateIpAddress": instance.private_ip,
+            "Placement": {"AvailabilityZone": instance.availability_zone}
+        }
+        if instance.public_ip:
+            description["PublicIpAddress"] = instance.public_ip
+        if instance.launch_time:
+            description["LaunchTime"] = instance.launch_time
+        return description
+
+    def describe_instances(self, InstanceIds: List[str], **kwargs) -> Dict:
+        instances = self._call("DescribeInstances", InstanceIds)
+        with self._lock:
+            return {"Reservations": [{"Instances": [self._describe(i) for i in instances]}]}
+
+    def _state_change(self, instance: SimulatedInstance, previous: str) -> Dict:
+        return {"InstanceId": instance.instance_id,
+                "CurrentState": {"Code": STATE_CODES[instance.state], "Name": instance.state},
+                "PreviousState": {"Code": STATE_CODES[previous], "Name": previous}}
+
+    def start_instances(self, InstanceIds: List[str], **kwargs) -> Dict:
+        instances = self._call("StartInstances", InstanceIds)
+        changes = []
+        with self._lock:
+            for instance in instances:
+                previous = instance.state
+                if previous == "stopping":
+                    raise ClientError({"Error": {"Code": "IncorrectInstanceState",
+                                                 "Message": f"The instance '{instance.instance_id}' is not in a state from which it can be started."}},
+                                      "StartInstances")
+                if previous == "stopped":
+                    now = time.monotonic()
+                    self._set_state(instance, "pending", now)
+                    instance.transition_at = now + self._delay(self.pending_seconds)
+                    instance.public_ip = self._assign_ip()
+                    instance.launch_time = datetime.now(timezone.utc)
+                changes.append(self._state_change(instance, previous))
+        return {"StartingInstances": changes}
+
+    def stop_instances(self, InstanceIds: List[str], **kwargs) -> Dict:
+        instances = self._call("StopInstances", InstanceIds)
+        changes = []
+        with self._lock:
+            for instance in instances:
+                previous = instance.state
+                if previous in ("pending", "running"):
+                    now = time.monotonic()
+                    self._set_state(instance, "stopping", now)
+                    instance.transition_at = now + self._delay(self.stopping_seconds)
+                changes.append(self._state_change(instance, previous))
+        return {"StoppingInstances": changes}
+
+    def get_waiter(self, name: str) -> "SimulatedWaiter":
+        targets = {"instance_running": "running", "instance_stopped": "stopped"}
+        if name not in targets:
+            raise ValueError(f"Waiter {name} is not simulated")
+        return SimulatedWaiter(self, targets[name])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"calls": dict(self.calls), "throttled": dict(self.throttled),
+                    "instances": {i.instance_id: i.state for i in self.instances.values()}}
+
+class SimulatedWaiter:
+    """Polls describe_instances like a boto3 waiter, with Delay and MaxAttempts"""
+
+    def __init__(self, client: SimulatedEC2, state: str):
+        self.client = client
+        self.state = state
+
+    def wait(self, InstanceIds: List[str], WaiterConfig: Optional[Dict] = None, **kwargs):
+        config = WaiterConfig or {}
+        delay, attempts = config.get("Delay", 15), config.get("MaxAttempts", 40)
+        for _ in range(attempts):
+            try:
+                response = self.client.describe_instances(InstanceIds=InstanceIds)
+                states = [i["State"]["Name"] for i in response["Reservations"][0]["Instances"]]
+                if all(state == self.state for state in states):
+                    return
+            except ClientError:
+                pass
+            time.sleep(delay)
+        raise TimeoutError(f"Waiter for {self.state} exceeded {attempts} attempts")
+
+_simulators: Dict[str, SimulatedEC2] = {}
+_simulators_lock = threading.Lock()
+
+def get_simulator(region: str) -> SimulatedEC2:
+    """One simulated EC2 per region and process, configured from EC2_SIM_*"""
+    with _simulators_lock:
+        if region not in _simulators:
+            _simulators[region] = SimulatedEC2(region, EC2_SIM_PENDING_SECONDS, EC2_SIM_STOPPING_SECONDS,
+                                               EC2_SIM_JITTER, EC2_SIM_API_LATENCY_MS,
+                                               EC2_SIM_THROTTLE_RATE, EC2_SIM_MAX_CALLS_PER_SECOND,
+                                               EC2_SIM_PUBLIC_IP or None)
+        return _simulators[region]
+
+def bench_coldstart(client: SimulatedEC2, cycles: int, server_port: int, timeout: float,
+                    poll_initial: float) -> Dict:
+    """Start and stop the instance repeatedly, timing each startup stage"""
+    from aws_manager import AWSInstanceManager
+    from instance_startup import StartupJob
+
+    manager = AWSInstanceManager("i-simulated", client.region, snapshot_ttl=0, ec2_client=client)
+    runs = []
+    for cycle in range(cycles):
+        job = StartupJob(manager, server_port, timeout, poll_initial=poll_initial).start()
+        job.wait()
+        status = job.status()
+        started = status["transitions"]["pending"]
+        runs.append({
+            "cycle": cycle + 1,
+            "state": status["state"],
+            "error": status["error"],
+            "seconds_to": {stage: round(at - started, 2) for stage, at in status["transitions"].items()}
+        })
+        # Reset for the next cycle; throttled calls here are not part of the measurement
+        while True:
+            try:
+                if manager.get_snapshot(max_age=0)["State"]["Name"] == "stopped":
+                    break
+                manager.request_stop()
+            except ClientError:
+                pass
+            time.sleep(poll_initial)
+    return {"runs": runs, "api": client.stats()}
+
+def bench_throttle(client: SimulatedEC2, sessions: int, seconds: float, ttl: float,
+                   poll_seconds: float) -> Dict:
+    """Sessions polling instance status concurrently through the shared snapshot"""
+    from aws_manager import AWSInstanceManager
+
+    client.add_instance("i-simulated", "running")
+    AWSInstanceManager("i-simulated", client.region, ec2_client=client).invalidate_snapshot()
+    reads, errors = [0], [0]
+    lock = threading.Lock()
+    deadline = time.time() + seconds
+
+    def session():
+        manager = AWSInstanceManager("i-simulated", client.region, snapshot_ttl=ttl, ec2_client=client)
+        while time.time() < deadline:
+            try:
+                manager.get_snapshot()
+                with lock:
+                    reads[0] += 1
+            except ClientError:
+                with lock:
+                    errors[0] += 1
+            time.sleep(poll_seconds)
+
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = client.stats()
+    return {"sessions": sessions, "seconds": seconds, "snapshot_ttl": ttl,
+            "status_reads": reads[0], "errors_surfaced": errors[0],
+            "describe_calls": stats["calls"].get("DescribeInstances", 0),
+            "throttled": stats["throttled"].get("DescribeInstances", 0)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline EC2 simulator benchmarks")
+    parser.add_argument("--region", default="eu-central-1")
+    parser.add_argument("--pending", type=float, default=EC2_SIM_PENDING_SECONDS, help="seconds from start to running")
+    parser.add_argument("--stopping", type=float, default=EC2_SIM_STOPPING_SECONDS, help="seconds from stop to stopped")
+    parser.add_argument("--jitter", type=float, default=EC2_SIM_JITTER)
+    parser.add_argument("--api-latency-ms", type=float, default=EC2_SIM_API_LATENCY_MS)
+    parser.add_argument("--throttle-rate", type=float, default=EC2_SIM_THROTTLE_RATE, help="fraction of calls throttled")
+    parser.add_argument("--max-calls-per-second", type=float, default=EC2_SIM_MAX_CALLS_PER_SECOND, help="0 = unlimited")
+    parser.add_argument("--seed", type=int)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    coldstart_parser = subparsers.add_parser("coldstart", help="time start cycles through StartupJob")
+    coldstart_parser.add_argument("--cycles", type=int, default=3)
+    coldstart_parser.add_argument("--port", type=int, default=8000, help="stub server port on 127.0.0.1")
+    coldstart_parser.add_argument("--timeout", type=float, default=300)
+    coldstart_parser.add_argument("--poll", type=float, default=1.0, help="initial poll delay")
+
+    throttle_parser = subparsers.add_parser("throttle", help="concurrent status polling under an API rate limit")
+    throttle_parser.add_argument("--sessions", type=int, default=50)
+    throttle_parser.add_argument("--seconds", type=float, default=10)
+    throttle_parser.add_argument("--ttl", type=float, default=10, help="snapshot TTL in seconds")
+    throttle_parser.add_argument("--poll", type=float, default=0.5, help="seconds between status reads per session")
+    args = parser.parse_args()
+
+    client = SimulatedEC2(args.region, args.pending, args.stopping, args.jitter, args.api_latency_ms,
+                          args.throttle_rate, args.max_calls_per_second, "127.0.0.1", args.seed)
+    if args.command == "coldstart":
+        result = bench_coldstart(client, args.cycles, args.port, args.timeout, args.poll)
+    else:
+        result = bench_throttle(client, args.sessions, args.seconds, args.ttl, args.poll)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
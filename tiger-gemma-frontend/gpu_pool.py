@@ -0,0 +1,313 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+from admission import AdmissionQueue
+from aws_manager import AWSInstanceManager
+from llm_client import LLMClient, get_server_url
+from response_cache import ResponseCache
+from semantic_cache import SemanticCache
+
+class NoHealthyBackend(Exception):
+    pass
+
+class Backend:
+    """One GPU server: an EC2 instance, or a fixed URL such as a local stub server"""
+
+    def __init__(self, name: str, url: Optional[str] = None,
+                 manager: Optional[AWSInstanceManager] = None):
+        self.name = name
+        self.url = url
+        self.manager = manager
+        self.healthy = False
+        self.draining = False
+        self.in_flight = 0
+        self.served = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_used = time.time()
+
+    def to_dict(self) -> Dict:
+        return {"name": self.name, "url": self.url, "healthy": self.healthy, "draining": self.draining,
+                "in_flight": self.in_flight, "served": self.served, "failures": self.failures,
+                "last_error": self.last_error}
+
+class BackendPool:
+    """GPU servers with per-backend health and in-flight counters.
+
+    Requests go to the least-loaded healthy backend. A background loop
+    refreshes health, stops drained instances once their last request
+    finished and applies the scale rules: start another instance when
+    the load per healthy backend reaches scale_up_depth (or requests wait
+    with nothing running), drain one when the pool has been idle for
+    scale_down_idle_minutes, keeping at least min_active running. After
+    idle_shutdown_minutes without activity every instance is drained,
+    min_active included. With nothing healthy no request can be queued,
+    so waking the pool from there is explicit: wake() starts one instance.
+    """
+
+    def __init__(self, backends: List[Backend], server_port: int = 8000, check_seconds: float = 10,
+                 failure_threshold: int = 2, scale_up_depth: float = 4, scale_down_idle_minutes: float = 15,
+                 min_active: int = 1, autoscale: bool = True, start_timeout: float = 900,
+                 idle_shutdown_minutes: Optional[float] = None):
+        self.backends = backends
+        self.server_port = server_port
+        self.interval = check_seconds
+        self.failure_threshold = failure_threshold
+        self.scale_up_depth = scale_up_depth
+        self.scale_down_idle = scale_down_idle_minutes * 60
+        self.min_active = min_active
+        self.autoscale_enabled = autoscale
+        self.start_timeout = start_timeout
+        self.idle_shutdown = idle_shutdown_minutes * 60 if idle_shutdown_minutes is not None else None
+        self.waiting_source: Optional[Callable[[], int]] = None
+        # Time of the last user activity, e.g. ActivityTracker; counts towards idle shutdown
+        self.activity_source: Optional[Callable[[], float]] = None
+        self.idle_since = time.time()
+        self.last_busy = time.time()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="gpu-pool", daemon=True)
+
+    @classmethod
+    def from_instances(cls, instance_ids: List[str], region: str, server_port: int = 8000,
+                       snapshot_ttl: float = 10, hourly_rate: float = 0.526, **kwargs) -> "BackendPool":
+        backends = [Backend(instance_id, manager=AWSInstanceManager(instance_id, region, snapshot_ttl, hourly_rate))
+                    for instance_id in instance_ids]
+        return cls(backends, server_port, **kwargs)
+
+    @classmethod
+    def from_urls(cls, urls: List[str], **kwargs) -> "BackendPool":
+        """Fixed servers, e.g. several stub_server.py processes; they cannot be started or stopped"""
+        kwargs.setdefault("autoscale", False)
+        return cls([Backend(url, url=url) for url in urls], **kwargs)
+
+    def start(self):
+        self.refresh()
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_running(self) -> bool:
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def healthy_backends(self) -> List[Backend]:
+        with self._lock:
+            return [b for b in self.backends if b.healthy and not b.draining and b.url]
+
+    def acquire(self, exclude: Tuple[str, ...] = ()) -> Backend:
+        """Reserve the least-loaded healthy backend"""
+        with self._lock:
+            candidates = [b for b in self.backends
+                          if b.healthy and not b.draining and b.url and b.name not in exclude]
+            if not candidates:
+                raise NoHealthyBackend("No healthy GPU backend available")
+            backend = min(candidates, key=lambda b: (b.in_flight, b.served))
+            backend.in_flight += 1
+            backend.last_used = time.time()
+            return backend
+
+    def release(self, backend: Backend, error: Optional[str] = None, unhealthy: bool = False):
+        """Return a reservation; failures past the threshold take the backend out of rotation"""
+        with self._lock:
+            backend.in_flight -= 1
+            backend.last_used = time.time()
+            if error is None:
+                backend.served += 1
+                backend.failures = 0
+                return
+            backend.failures += 1
+            backend.last_error = error
+            if unhealthy or backend.failures >= self.failure_threshold:
+                backend.healthy = False
+
+    def queue_depth(self) -> float:
+        """In-flight plus waiting requests per healthy backend"""
+        waiting = self.waiting_source() if self.waiting_source else 0
+        with self._lock:
+            in_flight = sum(b.in_flight for b in self.backends)
+            healthy = sum(1 for b in self.backends if b.healthy and not b.draining)
+        return (in_flight + waiting) / max(1, healthy)
+
+    def drain(self, name: str):
+        """Take a backend out of rotation; its instance stops once the last request finished"""
+        with self._lock:
+            for backend in self.backends:
+                if backend.name == name:
+                    backend.draining = True
+
+    def refresh(self):
+        """Update URLs from instance state and probe /health"""
+        for backend in list(self.backends):
+            if backend.manager:
+                running = backend.manager.get_status() == "running"
+                public_ip = backend.manager.get_public_ip() if running else None
+                url = get_server_url(public_ip, self.server_port) if public_ip else None
+            else:
+                url = backend.url
+
+            healthy = False
+            if url:
+                try:
+                    healthy = requests.get(f"{url}/health", timeout=2).status_code == 200
+                except requests.exceptions.RequestException:
+                    healthy = False
+
+            with self._lock:
+                backend.url = url
+                backend.healthy = healthy
+                if healthy:
+                    backend.failures = 0
+
+    def _stop_drained(self):
+        with self._lock:
+            drained = [b for b in self.backends if b.draining and b.in_flight == 0 and b.manager]
+        for backend in drained:
+            if backend.manager.get_status() == "running":
+                backend.manager.request_stop()
+            with self._lock:
+                backend.draining = False
+                backend.healthy = False
+
+    def wake(self) -> Optional[str]:
+        """Start one stopped instance unless one is already starting, return its name"""
+        managed = [b for b in self.backends if b.manager]
+        for backend in managed:
+            job = backend.manager.get_startup_job()
+            if backend.manager.get_status() == "pending" or (job and not job.done):
+                return backend.name
+        for backend in managed:
+            if backend.manager.get_status() == "stopped":
+                backend.manager.start_instance_async(self.server_port, self.start_timeout)
+                return backend.name
+        return None
+
+    def autoscale(self) -> Optional[str]:
+        """Apply the scale rules once, return what was done"""
+        managed = [b for b in self.backends if b.manager]
+        if not managed:
+            return None
+
+        depth = self.queue_depth()
+        statuses = {b.name: b.manager.get_status() for b in managed}
+        starting = [b for b in managed if statuses[b.name] == "pending" or
+                    (b.manager.get_startup_job() and not b.manager.get_startup_job().done)]
+        active = [b for b in managed if statuses[b.name] == "running" and not b.draining]
+
+        if depth > 0:
+            self.idle_since = time.time()
+        if depth > 0 or starting:
+            # A freshly started instance gets the full idle period
+            self.last_busy = time.time()
+
+        if (depth >= self.scale_up_depth or (depth > 0 and not active)) and not starting:
+            stopped = [b for b in managed if statuses[b.name] == "stopped"]
+            if stopped:
+                stopped[0].manager.start_instance_async(self.server_port, self.start_timeout)
+                return f"start {stopped[0].name}"
+
+        if self.idle_shutdown is not None and depth == 0 and active:
+            last_activity = self.last_busy
+            if self.activity_source:
+                last_activity = max(last_activity, self.activity_source())
+            if time.time() - last_activity >= self.idle_shutdown:
+                for backend in active:
+                    self.drain(backend.name)
+                return "drain " + ", ".join(b.name for b in active)
+
+        if (depth == 0 and len(active) > self.min_active
+                and time.time() - self.idle_since >= self.scale_down_idle):
+            least_recent = min(active, key=lambda b: b.last_used)
+            self.drain(least_recent.name)
+            self.idle_since = time.time()
+            return f"drain {least_recent.name}"
+        return None
+
+    def status(self) -> List[Dict]:
+        with self._lock:
+            return [b.to_dict() for b in self.backends]
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+                self._stop_drained()
+                if self.autoscale_enabled:
+                    self.autoscale()
+            except Exception as e:
+                print(f"GPU pool error: {e}")
+
+class PooledLLMClient(LLMClient):
+    """LLMClient that sends each generation to the least-loaded backend of a pool.
+
+    Caches are consulted once, before routing. A backend that refuses the
+    connection, does not accept it in time or answers 5xx is reported to
+    the pool and the request fails over to the next backend. A read timeout
+    means the generation is still running there, so it is raised instead of
+    being sent to another GPU.
+    """
+
+    def __init__(self, pool: BackendPool, cache: Optional[ResponseCache] = None,
+                 semantic_cache: Optional[SemanticCache] = None, admission: Optional[AdmissionQueue] = None,
+                 timeout: Optional[Tuple[float, float]] = (5, 300), queue_timeout: float = 120):
+        super().__init__("", cache, semantic_cache, admission, timeout, queue_timeout)
+        self.pool = pool
+
+    def is_server_healthy(self) -> bool:
+        return bool(self.pool.healthy_backends())
+
+    def _post_generate(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        tried: Tuple[str, ...] = ()
+        last_error: Optional[Exception] = None
+
+        while True:
+            try:
+                backend = self.pool.acquire(exclude=tried)
+            except NoHealthyBackend:
+                if last_error:
+                    raise last_error
+                raise
+            tried += (backend.name,)
+
+            try:
+                response = requests.post(f"{backend.url}/generate", json=payload,
+                                         headers={"Content-Type": "application/json"}, timeout=self.timeout)
+                response.raise_for_status()
+            except requests.exceptions.ReadTimeout:
+                self.pool.release(backend)
+                raise
+            except requests.exceptions.ConnectionError as e:
+                # Includes ConnectTimeout
+                self.pool.release(backend, str(e), unhealthy=True)
+                last_error = e
+                continue
+            except requests.exceptions.HTTPError as e:
+                if e.response is not None and e.response.status_code < 500:
+                    self.pool.release(backend, str(e))
+                    raise
+                # 503 means the model is (re)loading there
+                self.pool.release(backend, str(e), unhealthy=e.response is not None and e.response.status_code == 503)
+                last_error = e
+                continue
+
+            self.pool.release(backend)
+            return response.json()
+
+    def iter_generate_batch(self, batch: List[Dict[str, Any]],
+                            queue_owner: str = "batch") -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Send the whole batch to one backend, the least-loaded once it is admitted"""
+        with self._batch_slot(batch, queue_owner):
+            backend = self.pool.acquire()
+            error = None
+            try:
+                yield from LLMClient(backend.url, self.cache, self.semantic_cache,
+                                     timeout=self.timeout).iter_generate_batch(batch)
+            except requests.exceptions.RequestException as e:
+                error = str(e)
+                raise
+            finally:
+                self.pool.release(backend, error)
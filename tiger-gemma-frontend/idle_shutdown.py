@@ -0,0 +1,137 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+class ActivityTracker:
+    """Last user activity and in-flight generations across all sessions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.last_activity = time.time()
+        self.last_kind = "startup"
+        self.in_flight = 0
+
+    def record(self, kind: str = "generate"):
+        with self._lock:
+            self.last_activity = time.time()
+            self.last_kind = kind
+
+    @contextmanager
+    def generation(self):
+        """Count a generation as in flight and as activity when it starts and ends"""
+        with self._lock:
+            self.in_flight += 1
+            self.last_activity = time.time()
+            self.last_kind = "generate"
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.last_activity = time.time()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"last_activity": self.last_activity, "last_kind": self.last_kind,
+                    "in_flight": self.in_flight}
+
+class IdleShutdownScheduler:
+    """Stops the instance after idle_minutes without activity.
+
+    Idle time counts from the later of the last activity and the moment
+    the instance was first seen running. Warnings start warning_minutes
+    before the deadline. In-flight generations keep the instance up for
+    at most grace_minutes past the deadline, and keep_warm (e.g. a
+    pre-warm schedule) can hold it up regardless.
+    """
+
+    def __init__(self, aws_manager, tracker: ActivityTracker, idle_minutes: float = 10,
+                 warning_minutes: float = 2, grace_minutes: float = 5, check_seconds: float = 15,
+                 keep_warm: Optional[Callable[[], bool]] = None):
+        self.aws_manager = aws_manager
+        self.tracker = tracker
+        self.idle_timeout = idle_minutes * 60
+        self.warning_window = warning_minutes * 60
+        self.grace = grace_minutes * 60
+        self.interval = check_seconds
+        self.keep_warm = keep_warm
+        self.running_since: Optional[float] = None
+        self.state = "inactive"
+        self.last_stop: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="idle-shutdown", daemon=True)
+
+    def start(self):
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_running(self) -> bool:
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def _idle_seconds(self, now: float) -> float:
+        activity = self.tracker.snapshot()["last_activity"]
+        return now - max(activity, self.running_since or activity)
+
+    def status(self) -> Dict:
+        """Countdown for the UI: state, idle and seconds left before shutdown"""
+        now = time.time()
+        activity = self.tracker.snapshot()
+        with self._lock:
+            if self.running_since is None:
+                return {"state": self.state, "idle_seconds": None, "shutdown_in_seconds": None,
+                        "in_flight": activity["in_flight"]}
+            idle = self._idle_seconds(now)
+            return {
+                "state": self.state,
+                "idle_seconds": round(idle, 1),
+                "shutdown_in_seconds": round(max(0.0, self.idle_timeout - idle), 1),
+                "in_flight": activity["in_flight"]
+            }
+
+    def run_once(self, now: Optional[float] = None) -> str:
+        """Check the instance once and return the resulting state"""
+        now = now or time.time()
+        status = self.aws_manager.get_status()
+
+        with self._lock:
+            if status != "running":
+                self.running_since = None
+                self.state = "inactive"
+                return self.state
+            if self.running_since is None:
+                self.running_since = now
+
+            idle = self._idle_seconds(now)
+            in_flight = self.tracker.snapshot()["in_flight"]
+
+            if self.keep_warm and self.keep_warm():
+                self.state = "held"
+            elif in_flight and idle < self.idle_timeout + self.grace:
+                # Generating is not idle; only a generation stuck past the grace period is
+                self.state = "busy"
+            elif idle < self.idle_timeout - self.warning_window:
+                self.state = "active"
+            elif idle < self.idle_timeout:
+                self.state = "warning"
+            else:
+                self.state = "stopping"
+
+        if self.state == "stopping":
+            print(f"⏹️ Idle for {idle / 60:.1f} minutes, stopping GPU instance")
+            self.aws_manager.request_stop()
+            with self._lock:
+                self.last_stop = now
+                self.running_since = None
+        return self.state
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Idle shutdown error: {e}")
@@ -0,0 +1,154 @@
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+import requests
+
+from llm_client import get_server_url
+
+# Progress states in order; "failed" can follow any of them
+STARTUP_STAGES = ["pending", "running", "services_up", "model_loaded"]
+
+STAGE_LABELS = {
+    "pending": "🚀 Instance starting...",
+    "running": "🖥️ Instance running, waiting for the server...",
+    "services_up": "🧠 Server up, loading the model...",
+    "model_loaded": "✅ AI Assistant Ready!",
+    "failed": "❌ Start failed"
+}
+
+def backoff(initial: float, maximum: float, factor: float = 1.5) -> Iterator[float]:
+    """Poll delays growing from initial up to maximum"""
+    delay = initial
+    while True:
+        yield delay
+        delay = min(maximum, delay * factor)
+
+def is_throttled(error: Exception) -> bool:
+    """True for EC2 API rate limiting, which is worth retrying"""
+    response = getattr(error, "response", None)
+    code = response.get("Error", {}).get("Code") if isinstance(response, dict) else None
+    return code in ("RequestLimitExceeded", "Throttling")
+
+class StartupJob:
+    """Starts an instance in a background thread and follows it until the model answers.
+
+    Instead of a fixed waiter and sleep, it polls the instance state and
+    then the server's /health endpoint with backoff: no answer means the
+    services are not up yet, 503 means the model is still loading.
+    """
+
+    def __init__(self, manager, server_port: int, timeout: float = 900,
+                 poll_initial: float = 2.0, poll_max: float = 15.0):
+        self.manager = manager
+        self.server_port = server_port
+        self.timeout = timeout
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.state = "pending"
+        self.public_ip: Optional[str] = None
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.transitions = {"pending": self.started_at}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="instance-startup", daemon=True)
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def start(self) -> "StartupJob":
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job finished, return False on timeout"""
+        return self._done.wait(timeout)
+
+    def status(self) -> Dict:
+        with self._lock:
+            stage = STARTUP_STAGES.index(self.state) if self.state in STARTUP_STAGES else 0
+            return {
+                "state": self.state,
+                "label": STAGE_LABELS[self.state],
+                "progress": (stage + 1) / len(STARTUP_STAGES),
+                "elapsed_seconds": round(time.time() - self.started_at, 1),
+                "public_ip": self.public_ip,
+                "error": self.error,
+                "transitions": dict(self.transitions),
+                "done": self.done
+            }
+
+    def _advance(self, state: str):
+        with self._lock:
+            if self.state != state:
+                self.state = state
+                self.transitions[state] = time.time()
+
+    def _run(self):
+        deadline = self.started_at + self.timeout
+        try:
+            self._start_instance(deadline)
+            self.manager.invalidate_snapshot()
+            self._wait_for_running(deadline)
+            self._wait_for_model(deadline)
+        except Exception as e:
+            with self._lock:
+                self.error = str(e)
+                self.state = "failed"
+                self.transitions["failed"] = time.time()
+        finally:
+            self._done.set()
+
+    def _start_instance(self, deadline: float):
+        for delay in backoff(self.poll_initial, self.poll_max):
+            try:
+                self.manager.ec2_client.start_instances(InstanceIds=[self.manager.instance_id])
+                return
+            except Exception as e:
+                if not is_throttled(e) or time.time() + delay > deadline:
+                    raise
+            time.sleep(delay)
+
+    def _wait_for_running(self, deadline: float):
+        seen_pending = False
+        for delay in backoff(self.poll_initial, self.poll_max):
+            try:
+                instance = self.manager.get_snapshot(max_age=0)
+            except Exception as e:
+                # Throttled with no earlier snapshot to fall back on
+                if not is_throttled(e) or time.time() + delay > deadline:
+                    raise
+                time.sleep(delay)
+                continue
+            state = instance['State']['Name']
+            seen_pending = seen_pending or state == "pending"
+            if state == "running" and instance.get('PublicIpAddress'):
+                with self._lock:
+                    self.public_ip = instance['PublicIpAddress']
+                self._advance("running")
+                return
+            # A stop right after the start call can still be the old state
+            if state in ("shutting-down", "terminated") or (seen_pending and state in ("stopping", "stopped")):
+                raise RuntimeError(f"Instance is {state}")
+            if time.time() + delay > deadline:
+                raise TimeoutError(f"Instance still {state} after {self.timeout:.0f}s")
+            time.sleep(delay)
+
+    def _wait_for_model(self, deadline: float):
+        health_url = f"{get_server_url(self.public_ip, self.server_port)}/health"
+        for delay in backoff(self.poll_initial / 2, self.poll_max):
+            try:
+                response = requests.get(health_url, timeout=5)
+            except requests.RequestException:
+                pass
+            else:
+                # Any HTTP answer means the server process is up
+                self._advance("services_up")
+                if response.status_code == 200:
+                    self._advance("model_loaded")
+                    return
+            if time.time() + delay > deadline:
+                raise TimeoutError(f"Model not loaded after {self.timeout:.0f}s")
+            time.sleep(delay)
@@ -1,24 +1,68 @@
+import json
+import hashlib
+import time
 import requests
-from typing import Dict, Any
+from contextlib import nullcontext
+from typing import Callable, ContextManager, Dict, Any, Iterator, List, Optional, Tuple
+
+from admission import AdmissionCancelled, AdmissionQueue, AdmissionTimeout, QueueFull
+from response_cache import ResponseCache
+from semantic_cache import SemanticCache
 
 def get_server_url(public_ip: str, port: int) -> str:
     """Construct the server URL from IP and port."""
     return f"http://{public_ip}:{port}"
 
+def search_fingerprint(search_enabled: bool, bucket_seconds: float = 900) -> str:
+    """Cache fingerprint for server-side search, changing every bucket_seconds.
+
+    The server decides what to search, so the results are not known up
+    front; keying cached answers to a time window keeps them from
+    replaying old search results and links for the whole persona TTL.
+    """
+    if not search_enabled:
+        return ""
+    return f"search:{int(time.time() // bucket_seconds)}"
+
 class LLMClient:
-    def __init__(self, server_url: str):
+    def __init__(self, server_url: str, cache: Optional[ResponseCache] = None,
+                 semantic_cache: Optional[SemanticCache] = None, admission: Optional[AdmissionQueue] = None,
+                 timeout: Optional[Tuple[float, float]] = (5, 300), queue_timeout: float = 120):
         self.server_url = server_url
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.admission = admission
+        # (connect, read) seconds for generate calls
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
 
     def is_server_healthy(self) -> bool:
         """Check if the server is healthy."""
         try:
-            response = requests.get(f"{self.server_url}/health")
+            response = requests.get(f"{self.server_url}/health", timeout=5)
             return response.status_code == 200
         except requests.exceptions.RequestException:
             return False
 
-    def generate_text(self, prompt: str, user_type: str, max_length: int, temperature: float, search_enabled: bool = False) -> Dict[str, Any]:
-        """Generate text from the LLM via the server."""
+    def generate_text(self, prompt: str, user_type: str, max_length: int, temperature: float, search_enabled: bool = False,
+                      search_fingerprint: str = "", cache_query: Optional[str] = None, queue_owner: str = "",
+                      on_queue: Optional[Callable[[Dict], None]] = None) -> Dict[str, Any]:
+        """Generate text from the LLM via the server.
+
+        With a response cache attached, an identical payload (and search
+        fingerprint) for a cache-enabled persona is answered without a
+        server round trip; such results carry "cached": True.
+
+        cache_query is the user's own text inside prompt. When given and a
+        semantic cache is attached, near-duplicate wordings of an earlier
+        question in the same context are answered from cache as well; those
+        results also carry "semantic_entry_id" and "similarity".
+
+        With an admission queue attached, a cache miss waits for a backend
+        slot first, in turn with other sessions (queue_owner). on_queue is
+        called with the place in line while waiting, and the result carries
+        "queue_seconds".
+        """
         payload = {
             "prompt": prompt,
             "user_type": user_type,
@@ -26,7 +70,125 @@ class LLMClient:
             "temperature": temperature,
             "search_enabled": search_enabled
         }
+
+        use_cache = self.cache is not None and self.cache.is_enabled(user_type)
+        if use_cache:
+            cached = self.cache.get(payload, search_fingerprint)
+            if cached is not None:
+                return {**cached, "cached": True}
+
+        use_semantic = (self.semantic_cache is not None and cache_query
+                        and self.semantic_cache.is_enabled(user_type))
+        if use_semantic:
+            bucket = self._semantic_bucket(payload, cache_query, search_fingerprint)
+            match = self.semantic_cache.get(bucket, user_type, cache_query)
+            if match is not None:
+                return {**match["response"], "cached": True,
+                        "semantic_entry_id": match["entry_id"], "similarity": match["similarity"]}
+
+        queue_seconds = 0.0
+        if self.admission is None:
+            result = self._post_generate(payload)
+        else:
+            queued = time.monotonic()
+            with self.admission.slot(user_type, queue_owner, self.queue_timeout, on_queue):
+                queue_seconds = time.monotonic() - queued
+                result = self._post_generate(payload)
+
+        if use_cache:
+            self.cache.put(payload, result, search_fingerprint)
+        if use_semantic:
+            self.semantic_cache.put(bucket, user_type, cache_query, result)
+        if self.admission is not None:
+            return {**result, "queue_seconds": round(queue_seconds, 2)}
+        return result
+
+    def _post_generate(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         headers = {"Content-Type": "application/json"}
-        response = requests.post(f"{self.server_url}/generate", json=payload, headers=headers)
+        response = requests.post(f"{self.server_url}/generate", json=payload, headers=headers,
+                                 timeout=self.timeout)
         response.raise_for_status()
         return response.json()
+
+    def generate_batch(self, batch: List[Dict[str, Any]], queue_owner: str = "batch") -> List[Dict[str, Any]]:
+        """Generate several texts in one request, results in input order.
+
+        Each item takes the same keys as generate_text(). A failed item comes
+        back as {"error": "..."} so one bad prompt doesn't sink the batch,
+        and so does an item the server never reported.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None for _ in batch]
+        for index, result in self.iter_generate_batch(batch, queue_owner):
+            results[index] = result
+        return [result if result is not None else {"error": "No result returned for this item"}
+                for result in results]
+
+    def iter_generate_batch(self, batch: List[Dict[str, Any]],
+                            queue_owner: str = "batch") -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Yield (index, result) pairs as the server finishes each item.
+
+        /generate_batch streams one JSON line per item, in completion order:
+        {"index": i, "result": {...}} or {"index": i, "error": "..."}.
+        With an admission queue attached, the batch waits for one slot per
+        item, in turn with chat sessions.
+        """
+        with self._batch_slot(batch, queue_owner):
+            response = self._post_batch(batch)
+            if response.status_code != 404:
+                yield from self._read_batch(response)
+                return
+            response.close()
+
+        # Older server without the batch endpoint: fall back to one call per item,
+        # each queueing on its own
+        yield from self._generate_sequential(batch, queue_owner)
+
+    def _batch_slot(self, batch: List[Dict[str, Any]], queue_owner: str) -> ContextManager:
+        if self.admission is None or not batch:
+            return nullcontext()
+        return self.admission.slot(batch[0]["user_type"], queue_owner, self.queue_timeout, slots=len(batch))
+
+    def _post_batch(self, batch: List[Dict[str, Any]]) -> requests.Response:
+        payload = {
+            "requests": [self._batch_item(item) for item in batch],
+            "stream": True
+        }
+        headers = {"Content-Type": "application/json"}
+        return requests.post(f"{self.server_url}/generate_batch", json=payload,
+                             headers=headers, stream=True, timeout=self.timeout)
+
+    def _read_batch(self, response: requests.Response) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        response.raise_for_status()
+        with response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                entry = json.loads(line)
+                if "error" in entry:
+                    yield entry["index"], {"error": entry["error"]}
+                else:
+                    yield entry["index"], entry["result"]
+
+    def _semantic_bucket(self, payload: Dict[str, Any], cache_query: str, search_fingerprint: str) -> str:
+        """Hash everything except the user's own wording into a context bucket"""
+        context = dict(payload, prompt=payload["prompt"].replace(cache_query, ""),
+                       search_fingerprint=search_fingerprint)
+        return hashlib.sha256(json.dumps(context, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def _batch_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Normalize a batch item to the /generate payload shape."""
+        return {
+            "prompt": item["prompt"],
+            "user_type": item["user_type"],
+            "max_length": item["max_length"],
+            "temperature": item["temperature"],
+            "search_enabled": item.get("search_enabled", False)
+        }
+
+    def _generate_sequential(self, batch: List[Dict[str, Any]],
+                             queue_owner: str = "batch") -> Iterator[Tuple[int, Dict[str, Any]]]:
+        for index, item in enumerate(batch):
+            try:
+                yield index, self.generate_text(**self._batch_item(item), queue_owner=queue_owner)
+            except (requests.exceptions.RequestException, QueueFull, AdmissionTimeout, AdmissionCancelled) as e:
+                yield index, {"error": str(e)}
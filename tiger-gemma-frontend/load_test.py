@@ -0,0 +1,280 @@
+"""End-to-end load generator for the chat pipeline.
+
+Simulates concurrent persona sessions doing what the Streamlit app does
+per turn (login, history page load, prompt build, generate, queueing the
+turn on the write-behind queue) against a server URL (normally
+stub_server.py) and a scratch database, then writes a JSON report with
+per-stage latency histograms, throughput, errors and write queue metrics.
+export-replay only reads the chat history; the database must already be
+migrated, e.g. by running the app once.
+
+    python ../stub_server.py --port 8000 --search-replay replay.jsonl &
+    python load_test.py export-replay --db chat_history.db --out replay.jsonl
+    python load_test.py run --server http://localhost:8000 --sessions 20 --turns 5
+
+Several --server options put the sessions behind the GPU pool router.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import USERS, HISTORY_PAGE_SIZE, WRITE_QUEUE_MAX_SIZE, WRITE_BATCH_MAX_MESSAGES
+from database import DatabaseManager
+from llm_client import LLMClient
+from gpu_pool import BackendPool, PooledLLMClient
+from write_queue import WriteBehindQueue
+
+STAGES = ["login", "history_load", "prompt", "generate", "save", "turn"]
+
+# Upper bounds in milliseconds, last bucket is open ended
+HISTOGRAM_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+
+class StageStats:
+    """Latency samples and error count for one pipeline stage"""
+
+    def __init__(self):
+        self.samples: List[float] = []
+        self.errors = 0
+
+    def report(self, elapsed: float) -> Dict:
+        samples = sorted(self.samples)
+        counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        for ms in samples:
+            bucket = next((i for i, bound in enumerate(HISTOGRAM_BUCKETS_MS) if ms <= bound),
+                          len(HISTOGRAM_BUCKETS_MS))
+            counts[bucket] += 1
+        labels = [f"<={bound}ms" for bound in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]}ms"]
+        total = len(samples) + self.errors
+
+        return {
+            "count": len(samples),
+            "errors": self.errors,
+            "error_rate": round(self.errors / total, 4) if total else 0.0,
+            "throughput_per_s": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+            "mean_ms": round(sum(samples) / len(samples), 2) if samples else None,
+            "p50_ms": percentile(samples, 50),
+            "p90_ms": percentile(samples, 90),
+            "p99_ms": percentile(samples, 99),
+            "max_ms": round(samples[-1], 2) if samples else None,
+            "histogram": dict(zip(labels, counts))
+        }
+
+def percentile(sorted_samples: List[float], pct: float) -> Optional[float]:
+    if not sorted_samples:
+        return None
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return round(sorted_samples[index], 2)
+
+def persona_prompts(user_type: str) -> List[str]:
+    """Turn a persona's use_cases into plain prompts"""
+    return [re.sub(r"^\W+", "", use_case).strip() for use_case in USERS[user_type]["use_cases"]]
+
+def build_prompt(prompt: str, user_type: str) -> str:
+    """Same shape as app.build_enhanced_prompt, without session context"""
+    return f"{USERS[user_type]['system_prompt']}\n\nUser: {prompt}\n\nAssistant:"
+
+class LoadTest:
+    def __init__(self, server_url: str, db_name: str, sessions: int, turns: int,
+                 think_time: float = 0.0, ramp_up: float = 0.0, pool_urls: Optional[List[str]] = None):
+        self.server_url = server_url
+        self.pool = BackendPool.from_urls(pool_urls, check_seconds=2) if pool_urls else None
+        self.db_name = db_name
+        self.sessions = sessions
+        self.turns = turns
+        self.think_time = think_time
+        self.ramp_up = ramp_up
+        self.stats = {stage: StageStats() for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def _timed(self, stage: str, func, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.stats[stage].errors += 1
+            raise
+        with self._lock:
+            self.stats[stage].samples.append((time.perf_counter() - started) * 1000)
+        return result
+
+    def run_session(self, session_index: int, db_manager: DatabaseManager, write_queue: WriteBehindQueue):
+        user_type = list(USERS)[session_index % len(USERS)]
+        user_info = USERS[user_type]
+        prompts = persona_prompts(user_type)
+        llm_client = PooledLLMClient(self.pool) if self.pool else LLMClient(self.server_url)
+        rng = random.Random(session_index)
+
+        try:
+            user_id = self._timed("login", db_manager.create_or_get_user,
+                                  f"{user_type}_load_{session_index}", user_info["name"],
+                                  user_info["icon"], user_info["description"])
+            conversation_id = self._timed("login", db_manager.get_or_create_conversation, user_id)
+            self._timed("history_load", db_manager.get_conversation_page, conversation_id,
+                        limit=HISTORY_PAGE_SIZE)
+        except Exception:
+            return
+
+        for _ in range(self.turns):
+            turn_started = time.perf_counter()
+            try:
+                prompt = f"{rng.choice(prompts)} ({rng.randint(1, 1000)})"
+                enhanced = self._timed("prompt", build_prompt, prompt, user_type)
+                response_data = self._timed("generate", llm_client.generate_text,
+                                            prompt=enhanced, user_type=user_type,
+                                            max_length=user_info["max_length"],
+                                            temperature=user_info["temperature"],
+                                            search_enabled=True)
+                self._timed("save", self._save_turn, write_queue, conversation_id, prompt, response_data)
+            except Exception:
+                with self._lock:
+                    self.stats["turn"].errors += 1
+            else:
+                with self._lock:
+                    self.stats["turn"].samples.append((time.perf_counter() - turn_started) * 1000)
+            if self.think_time:
+                time.sleep(rng.uniform(0, 2 * self.think_time))
+
+    def _save_turn(self, write_queue: WriteBehindQueue, conversation_id: int, prompt: str, response_data: Dict):
+        """Same as app.save_conversation: the session only waits for the enqueue"""
+        write_queue.submit_many([
+            {"conversation_id": conversation_id, "is_user": True, "content": prompt},
+            {"conversation_id": conversation_id, "is_user": False, "content": response_data["response"],
+             "search_results": response_data.get("search_results"),
+             "search_used": response_data.get("search_used", False)}
+        ])
+
+    def run(self) -> Dict:
+        db_manager = DatabaseManager(self.db_name)
+        write_queue = WriteBehindQueue(db_manager, WRITE_QUEUE_MAX_SIZE, WRITE_BATCH_MAX_MESSAGES)
+        if self.pool:
+            self.pool.start()
+        threads = []
+        started_at = datetime.now().isoformat(timespec="seconds")
+        started = time.perf_counter()
+
+        for i in range(self.sessions):
+            thread = threading.Thread(target=self.run_session, args=(i, db_manager, write_queue), daemon=True)
+            threads.append(thread)
+            thread.start()
+            if self.ramp_up and self.sessions > 1:
+                time.sleep(self.ramp_up / (self.sessions - 1))
+
+        for thread in threads:
+            thread.join()
+
+        elapsed = time.perf_counter() - started
+        # Turns still queued at the end are part of the run's cost, not hidden by the exit flush
+        flush_started = time.perf_counter()
+        write_queue.close()
+        flush_s = time.perf_counter() - flush_started
+        db_manager.close()
+        if self.pool:
+            self.pool.stop()
+        return {
+            "started_at": started_at,
+            "config": {
+                "server_url": self.server_url,
+                "db_name": self.db_name,
+                "sessions": self.sessions,
+                "turns_per_session": self.turns,
+                "think_time_s": self.think_time,
+                "ramp_up_s": self.ramp_up
+            },
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "sqlite": sqlite3.sqlite_version
+            },
+            "elapsed_s": round(elapsed, 3),
+            "final_flush_s": round(flush_s, 3),
+            "stages": {stage: stats.report(elapsed) for stage, stats in self.stats.items()},
+            "write_queue": write_queue.get_metrics(),
+            "backends": self.pool.status() if self.pool else None
+        }
+
+def export_replay(db_name: str, out_path: str) -> int:
+    """Write recorded search results from the chat history as stub replay lines"""
+    # Read-only, so exporting from the live history never migrates or writes it
+    db_manager = DatabaseManager(db_name, read_only=True)
+    try:
+        with db_manager.connection() as conn:
+            conversations = conn.execute('''
+                SELECT u.username, c.id FROM conversations c JOIN users u ON c.user_id = u.id
+            ''').fetchall()
+
+        written = 0
+        with open(out_path, "w", encoding="utf-8") as out:
+            for user_type, conversation_id in conversations:
+                for message in db_manager.get_conversation_messages(conversation_id):
+                    if message["search_results"]:
+                        out.write(json.dumps({"user_type": user_type,
+                                              "search_results": message["search_results"]}) + "\n")
+                        written += 1
+        return written
+    finally:
+        db_manager.close()
+
+def print_summary(report: Dict):
+    print(f"\n{report['config']['sessions']} sessions x {report['config']['turns_per_session']} turns "
+          f"in {report['elapsed_s']}s (+{report['final_flush_s']}s final write flush)")
+    print(f"{'stage':<14}{'count':>7}{'err%':>7}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}{'per s':>8}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<14}{stats['count']:>7}{stats['error_rate'] * 100:>7.1f}"
+              f"{stats['p50_ms'] or 0:>10.1f}{stats['p90_ms'] or 0:>10.1f}{stats['p99_ms'] or 0:>10.1f}"
+              f"{stats['max_ms'] or 0:>10.1f}{stats['throughput_per_s']:>8.2f}")
+    writes = report["write_queue"]
+    print(f"write queue: {writes['messages_written']} messages in {writes['batches']} commits, "
+          f"{writes['sync_fallback_writes']} sync fallbacks, {writes['failed_messages']} failed")
+    for backend in report.get("backends") or []:
+        print(f"  {backend['name']}: {backend['served']} served, "
+              f"{'healthy' if backend['healthy'] else 'unhealthy'}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-session load test for the chat pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run a load test")
+    run_parser.add_argument("--server", action="append", help="server URL, repeat for a pool (default: http://localhost:8000)")
+    run_parser.add_argument("--db", default="load_test.db", help="scratch database (never the real history)")
+    run_parser.add_argument("--sessions", type=int, default=10)
+    run_parser.add_argument("--turns", type=int, default=5)
+    run_parser.add_argument("--think-time", type=float, default=0.0, help="mean seconds between turns")
+    run_parser.add_argument("--ramp-up", type=float, default=0.0, help="seconds to start all sessions")
+    run_parser.add_argument("--report", help="JSON report path (default: load_report_<timestamp>.json)")
+
+    replay_parser = subparsers.add_parser("export-replay", help="export search results for stub_server --search-replay")
+    replay_parser.add_argument("--db", default="chat_history.db")
+    replay_parser.add_argument("--out", default="search_replay.jsonl")
+
+    args = parser.parse_args()
+
+    if args.command == "export-replay":
+        try:
+            count = export_replay(args.db, args.out)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return
+        print(f"Wrote {count} search result sets to {args.out}")
+        return
+
+    servers = args.server or ["http://localhost:8000"]
+    report = LoadTest(servers[0], args.db, args.sessions, args.turns, args.think_time, args.ramp_up,
+                      servers if len(servers) > 1 else None).run()
+    report_path = args.report or f"load_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print_summary(report)
+    print(f"\nReport written to {report_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import threading
+import time
+from typing import Dict, Optional
+
+from database import DatabaseManager
+
+class MaintenanceScheduler:
+    """Periodic housekeeping for the chat history database.
+
+    Every interval it applies the retention policy, archives idle
+    conversations, indexes a bounded chunk of the full-text backlog and
+    frees a bounded number of pages with incremental vacuum, so no single
+    run holds the write lock long.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, interval_minutes: float = 60,
+                 archive_after_days: Optional[float] = 30, archive_codec: str = "zlib",
+                 archive_batch: int = 50, fts_chunks_per_run: int = 20, vacuum_pages: int = 2000,
+                 retention_days: Optional[float] = None, delete_chunk_size: int = 500):
+        self.db_manager = db_manager
+        self.interval = interval_minutes * 60
+        self.archive_after_days = archive_after_days
+        self.archive_codec = archive_codec
+        self.archive_batch = archive_batch
+        self.fts_chunks_per_run = fts_chunks_per_run
+        self.vacuum_pages = vacuum_pages
+        self.retention_days = retention_days
+        self.delete_chunk_size = delete_chunk_size
+        self.last_run: Dict = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="db-maintenance", daemon=True)
+
+    def start(self):
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_running(self) -> bool:
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def run_once(self) -> Dict:
+        """Run every maintenance step once and return what each did"""
+        report = {"started_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+        if self.retention_days:
+            report["retention"] = self.db_manager.apply_retention(self.retention_days, self.delete_chunk_size)
+
+        if self.archive_after_days:
+            report["archive"] = self.db_manager.archive_idle_conversations(
+                self.archive_after_days, self.archive_codec, self.archive_batch)
+
+        indexed = 0
+        for _ in range(self.fts_chunks_per_run):
+            progress = self.db_manager.backfill_fts()
+            indexed += progress["indexed"]
+            if progress["done"]:
+                break
+        report["fts_indexed"] = indexed
+
+        report["compact"] = self.db_manager.compact(self.vacuum_pages)
+        self.last_run = report
+        return report
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Database maintenance error: {e}")
@@ -0,0 +1,240 @@
+"""Per-request cost and latency metering.
+
+Every answer is recorded with its latency, token counts, search use and
+cache outcome, attributed to persona and conversation. Combined with
+sampled instance uptime this reports cost per request, GPU utilization
+and idle waste:
+
+    python metering.py report --hours 24
+"""
+import argparse
+import atexit
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import METERING_DB, GPU_HOURLY_RATE
+
+# cache column values
+CACHE_MISS, CACHE_EXACT, CACHE_SEMANTIC = 0, 1, 2
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count when the server does not report one (about 4 characters per token)"""
+    return max(1, len(text) // 4) if text else 0
+
+class RequestMeter:
+    """Buffered request metrics in a small SQLite file.
+
+    Apart from the persona name, rows are integers (epoch seconds,
+    milliseconds, counts), and they are written in batches, so metering
+    adds no per-request write.
+    """
+
+    def __init__(self, db_name: str = "metering.db", flush_every: int = 20, flush_seconds: float = 30):
+        self.db_name = db_name
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self._buffer: List[tuple] = []
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_name, check_same_thread=False)
+        self.init_database()
+        atexit.register(self.flush)
+
+    def init_database(self):
+        """Initialize metering tables"""
+        with self._lock:
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS request_metrics (
+                    ts INTEGER NOT NULL,  -- epoch seconds
+                    user_type TEXT NOT NULL,
+                    conversation_id INTEGER,
+                    latency_ms INTEGER NOT NULL,
+                    tokens_in INTEGER NOT NULL,
+                    tokens_out INTEGER NOT NULL,
+                    search_calls INTEGER NOT NULL,
+                    cache INTEGER NOT NULL,  -- 0 miss, 1 exact hit, 2 semantic hit
+                    error INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_request_metrics_ts ON request_metrics (ts);
+                CREATE TABLE IF NOT EXISTS instance_uptime (
+                    instance_id TEXT NOT NULL,
+                    started_at INTEGER NOT NULL,  -- launch time, epoch seconds
+                    last_seen INTEGER NOT NULL,
+                    PRIMARY KEY (instance_id, started_at)
+                ) WITHOUT ROWID;
+            ''')
+            self._conn.commit()
+
+    def record(self, user_type: str, conversation_id: Optional[int], latency: float, prompt: str,
+               result: Optional[Dict] = None, error: bool = False):
+        """Record one generate call; latency in seconds, result as returned by LLMClient"""
+        result = result or {}
+        if result.get("semantic_entry_id"):
+            cache = CACHE_SEMANTIC
+        elif result.get("cached"):
+            cache = CACHE_EXACT
+        else:
+            cache = CACHE_MISS
+
+        tokens_out = result.get("tokens_generated") or estimate_tokens(result.get("response", ""))
+        row = (int(time.time()), user_type, conversation_id, int(latency * 1000),
+               result.get("prompt_tokens") or estimate_tokens(prompt), tokens_out if not error else 0,
+               int(bool(result.get("search_used"))), cache, int(error))
+
+        with self._lock:
+            self._buffer.append(row)
+            if len(self._buffer) >= self.flush_every or time.time() - self._last_flush >= self.flush_seconds:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._conn.executemany('''
+                INSERT INTO request_metrics (ts, user_type, conversation_id, latency_ms, tokens_in,
+                                             tokens_out, search_calls, cache, error)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', self._buffer)
+            self._conn.commit()
+            self._buffer = []
+        self._last_flush = time.time()
+
+    def record_uptime(self, instance_id: str, started_at: float, now: Optional[float] = None):
+        """Extend the running interval that began at started_at (the instance's launch time)"""
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO instance_uptime (instance_id, started_at, last_seen) VALUES (?, ?, ?)
+                ON CONFLICT (instance_id, started_at) DO UPDATE SET last_seen = excluded.last_seen
+            ''', (instance_id, int(started_at), int(now or time.time())))
+            self._conn.commit()
+
+    def uptime_seconds(self, since: float, until: float) -> float:
+        """Instance running time overlapping [since, until], summed over instances"""
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT SUM(MAX(0, MIN(last_seen, ?) - MAX(started_at, ?))) FROM instance_uptime
+                WHERE last_seen >= ? AND started_at <= ?
+            ''', (int(until), int(since), int(since), int(until))).fetchone()
+        return float(row[0] or 0)
+
+    def report(self, since: float, until: Optional[float] = None, hourly_rate: float = 0.526) -> Dict:
+        """Cost per request, GPU utilization and idle waste, with per-persona breakdown"""
+        until = until or time.time()
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT user_type, COUNT(*), SUM(cache > 0), SUM(error), SUM(search_calls),
+                       SUM(tokens_in), SUM(tokens_out),
+                       SUM(CASE WHEN cache = 0 AND error = 0 THEN latency_ms ELSE 0 END), AVG(latency_ms)
+                FROM request_metrics WHERE ts >= ? AND ts < ?
+                GROUP BY user_type
+            ''', (int(since), int(until))).fetchall()
+            latencies = [row[0] for row in self._conn.execute('''
+                SELECT latency_ms FROM request_metrics
+                WHERE ts >= ? AND ts < ? AND cache = 0 AND error = 0 ORDER BY latency_ms
+            ''', (int(since), int(until)))]
+
+        uptime = self.uptime_seconds(since, until)
+        instance_cost = uptime / 3600 * hourly_rate
+        requests_total = sum(row[1] for row in rows)
+        # Generation time approximates GPU busy time on a one-request-at-a-time server
+        busy = sum(row[7] for row in rows) / 1000
+
+        personas = {}
+        for user_type, count, hits, errors, searches, tokens_in, tokens_out, busy_ms, avg_latency in rows:
+            share = busy_ms / 1000 / busy if busy else count / requests_total
+            personas[user_type] = {
+                "requests": count,
+                "cache_hit_rate": round(hits / count, 3),
+                "errors": errors,
+                "search_calls": searches,
+                "tokens_in": tokens_in,
+                "tokens_out": tokens_out,
+                "avg_latency_ms": round(avg_latency, 1),
+                "gpu_seconds": round(busy_ms / 1000, 1),
+                # Instance cost split by each persona's share of GPU time
+                "cost": round(instance_cost * share, 4),
+                "cost_per_request": round(instance_cost * share / count, 4)
+            }
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] if latencies else None
+
+        return {
+            "since": since,
+            "until": until,
+            "hourly_rate": hourly_rate,
+            "requests": requests_total,
+            "instance_hours": round(uptime / 3600, 3),
+            "instance_cost": round(instance_cost, 4),
+            "cost_per_request": round(instance_cost / requests_total, 4) if requests_total else None,
+            "gpu_busy_hours": round(busy / 3600, 3),
+            "gpu_utilization": round(min(1.0, busy / uptime), 3) if uptime else None,
+            "idle_waste_cost": round(max(0.0, uptime - busy) / 3600 * hourly_rate, 4),
+            "generation_p50_ms": pct(50),
+            "generation_p95_ms": pct(95),
+            "by_user_type": personas
+        }
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+class UptimeRecorder:
+    """Samples instance state periodically and extends the running intervals"""
+
+    def __init__(self, meter: RequestMeter, aws_managers: List, interval_seconds: float = 60):
+        self.meter = meter
+        self.aws_managers = aws_managers
+        self.interval = interval_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="uptime-recorder", daemon=True)
+
+    def start(self):
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_running(self) -> bool:
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def sample(self):
+        for manager in self.aws_managers:
+            instance = manager.get_snapshot()
+            if instance['State']['Name'] == "running" and instance.get('LaunchTime'):
+                self.meter.record_uptime(manager.instance_id, instance['LaunchTime'].timestamp())
+
+    def _loop(self):
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Uptime recorder error: {e}")
+            if self._stop.wait(self.interval):
+                break
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request cost and latency report")
+    parser.add_argument("--db", default=METERING_DB)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="cost per request, GPU utilization and idle waste")
+    report_parser.add_argument("--hours", type=float, default=24, help="report window ending now")
+    report_parser.add_argument("--hourly-rate", type=float, default=GPU_HOURLY_RATE)
+    args = parser.parse_args()
+
+    meter = RequestMeter(args.db)
+    try:
+        print(json.dumps(meter.report(time.time() - args.hours * 3600, hourly_rate=args.hourly_rate), indent=2))
+    finally:
+        meter.close()
+
+if __name__ == "__main__":
+    main()
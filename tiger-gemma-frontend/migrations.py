@@ -0,0 +1,496 @@
+import sqlite3
+import json
+import lzma
+import zlib
+from typing import Callable, List, Tuple, Union
+
+from search_store import intern_search_results
+
+# A migration step is either a list of SQL statements or a callable that
+# receives the open connection. Steps run in order inside one transaction
+# each, and PRAGMA user_version records the last applied version.
+Step = Union[List[str], Callable[[sqlite3.Connection], None]]
+
+def _rebuild_with_cascades(conn: sqlite3.Connection):
+    """Recreate conversations and messages with ON DELETE CASCADE foreign keys"""
+    # SQLite cannot alter a foreign key in place, so copy into new tables
+    conn.execute('''
+        CREATE TABLE conversations_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO conversations_new (id, user_id, title, created_at, updated_at)
+        SELECT id, user_id, title, created_at, updated_at FROM conversations
+    ''')
+
+    conn.execute('''
+        CREATE TABLE messages_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            conversation_id INTEGER NOT NULL,
+            is_user BOOLEAN NOT NULL,
+            content TEXT NOT NULL,
+            search_results TEXT,  -- JSON string
+            search_used BOOLEAN DEFAULT FALSE,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (conversation_id) REFERENCES conversations (id) ON DELETE CASCADE
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO messages_new (id, conversation_id, is_user, content, search_results, search_used, timestamp)
+        SELECT id, conversation_id, is_user, content, search_results, search_used, timestamp FROM messages
+    ''')
+
+    conn.execute('DROP TABLE messages')
+    conn.execute('DROP TABLE conversations')
+    conn.execute('ALTER TABLE conversations_new RENAME TO conversations')
+    conn.execute('ALTER TABLE messages_new RENAME TO messages')
+
+    # Drop rows that already pointed nowhere, they would break cascades
+    conn.execute('DELETE FROM messages WHERE conversation_id NOT IN (SELECT id FROM conversations)')
+    conn.execute('DELETE FROM conversations WHERE user_id NOT IN (SELECT id FROM users)')
+
+def _deduplicate_search_results(conn: sqlite3.Connection):
+    """Move inline search result JSON into the content-addressed store"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS search_result_store (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hash TEXT UNIQUE NOT NULL,  -- sha256 of the canonical JSON
+            result_type TEXT,  -- product_link, academic, ...
+            payload TEXT NOT NULL  -- JSON string
+        )
+    ''')
+    # JSON array of search_result_store ids, in display order
+    conn.execute('ALTER TABLE messages ADD COLUMN search_result_ids TEXT')
+
+    cursor = conn.cursor()
+    last_id = 0
+    while True:
+        rows = conn.execute('''
+            SELECT id, search_results FROM messages
+            WHERE id > ? AND search_results IS NOT NULL
+            ORDER BY id LIMIT 1000
+        ''', (last_id,)).fetchall()
+        if not rows:
+            break
+        for message_id, search_results in rows:
+            results = json.loads(search_results)
+            ids = intern_search_results(cursor, results) if results else []
+            conn.execute('UPDATE messages SET search_result_ids = ? WHERE id = ?',
+                         (json.dumps(ids) if ids else None, message_id))
+        last_id = rows[-1][0]
+
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        conn.execute('ALTER TABLE messages DROP COLUMN search_results')
+    else:
+        # No DROP COLUMN before SQLite 3.35, leave the legacy column empty
+        conn.execute('UPDATE messages SET search_results = NULL WHERE search_results IS NOT NULL')
+
+def _create_usage_rollups(conn: sqlite3.Connection):
+    """Hourly per-persona usage counters, kept current by a trigger"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS usage_hourly (
+            hour TEXT NOT NULL,  -- 'YYYY-MM-DD HH:00:00', UTC like message timestamps
+            user_type TEXT NOT NULL,
+            messages INTEGER NOT NULL DEFAULT 0,
+            user_messages INTEGER NOT NULL DEFAULT 0,
+            searches INTEGER NOT NULL DEFAULT 0,
+            shopping_links INTEGER NOT NULL DEFAULT 0,
+            responses INTEGER NOT NULL DEFAULT 0,
+            response_chars INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (hour, user_type)
+        ) WITHOUT ROWID
+    ''')
+    # Rollups record usage as it happened: archiving, retention and user
+    # deletes do not subtract from them
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS usage_hourly_message_insert AFTER INSERT ON messages
+        BEGIN
+            INSERT INTO usage_hourly (hour, user_type, messages, user_messages, searches,
+                                      shopping_links, responses, response_chars)
+            SELECT strftime('%Y-%m-%d %H:00:00', COALESCE(NEW.timestamp, CURRENT_TIMESTAMP)), u.username,
+                   1, NEW.is_user = TRUE, NEW.search_used = TRUE,
+                   ({SHOPPING_LINKS_SQL.format(ids="NEW.search_result_ids")}),
+                   NEW.is_user = FALSE, CASE WHEN NEW.is_user = FALSE THEN length(NEW.content) ELSE 0 END
+            FROM conversations c JOIN users u ON c.user_id = u.id
+            WHERE c.id = NEW.conversation_id
+            ON CONFLICT (hour, user_type) DO UPDATE SET
+                messages = messages + excluded.messages,
+                user_messages = user_messages + excluded.user_messages,
+                searches = searches + excluded.searches,
+                shopping_links = shopping_links + excluded.shopping_links,
+                responses = responses + excluded.responses,
+                response_chars = response_chars + excluded.response_chars;
+        END
+    ''')
+
+    conn.execute(f'''
+        INSERT INTO usage_hourly (hour, user_type, messages, user_messages, searches,
+                                  shopping_links, responses, response_chars)
+        SELECT strftime('%Y-%m-%d %H:00:00', m.timestamp), u.username, COUNT(*),
+               SUM(m.is_user = TRUE), SUM(m.search_used = TRUE),
+               SUM(({SHOPPING_LINKS_SQL.format(ids="m.search_result_ids")})),
+               SUM(m.is_user = FALSE), SUM(CASE WHEN m.is_user = FALSE THEN length(m.content) ELSE 0 END)
+        FROM messages m
+        JOIN conversations c ON m.conversation_id = c.id
+        JOIN users u ON c.user_id = u.id
+        GROUP BY 1, 2
+    ''')
+
+    # Archived messages only exist inside their compressed payloads
+    decoders = {"zlib": zlib.decompress, "lzma": lzma.decompress}
+    archives = conn.execute('''
+        SELECT u.username, a.codec, a.payload FROM archived_conversations a
+        JOIN conversations c ON a.conversation_id = c.id
+        JOIN users u ON c.user_id = u.id
+    ''')
+    for user_type, codec, payload in archives.fetchall():
+        for message in json.loads(decoders[codec](payload).decode("utf-8")):
+            is_user = bool(message["is_user"])
+            conn.execute('''
+                INSERT INTO usage_hourly (hour, user_type, messages, user_messages, searches,
+                                          shopping_links, responses, response_chars)
+                VALUES (strftime('%Y-%m-%d %H:00:00', ?), ?, 1, ?, ?, ?, ?, ?)
+                ON CONFLICT (hour, user_type) DO UPDATE SET
+                    messages = messages + 1,
+                    user_messages = user_messages + excluded.user_messages,
+                    searches = searches + excluded.searches,
+                    shopping_links = shopping_links + excluded.shopping_links,
+                    responses = responses + excluded.responses,
+                    response_chars = response_chars + excluded.response_chars
+            ''', (message["timestamp"], user_type, is_user, bool(message["search_used"]),
+                  sum(1 for r in message.get("search_results") or [] if r.get("type") == "product_link"),
+                  not is_user, 0 if is_user else len(message["content"])))
+
+# Number of shopping product links among a message's stored search results
+SHOPPING_LINKS_SQL = '''
+    SELECT COUNT(*) FROM search_result_store
+    WHERE result_type = 'product_link' AND id IN (SELECT value FROM json_each({ids}))
+'''
+
+# Searchable text of a message's stored search results (titles and snippets)
+FTS_SOURCES_SQL = '''
+    SELECT group_concat(COALESCE(json_extract(payload, '$.title'), '') || ' ' ||
+                        COALESCE(json_extract(payload, '$.snippet'), ''), ' ')
+    FROM search_result_store
+    WHERE id IN (SELECT value FROM json_each({ids}))
+'''
+
+def _index_archived_messages(conn: sqlite3.Connection):
+    """Keep archived messages in the full-text index, with enough metadata to search them"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archived_messages (
+            message_id INTEGER PRIMARY KEY,
+            conversation_id INTEGER NOT NULL,
+            is_user BOOLEAN NOT NULL,
+            timestamp TIMESTAMP,
+            FOREIGN KEY (conversation_id) REFERENCES conversations (id) ON DELETE CASCADE
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_archived_messages_conversation ON archived_messages (conversation_id)
+    ''')
+    # Archiving moves messages: their index rows stay until the archive itself goes
+    conn.execute('DROP TRIGGER IF EXISTS messages_fts_delete')
+    conn.execute('''
+        CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages
+        WHEN NOT EXISTS (SELECT 1 FROM archived_messages WHERE message_id = OLD.id)
+        BEGIN
+            DELETE FROM messages_fts WHERE rowid = OLD.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS archived_messages_fts_delete AFTER DELETE ON archived_messages
+        BEGIN
+            DELETE FROM messages_fts WHERE rowid = OLD.message_id;
+        END
+    ''')
+
+    # Conversations archived so far lost their index rows; rebuild them from the payloads
+    decoders = {"zlib": zlib.decompress, "lzma": lzma.decompress}
+    archives = conn.execute('SELECT conversation_id, codec, payload FROM archived_conversations')
+    for conversation_id, codec, payload in archives.fetchall():
+        for message in json.loads(decoders[codec](payload).decode("utf-8")):
+            sources = " ".join(f"{r.get('title') or ''} {r.get('snippet') or ''}"
+                               for r in message.get("search_results") or [])
+            conn.execute('''
+                INSERT OR REPLACE INTO archived_messages (message_id, conversation_id, is_user, timestamp)
+                VALUES (?, ?, ?, ?)
+            ''', (message["id"], conversation_id, bool(message["is_user"]), message["timestamp"]))
+            conn.execute('''
+                INSERT OR REPLACE INTO messages_fts (rowid, content, sources) VALUES (?, ?, ?)
+            ''', (message["id"], message["content"], sources or None))
+
+# Shared with DatabaseManager.rebuild_user_stats; counts hot and archived messages
+REBUILD_USER_STATS_SQL = [
+    'DELETE FROM user_stats',
+    '''
+    INSERT INTO user_stats (user_id, message_count, search_count, last_activity)
+    SELECT user_id, SUM(message_count), SUM(search_count), MAX(last_activity) FROM (
+        SELECT c.user_id, COUNT(*) AS message_count,
+               COALESCE(SUM(m.search_used = TRUE), 0) AS search_count, MAX(m.timestamp) AS last_activity
+        FROM messages m JOIN conversations c ON m.conversation_id = c.id
+        GROUP BY c.user_id
+        UNION ALL
+        SELECT c.user_id, a.message_count, a.search_count, a.last_timestamp
+        FROM archived_conversations a JOIN conversations c ON a.conversation_id = c.id
+    )
+    GROUP BY user_id
+    '''
+]
+
+MIGRATIONS: List[Tuple[int, str, Step]] = [
+    (1, "initial schema", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            display_name TEXT NOT NULL,
+            icon TEXT,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            conversation_id INTEGER NOT NULL,
+            is_user BOOLEAN NOT NULL,
+            content TEXT NOT NULL,
+            search_results TEXT,  -- JSON string
+            search_used BOOLEAN DEFAULT FALSE,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (conversation_id) REFERENCES conversations (id)
+        )
+        '''
+    ]),
+    (2, "cascading foreign keys", _rebuild_with_cascades),
+    (3, "hot path indexes", [
+        # get_conversation_messages: filter by conversation, ordered by time.
+        # search_used rides along so the stats queries are index-only.
+        '''
+        CREATE INDEX IF NOT EXISTS idx_messages_conversation_timestamp
+            ON messages (conversation_id, timestamp, search_used)
+        ''',
+        # get_or_create_conversation and the stats joins by user
+        '''
+        CREATE INDEX IF NOT EXISTS idx_conversations_user_updated
+            ON conversations (user_id, updated_at)
+        '''
+    ]),
+    (4, "materialized user stats", [
+        '''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            search_count INTEGER NOT NULL DEFAULT 0,
+            last_activity TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS user_stats_message_insert AFTER INSERT ON messages
+        BEGIN
+            INSERT INTO user_stats (user_id, message_count, search_count, last_activity)
+            SELECT user_id, 1, NEW.search_used = TRUE, NEW.timestamp
+            FROM conversations WHERE id = NEW.conversation_id
+            ON CONFLICT (user_id) DO UPDATE SET
+                message_count = message_count + 1,
+                search_count = search_count + excluded.search_count,
+                last_activity = MAX(COALESCE(last_activity, ''), excluded.last_activity);
+        END
+        ''',
+        # Deleting single messages keeps last_activity unless nothing is left;
+        # rebuild_user_stats recomputes it exactly.
+        '''
+        CREATE TRIGGER IF NOT EXISTS user_stats_message_delete AFTER DELETE ON messages
+        BEGIN
+            UPDATE user_stats SET
+                message_count = message_count - 1,
+                search_count = search_count - (OLD.search_used = TRUE),
+                last_activity = CASE WHEN message_count <= 1 THEN NULL ELSE last_activity END
+            WHERE user_id = (SELECT user_id FROM conversations WHERE id = OLD.conversation_id);
+        END
+        ''',
+        # Cascaded message deletes no longer see their conversation, so the
+        # conversation delete accounts for all of its messages up front.
+        '''
+        CREATE TRIGGER IF NOT EXISTS user_stats_conversation_delete BEFORE DELETE ON conversations
+        BEGIN
+            UPDATE user_stats SET
+                message_count = message_count - (
+                    SELECT COUNT(*) FROM messages WHERE conversation_id = OLD.id),
+                search_count = search_count - (
+                    SELECT COUNT(*) FROM messages WHERE conversation_id = OLD.id AND search_used = TRUE)
+            WHERE user_id = OLD.user_id;
+            UPDATE user_stats SET last_activity = NULL
+            WHERE user_id = OLD.user_id AND message_count <= 0;
+        END
+        ''',
+        'DELETE FROM user_stats',
+        '''
+        INSERT INTO user_stats (user_id, message_count, search_count, last_activity)
+        SELECT c.user_id, COUNT(*), COALESCE(SUM(m.search_used = TRUE), 0), MAX(m.timestamp)
+        FROM messages m JOIN conversations c ON m.conversation_id = c.id
+        GROUP BY c.user_id
+        '''
+    ]),
+    (5, "keyset pagination index", [
+        # Paging history newest-first by message id within a conversation
+        '''
+        CREATE INDEX IF NOT EXISTS idx_messages_conversation_id
+            ON messages (conversation_id, id)
+        '''
+    ]),
+    (6, "content-addressed search results", _deduplicate_search_results),
+    (7, "full-text search", [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            content, sources, tokenize = 'unicode61 remove_diacritics 2'
+        )
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages
+        BEGIN
+            INSERT INTO messages_fts (rowid, content, sources)
+            VALUES (NEW.id, NEW.content, ({FTS_SOURCES_SQL.format(ids="NEW.search_result_ids")}));
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages
+        BEGIN
+            DELETE FROM messages_fts WHERE rowid = OLD.id;
+        END
+        ''',
+        # Progress of background jobs such as the FTS backfill
+        '''
+        CREATE TABLE IF NOT EXISTS maintenance_state (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        )
+        ''',
+        # Messages up to here predate the triggers and need backfilling
+        '''
+        INSERT OR REPLACE INTO maintenance_state (name, value)
+        SELECT 'fts_backfill_target', COALESCE(MAX(id), 0) FROM messages
+        ''',
+        "INSERT OR REPLACE INTO maintenance_state (name, value) VALUES ('fts_backfill_last', '0')"
+    ]),
+    (8, "conversation archive", [
+        # Idle conversations' messages, compressed as one JSON document
+        '''
+        CREATE TABLE IF NOT EXISTS archived_conversations (
+            conversation_id INTEGER PRIMARY KEY,
+            message_count INTEGER NOT NULL,
+            search_count INTEGER NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            last_timestamp TIMESTAMP,
+            codec TEXT NOT NULL,  -- zlib or lzma
+            payload BLOB NOT NULL,
+            raw_size INTEGER NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (conversation_id) REFERENCES conversations (id) ON DELETE CASCADE
+        )
+        ''',
+        # Moving messages into the archive is not a deletion as far as
+        # user_stats is concerned; archive rows are written first.
+        'DROP TRIGGER IF EXISTS user_stats_message_delete',
+        '''
+        CREATE TRIGGER user_stats_message_delete AFTER DELETE ON messages
+        WHEN NOT EXISTS (SELECT 1 FROM archived_conversations WHERE conversation_id = OLD.conversation_id
+                         AND last_message_id >= OLD.id)
+        BEGIN
+            UPDATE user_stats SET
+                message_count = message_count - 1,
+                search_count = search_count - (OLD.search_used = TRUE),
+                last_activity = CASE WHEN message_count <= 1 THEN NULL ELSE last_activity END
+            WHERE user_id = (SELECT user_id FROM conversations WHERE id = OLD.conversation_id);
+        END
+        ''',
+        'DROP TRIGGER IF EXISTS user_stats_conversation_delete',
+        '''
+        CREATE TRIGGER user_stats_conversation_delete BEFORE DELETE ON conversations
+        BEGIN
+            UPDATE user_stats SET
+                message_count = message_count - (
+                    SELECT COUNT(*) FROM messages WHERE conversation_id = OLD.id) - COALESCE((
+                    SELECT message_count FROM archived_conversations WHERE conversation_id = OLD.id), 0),
+                search_count = search_count - (
+                    SELECT COUNT(*) FROM messages WHERE conversation_id = OLD.id AND search_used = TRUE) - COALESCE((
+                    SELECT search_count FROM archived_conversations WHERE conversation_id = OLD.id), 0)
+            WHERE user_id = OLD.user_id;
+            UPDATE user_stats SET last_activity = NULL
+            WHERE user_id = OLD.user_id AND message_count <= 0;
+        END
+        ''',
+        # Finds idle conversations without scanning them all
+        '''
+        CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations (updated_at)
+        '''
+    ]),
+    (9, "retention index", [
+        # Age-based retention deletes the oldest messages first
+        '''
+        CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages (timestamp)
+        '''
+    ]),
+    (10, "hourly usage rollups", _create_usage_rollups),
+    (11, "searchable archive", _index_archived_messages),
+]
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(db_name: str, timeout: float = 5.0) -> int:
+    """Apply pending migrations in order, return the resulting schema version"""
+    conn = sqlite3.connect(db_name, timeout=timeout, isolation_level=None)
+    try:
+        # Must be off while tables are rebuilt, and cannot change inside a transaction
+        conn.execute('PRAGMA foreign_keys = OFF')
+
+        for version, name, step in MIGRATIONS:
+            if get_schema_version(conn) >= version:
+                continue
+
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Another process may have migrated while we waited for the lock
+                if get_schema_version(conn) >= version:
+                    conn.execute('COMMIT')
+                    continue
+
+                if callable(step):
+                    step(conn)
+                else:
+                    for statement in step:
+                        conn.execute(statement)
+
+                violations = conn.execute('PRAGMA foreign_key_check').fetchall()
+                if violations:
+                    raise sqlite3.IntegrityError(
+                        f"Migration {version} ({name}) left {len(violations)} foreign key violations")
+
+                conn.execute(f'PRAGMA user_version = {version}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+        return get_schema_version(conn)
+    finally:
+        conn.close()
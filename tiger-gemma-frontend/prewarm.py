@@ -0,0 +1,284 @@
+"""Predictive pre-warming of the GPU instance from chat history demand.
+
+Learns how likely each (weekday, hour) slot is to see user messages from
+the hourly usage rollups, starts the instance ahead of likely demand and
+stops instances it started once demand is no longer predicted. A replay
+of past history reports the hit rate and cost of a policy:
+
+    python prewarm.py forecast --db chat_history.db
+    python prewarm.py simulate --db chat_history.db --threshold 0.3 --max-daily-cost 5
+"""
+import argparse
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from config import (DATABASE_NAME, GPU_HOURLY_RATE, PREWARM_THRESHOLD, PREWARM_LEAD_MINUTES, PREWARM_MAX_DAILY_COST,
+                    PREWARM_HISTORY_DAYS, IDLE_TIMEOUT_MINUTES)
+from database import DatabaseManager
+
+HOUR_FORMAT = "%Y-%m-%d %H:00:00"
+
+def load_active_hours(db_manager: DatabaseManager, since: Optional[datetime] = None,
+                      until: Optional[datetime] = None) -> Set[datetime]:
+    """UTC hours in which at least one user message was sent, from usage_hourly"""
+    with db_manager.connection() as conn:
+        rows = conn.execute('''
+            SELECT DISTINCT hour FROM usage_hourly
+            WHERE user_messages > 0 AND hour >= ? AND hour < ?
+        ''', ((since or datetime.min).strftime(HOUR_FORMAT),
+              (until or datetime.max).strftime(HOUR_FORMAT))).fetchall()
+    return {datetime.strptime(row[0], HOUR_FORMAT) for row in rows}
+
+def last_message_time(db_manager: DatabaseManager) -> Optional[datetime]:
+    with db_manager.connection() as conn:
+        row = conn.execute('SELECT MAX(timestamp) FROM messages').fetchone()
+    return datetime.strptime(row[0][:19], "%Y-%m-%d %H:%M:%S") if row and row[0] else None
+
+def hour_start(when: datetime) -> datetime:
+    return when.replace(minute=0, second=0, microsecond=0)
+
+class DemandModel:
+    """Probability that a (weekday, hour) slot sees user activity"""
+
+    def __init__(self, probability: Optional[Dict[tuple, float]] = None):
+        self.probability = probability or {}
+
+    @classmethod
+    def fit(cls, active_hours: Set[datetime], start: datetime, end: datetime) -> "DemandModel":
+        """Count active weeks per slot between start and end, smoothed towards the hour-of-day rate"""
+        seen: Dict[tuple, int] = {}
+        active: Dict[tuple, int] = {}
+        hour = hour_start(start)
+        while hour < end:
+            slot = (hour.weekday(), hour.hour)
+            seen[slot] = seen.get(slot, 0) + 1
+            if hour in active_hours:
+                active[slot] = active.get(slot, 0) + 1
+            hour += timedelta(hours=1)
+
+        probability = {}
+        for slot, count in seen.items():
+            # Sparse weekday slots borrow strength from the same hour on other days
+            same_hour = [s for s in seen if s[1] == slot[1]]
+            hour_rate = sum(active.get(s, 0) for s in same_hour) / sum(seen[s] for s in same_hour)
+            probability[slot] = (active.get(slot, 0) + hour_rate) / (count + 1)
+        return cls(probability)
+
+    def predict(self, when: datetime) -> float:
+        return self.probability.get((when.weekday(), when.hour), 0.0)
+
+class PrewarmPolicy:
+    """Which hours to keep warm: likely enough, and within the daily cost cap"""
+
+    def __init__(self, threshold: float = 0.3, lead_minutes: float = 10,
+                 max_daily_cost: Optional[float] = None, hourly_rate: float = GPU_HOURLY_RATE):
+        self.threshold = threshold
+        self.lead_minutes = lead_minutes
+        self.max_daily_cost = max_daily_cost
+        self.hourly_rate = hourly_rate
+
+    @property
+    def max_warm_hours(self) -> int:
+        if self.max_daily_cost is None:
+            return 24
+        return max(0, min(24, int(self.max_daily_cost // self.hourly_rate)))
+
+    def warm_hours(self, model: DemandModel, day: datetime) -> Set[datetime]:
+        """Hours of one UTC day to pre-warm, the most likely first"""
+        day = day.replace(hour=0, minute=0, second=0, microsecond=0)
+        candidates = [(model.predict(day + timedelta(hours=h)), day + timedelta(hours=h)) for h in range(24)]
+        likely = sorted((c for c in candidates if c[0] >= self.threshold), reverse=True)
+        return {hour for _, hour in likely[:self.max_warm_hours]}
+
+    def is_warm(self, model: DemandModel, hour: datetime) -> bool:
+        """Whether hour is in the warm set of its own UTC day"""
+        return hour_start(hour) in self.warm_hours(model, hour)
+
+def simulate(db_manager: DatabaseManager, policy: PrewarmPolicy, history_days: int = 28,
+             since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict:
+    """Replay history day by day, retraining on the preceding history_days each day"""
+    active_hours = load_active_hours(db_manager)
+    if not active_hours:
+        return {"error": "no usage history"}
+
+    first_day = min(active_hours).replace(hour=0)
+    start = (since or first_day + timedelta(days=history_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    end = until or max(active_hours) + timedelta(hours=1)
+    if start >= end:
+        return {"error": f"need more than {history_days} days of history before the replay"}
+
+    demand = hits = warm_total = warm_runs = 0
+    day = start
+    while day < end:
+        model = DemandModel.fit(active_hours, day - timedelta(days=history_days), day)
+        warm = policy.warm_hours(model, day)
+        warm_total += len(warm)
+        # Each run of consecutive warm hours starts lead_minutes early
+        warm_runs += sum(1 for hour in warm if hour - timedelta(hours=1) not in warm)
+        for h in range(24):
+            hour = day + timedelta(hours=h)
+            if hour in active_hours and hour < end:
+                demand += 1
+                hits += hour in warm
+        day += timedelta(days=1)
+
+    days = max(1, (day - start).days)
+    misses = demand - hits
+    # A miss is served by a cold start that then runs out the idle timeout
+    miss_hours = misses * (1 + IDLE_TIMEOUT_MINUTES / 60)
+    warm_hours = warm_total + warm_runs * policy.lead_minutes / 60
+    rate = policy.hourly_rate
+
+    return {
+        "period": {"start": start.strftime(HOUR_FORMAT), "end": end.strftime(HOUR_FORMAT), "days": days},
+        "policy": {"threshold": policy.threshold, "lead_minutes": policy.lead_minutes,
+                   "max_daily_cost": policy.max_daily_cost, "history_days": history_days},
+        "demand_hours": demand,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / demand, 3) if demand else 0.0,
+        "warm_hours": round(warm_hours, 1),
+        "wasted_warm_hours": warm_total - hits,
+        "cost": round((warm_hours + miss_hours) * rate, 2),
+        "cost_per_day": round((warm_hours + miss_hours) * rate / days, 2),
+        "reactive_only_cost": round(demand * (1 + IDLE_TIMEOUT_MINUTES / 60) * rate, 2),
+        "always_on_cost": round(days * 24 * rate, 2)
+    }
+
+class PrewarmScheduler:
+    """Starts the instance ahead of predicted demand and stops what it started.
+
+    Instances started by hand are never stopped here; idle shutdown covers
+    those. The model is retrained from the rollups once per UTC day.
+    """
+
+    def __init__(self, aws_manager, db_manager: DatabaseManager, policy: PrewarmPolicy,
+                 server_port: int = 8000, history_days: int = 28, check_minutes: float = 5,
+                 idle_minutes: float = 10, start_timeout: float = 900):
+        self.aws_manager = aws_manager
+        self.db_manager = db_manager
+        self.policy = policy
+        self.server_port = server_port
+        self.history_days = history_days
+        self.interval = check_minutes * 60
+        self.idle_minutes = idle_minutes
+        self.start_timeout = start_timeout
+        self.model: Optional[DemandModel] = None
+        self.trained_for: Optional[datetime] = None
+        self.started_by_prewarm = False
+        self.warm_hours_spent: Dict[str, float] = {}
+        self.decisions: List[Dict] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="gpu-prewarm", daemon=True)
+
+    def start(self):
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_running(self) -> bool:
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def wants_warm(self) -> bool:
+        """Whether the latest check predicted demand, for the idle shutdown to respect"""
+        return bool(self.decisions and self.decisions[-1]["wanted"] and self.started_by_prewarm)
+
+    def _train(self, today: datetime):
+        if self.trained_for != today:
+            since = today - timedelta(days=self.history_days)
+            self.model = DemandModel.fit(load_active_hours(self.db_manager, since, today), since, today)
+            self.trained_for = today
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict:
+        """Compare predicted demand with the instance state and act on it"""
+        now = now or datetime.utcnow()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        self._train(today)
+
+        # Every hour from now to the end of the lead time, each checked against its own day,
+        # so a window just before midnight is not judged by the next day's plan
+        target = hour_start(now + timedelta(minutes=self.policy.lead_minutes))
+        hours = [hour_start(now)]
+        while hours[-1] < target:
+            hours.append(hours[-1] + timedelta(hours=1))
+        wanted = any(self.policy.is_warm(self.model, hour) for hour in hours)
+        status = self.aws_manager.get_status()
+        day_key = today.strftime("%Y-%m-%d")
+
+        if status == "running" and self.started_by_prewarm:
+            self.warm_hours_spent[day_key] = self.warm_hours_spent.get(day_key, 0) + self.interval / 3600
+        spent = self.warm_hours_spent.get(day_key, 0) * self.policy.hourly_rate
+        within_budget = self.policy.max_daily_cost is None or spent < self.policy.max_daily_cost
+
+        action = "none"
+        if wanted and status == "stopped" and within_budget:
+            self.aws_manager.start_instance_async(self.server_port, self.start_timeout)
+            self.started_by_prewarm = True
+            action = "start"
+        elif status == "running" and self.started_by_prewarm and (not wanted or not within_budget):
+            last_message = last_message_time(self.db_manager)
+            if last_message is None or now - last_message > timedelta(minutes=self.idle_minutes):
+                self.aws_manager.request_stop()
+                self.started_by_prewarm = False
+                action = "stop"
+        elif status in ("stopped", "stopping"):
+            self.started_by_prewarm = False
+
+        decision = {"at": now.strftime("%Y-%m-%d %H:%M:%S"), "status": status, "wanted": wanted,
+                    "probability": round(max(self.model.predict(hour) for hour in hours), 3), "spent": round(spent, 2),
+                    "action": action}
+        self.decisions = (self.decisions + [decision])[-100:]
+        return decision
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"GPU pre-warm error: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Predictive GPU pre-warming")
+    parser.add_argument("--db", default=DATABASE_NAME)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    forecast_parser = subparsers.add_parser("forecast", help="print the pre-warm plan for the next days")
+    forecast_parser.add_argument("--days", type=int, default=7)
+
+    simulate_parser = subparsers.add_parser("simulate", help="replay history and report hit rate and cost")
+    simulate_parser.add_argument("--since", help="first replayed day (YYYY-MM-DD)")
+    simulate_parser.add_argument("--until", help="end of replay (YYYY-MM-DD)")
+
+    for sub in (forecast_parser, simulate_parser):
+        sub.add_argument("--threshold", type=float, default=PREWARM_THRESHOLD)
+        sub.add_argument("--lead-minutes", type=float, default=PREWARM_LEAD_MINUTES)
+        sub.add_argument("--max-daily-cost", type=float, default=PREWARM_MAX_DAILY_COST)
+        sub.add_argument("--history-days", type=int, default=PREWARM_HISTORY_DAYS)
+
+    args = parser.parse_args()
+    policy = PrewarmPolicy(args.threshold, args.lead_minutes, args.max_daily_cost)
+    db_manager = DatabaseManager(args.db)
+
+    try:
+        if args.command == "simulate":
+            since = datetime.strptime(args.since, "%Y-%m-%d") if args.since else None
+            until = datetime.strptime(args.until, "%Y-%m-%d") if args.until else None
+            print(json.dumps(simulate(db_manager, policy, args.history_days, since, until), indent=2))
+            return
+
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        since = today - timedelta(days=args.history_days)
+        model = DemandModel.fit(load_active_hours(db_manager, since, today), since, today)
+        for offset in range(args.days):
+            day = today + timedelta(days=offset)
+            hours = sorted(hour.hour for hour in policy.warm_hours(model, day))
+            print(f"{day.strftime('%a %Y-%m-%d')}: {', '.join(f'{h:02d}h' for h in hours) or 'cold'}")
+    finally:
+        db_manager.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import atexit
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value: Any = None
+        self.created_at: Optional[float] = None
+        self.healthy: Optional[bool] = None
+        self.checked_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+class ResourceRegistry:
+    """Process-wide resources, created on first use and shared by all sessions.
+
+    Each resource is registered with a factory and optionally a health
+    check and a close function. Creation is single-flight: concurrent
+    first callers wait for one factory call, without blocking other
+    resources. A resource can be keyed (e.g. an LLM client per server
+    URL); the key is passed to the factory. With latest_only, a new key
+    replaces the instances of older keys, e.g. when the server's IP
+    changes after a restart. close_all() runs at exit and releases
+    everything in reverse creation order.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Tuple[Callable[..., Any], Optional[Callable[[Any], bool]],
+                                         Optional[Callable[[Any], None]]]] = {}
+        self._latest_only = set()
+        self._entries: Dict[Tuple, _Entry] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.close_all)
+
+    def register(self, name: str, factory: Callable[..., Any],
+                 health: Optional[Callable[[Any], bool]] = None,
+                 close: Optional[Callable[[Any], None]] = None, latest_only: bool = False):
+        with self._lock:
+            self._factories[name] = (factory, health, close)
+            if latest_only:
+                self._latest_only.add(name)
+
+    def get(self, name: str, *key) -> Any:
+        """The shared instance of name (for key), created on first use"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Resource registry is closed")
+            factory = self._factories[name][0]
+            stale = []
+            if name in self._latest_only and (name,) + key not in self._entries:
+                stale = [k for k in self._entries if k[0] == name]
+            entry = self._entries.setdefault((name,) + key, _Entry())
+        for old_key in stale:
+            self.reset(*old_key)
+
+        if entry.created_at is not None:
+            return entry.value
+        with entry.lock:
+            if entry.created_at is None:
+                entry.value = factory(*key)
+                entry.created_at = time.time()
+            return entry.value
+
+    def reset(self, name: str, *key):
+        """Close and forget an instance; the next get() creates a fresh one"""
+        with self._lock:
+            entry = self._entries.pop((name,) + key, None)
+            close = self._factories[name][2]
+        if entry and entry.created_at is not None and close:
+            with entry.lock:
+                close(entry.value)
+
+    def check_health(self) -> Dict[str, Dict]:
+        """Run every created resource's health check and return the status"""
+        with self._lock:
+            entries = [(k, e, self._factories[k[0]][1]) for k, e in self._entries.items()]
+        for _, entry, health in entries:
+            if entry.created_at is None or health is None:
+                continue
+            try:
+                entry.healthy, entry.error = bool(health(entry.value)), None
+            except Exception as e:
+                entry.healthy, entry.error = False, str(e)
+            entry.checked_at = time.time()
+        return self.status()
+
+    def status(self) -> Dict[str, Dict]:
+        """Created resources with their age and last health result"""
+        now = time.time()
+        with self._lock:
+            items = list(self._entries.items())
+        return {
+            ":".join(str(part) for part in key): {
+                "age_seconds": round(now - entry.created_at, 1),
+                "healthy": entry.healthy,
+                "error": entry.error,
+                "checked_seconds_ago": round(now - entry.checked_at, 1) if entry.checked_at else None
+            }
+            for key, entry in items if entry.created_at is not None
+        }
+
+    def close_all(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            entries = sorted(((k, e) for k, e in self._entries.items() if e.created_at is not None),
+                             key=lambda item: item[1].created_at, reverse=True)
+            self._entries = {}
+        for key, entry in entries:
+            close = self._factories[key[0]][2]
+            if close:
+                try:
+                    close(entry.value)
+                except Exception as e:
+                    print(f"Error closing {key[0]}: {e}")
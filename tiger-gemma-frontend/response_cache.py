@@ -0,0 +1,142 @@
+import sqlite3
+import hashlib
+import json
+import time
+import threading
+from typing import Dict, Any, Optional
+
+from config import USERS
+
+class ResponseCache:
+    """Exact-match cache for /generate responses, stored in SQLite.
+
+    Entries are keyed by a hash of the full generation payload plus a
+    search fingerprint, expire after the persona's cache TTL and are
+    evicted least-recently-used once max_entries is reached.
+    """
+
+    def __init__(self, db_name: str = "response_cache.db", max_entries: int = 5000):
+        self.db_name = db_name
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_name, check_same_thread=False)
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self.init_database()
+
+    def init_database(self):
+        """Initialize cache table"""
+        with self._lock:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    user_type TEXT NOT NULL,
+                    response TEXT NOT NULL,  -- JSON string
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_hit_at REAL NOT NULL,
+                    hits INTEGER DEFAULT 0
+                )
+            ''')
+            self._conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_responses_last_hit ON responses (last_hit_at)
+            ''')
+            self._conn.commit()
+
+    def is_enabled(self, user_type: str) -> bool:
+        """Check the per-persona cache flag"""
+        user_config = USERS.get(user_type, {})
+        return user_config.get("cache_enabled", False) and user_config.get("cache_ttl_seconds", 0) > 0
+
+    @staticmethod
+    def make_key(payload: Dict[str, Any], search_fingerprint: str = "") -> str:
+        """Hash the generation payload and search fingerprint into a cache key"""
+        canonical = json.dumps({
+            "prompt": payload["prompt"],
+            "user_type": payload["user_type"],
+            "max_length": payload["max_length"],
+            "temperature": payload["temperature"],
+            "search_enabled": payload.get("search_enabled", False),
+            "search_fingerprint": search_fingerprint
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, payload: Dict[str, Any], search_fingerprint: str = "") -> Optional[Dict[str, Any]]:
+        """Return the cached response for a payload, or None"""
+        user_type = payload["user_type"]
+        key = self.make_key(payload, search_fingerprint)
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response, expires_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+
+            if row and row[1] > now:
+                self._conn.execute('''
+                    UPDATE responses SET last_hit_at = ?, hits = hits + 1 WHERE key = ?
+                ''', (now, key))
+                self._conn.commit()
+                self._record(user_type, "hits")
+                return json.loads(row[0])
+
+            if row:
+                # Expired entry
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._conn.commit()
+            self._record(user_type, "misses")
+            return None
+
+    def put(self, payload: Dict[str, Any], response: Dict[str, Any], search_fingerprint: str = ""):
+        """Store a response and evict the least recently used overflow"""
+        user_type = payload["user_type"]
+        ttl = USERS.get(user_type, {}).get("cache_ttl_seconds", 0)
+        key = self.make_key(payload, search_fingerprint)
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute('''
+                INSERT OR REPLACE INTO responses
+                    (key, user_type, response, created_at, expires_at, last_hit_at, hits)
+                VALUES (?, ?, ?, ?, ?, ?, 0)
+            ''', (key, user_type, json.dumps(response), now, now + ttl, now))
+
+            cursor = self._conn.execute('''
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY last_hit_at ASC
+                    LIMIT MAX(0, (SELECT COUNT(*) FROM responses) - ?)
+                )
+            ''', (self.max_entries,))
+            self._conn.commit()
+            self._record(user_type, "stores")
+            if cursor.rowcount > 0:
+                self._record(user_type, "evictions", cursor.rowcount)
+
+    def purge_expired(self) -> int:
+        """Delete expired entries, return the number removed"""
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM responses WHERE expires_at <= ?', (time.time(),))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def clear(self, user_type: Optional[str] = None):
+        """Drop all entries, or only those of one persona"""
+        with self._lock:
+            if user_type:
+                self._conn.execute('DELETE FROM responses WHERE user_type = ?', (user_type,))
+            else:
+                self._conn.execute('DELETE FROM responses')
+            self._conn.commit()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hit/miss counters and hit rate per persona since process start"""
+        with self._lock:
+            stats = {}
+            for user_type, counters in self._stats.items():
+                lookups = counters.get("hits", 0) + counters.get("misses", 0)
+                stats[user_type] = dict(counters)
+                stats[user_type]["hit_rate"] = round(counters.get("hits", 0) / lookups, 3) if lookups else 0.0
+            return stats
+
+    def _record(self, user_type: str, counter: str, amount: int = 1):
+        counters = self._stats.setdefault(user_type, {"hits": 0, "misses": 0, "stores": 0, "evictions": 0})
+        counters[counter] += amount
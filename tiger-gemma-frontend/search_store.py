@@ -0,0 +1,41 @@
+import sqlite3
+import hashlib
+import json
+from typing import Dict, Iterable, List
+
+# Search results are stored once in search_result_store, keyed by the hash
+# of their canonical JSON. Messages keep a JSON array of store ids.
+
+def search_result_hash(result: Dict) -> str:
+    """Content address of a single search result"""
+    canonical = json.dumps(result, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def intern_search_results(cursor: sqlite3.Cursor, results: List[Dict]) -> List[int]:
+    """Store results that aren't stored yet and return their ids in order"""
+    ids = []
+    for result in results:
+        digest = search_result_hash(result)
+        cursor.execute('''
+            INSERT INTO search_result_store (hash, result_type, payload) VALUES (?, ?, ?)
+            ON CONFLICT (hash) DO NOTHING
+        ''', (digest, result.get("type"), json.dumps(result, ensure_ascii=False)))
+        if cursor.rowcount == 1:
+            ids.append(cursor.lastrowid)
+        else:
+            cursor.execute('SELECT id FROM search_result_store WHERE hash = ?', (digest,))
+            ids.append(cursor.fetchone()[0])
+    return ids
+
+def fetch_search_results(conn: sqlite3.Connection, ids: Iterable[int]) -> Dict[int, Dict]:
+    """Decode stored results by id"""
+    ids = list(set(ids))
+    results = {}
+    # Stay well below SQLite's bound parameter limit
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        for result_id, payload in conn.execute(
+                f'SELECT id, payload FROM search_result_store WHERE id IN ({placeholders})', chunk):
+            results[result_id] = json.loads(payload)
+    return results
@@ -0,0 +1,224 @@
+import sqlite3
+import hashlib
+import json
+import random
+import re
+import time
+import threading
+from typing import Dict, Any, List, Optional, Set
+
+from config import USERS
+
+# Mersenne prime for the MinHash permutations
+_PRIME = (1 << 61) - 1
+
+# Currency symbols are spelled out so "1000€" and "1000 euro" match
+_CURRENCY = {"€": " euro ", "$": " dollar ", "£": " pound "}
+
+def normalize_tokens(text: str) -> Set[str]:
+    """Lowercase, strip punctuation and return the set of word tokens"""
+    text = text.lower()
+    for symbol, word in _CURRENCY.items():
+        text = text.replace(symbol, word)
+    return set(re.findall(r"\w+", text))
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    """Jaccard similarity of two token sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class MinHasher:
+    """MinHash signatures with banded LSH keys"""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 42):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, tokens: Set[str]) -> List[int]:
+        hashes = [int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "big")
+                  for t in tokens]
+        return [min((a * h + b) % _PRIME for h in hashes) for a, b in self._perms]
+
+    def band_keys(self, tokens: Set[str]) -> List[str]:
+        sig = self.signature(tokens)
+        keys = []
+        for band in range(self.bands):
+            chunk = sig[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(repr(chunk).encode(), digest_size=8).hexdigest()
+            keys.append(f"{band}:{digest}")
+        return keys
+
+class SemanticCache:
+    """Near-duplicate response cache keyed on the user's own wording.
+
+    Prompts are reduced to word-token sets and indexed with MinHash/LSH.
+    A lookup returns the freshest cached answer from the same context
+    bucket (persona plus generation settings) whose Jaccard similarity
+    reaches the threshold. Everything runs locally, no model needed.
+    Lookup events older than events_retention_days are pruned on write.
+    """
+
+    def __init__(self, db_name: str = "response_cache.db", threshold: float = 0.8,
+                 min_tokens: int = 3, max_entries: int = 5000, events_retention_days: float = 30):
+        self.db_name = db_name
+        self.threshold = threshold
+        self.min_tokens = min_tokens
+        self.max_entries = max_entries
+        self.events_retention = events_retention_days * 86400
+        self.hasher = MinHasher()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_name, check_same_thread=False)
+        self.init_database()
+
+    def init_database(self):
+        """Initialize semantic cache tables"""
+        with self._lock:
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS semantic_entries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    bucket TEXT NOT NULL,
+                    user_type TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    tokens TEXT NOT NULL,  -- space separated normalized tokens
+                    response TEXT NOT NULL,  -- JSON string
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    false_hits INTEGER DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS semantic_bands (
+                    band TEXT NOT NULL,
+                    entry_id INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_semantic_bands_band ON semantic_bands (band);
+                CREATE INDEX IF NOT EXISTS idx_semantic_bands_entry ON semantic_bands (entry_id);
+                CREATE TABLE IF NOT EXISTS semantic_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_at REAL NOT NULL,
+                    user_type TEXT NOT NULL,
+                    event TEXT NOT NULL,  -- hit, miss, false_hit
+                    similarity REAL,
+                    entry_id INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS idx_semantic_events_created ON semantic_events (created_at);
+            ''')
+            self._conn.commit()
+
+    def is_enabled(self, user_type: str) -> bool:
+        """Semantic lookups follow the persona's cache flag"""
+        user_config = USERS.get(user_type, {})
+        return user_config.get("cache_enabled", False) and user_config.get("cache_ttl_seconds", 0) > 0
+
+    def get(self, bucket: str, user_type: str, query: str) -> Optional[Dict[str, Any]]:
+        """Return the best fresh match as {"response", "entry_id", "similarity"}, or None"""
+        tokens = normalize_tokens(query)
+        if len(tokens) < self.min_tokens:
+            return None
+
+        bands = self.hasher.band_keys(tokens)
+        now = time.time()
+
+        with self._lock:
+            placeholders = ",".join("?" * len(bands))
+            rows = self._conn.execute(f'''
+                SELECT id, tokens, response FROM semantic_entries
+                WHERE bucket = ? AND expires_at > ? AND id IN (
+                    SELECT entry_id FROM semantic_bands WHERE band IN ({placeholders})
+                )
+                ORDER BY created_at DESC
+            ''', (bucket, now, *bands)).fetchall()
+
+            best = None
+            for entry_id, entry_tokens, response in rows:
+                similarity = jaccard(tokens, set(entry_tokens.split()))
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (entry_id, similarity, response)
+
+            if best is None:
+                self._log_event(user_type, "miss", None, None)
+                self._conn.commit()
+                return None
+
+            self._log_event(user_type, "hit", best[1], best[0])
+            self._conn.commit()
+            return {"response": json.loads(best[2]), "entry_id": best[0], "similarity": best[1]}
+
+    def put(self, bucket: str, user_type: str, query: str, response: Dict[str, Any]):
+        """Index a fresh response under the user's query"""
+        tokens = normalize_tokens(query)
+        if len(tokens) < self.min_tokens:
+            return
+
+        ttl = USERS.get(user_type, {}).get("cache_ttl_seconds", 0)
+        now = time.time()
+        bands = self.hasher.band_keys(tokens)
+
+        with self._lock:
+            cursor = self._conn.execute('''
+                INSERT INTO semantic_entries (bucket, user_type, query, tokens, response, created_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (bucket, user_type, query, " ".join(sorted(tokens)), json.dumps(response), now, now + ttl))
+            entry_id = cursor.lastrowid
+            self._conn.executemany('INSERT INTO semantic_bands (band, entry_id) VALUES (?, ?)',
+                                   [(band, entry_id) for band in bands])
+            self._evict_overflow()
+            self._prune_events()
+            self._conn.commit()
+
+    def report_false_hit(self, entry_id: int):
+        """User flagged a cached answer as not matching: log it and retire the entry"""
+        with self._lock:
+            row = self._conn.execute('SELECT user_type FROM semantic_entries WHERE id = ?',
+                                     (entry_id,)).fetchone()
+            if not row:
+                return
+            self._conn.execute('''
+                UPDATE semantic_entries SET false_hits = false_hits + 1, expires_at = 0 WHERE id = ?
+            ''', (entry_id,))
+            self._log_event(row[0], "false_hit", None, entry_id)
+            self._conn.commit()
+
+    def get_stats(self, since: float = 0) -> Dict[str, Dict[str, Any]]:
+        """Hits, misses, false hits and mean hit similarity per persona"""
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT user_type, event, COUNT(*), AVG(similarity) FROM semantic_events
+                WHERE created_at >= ? GROUP BY user_type, event
+            ''', (since,)).fetchall()
+
+        stats: Dict[str, Dict[str, Any]] = {}
+        for user_type, event, count, avg_similarity in rows:
+            entry = stats.setdefault(user_type, {"hits": 0, "misses": 0, "false_hits": 0})
+            entry[{"hit": "hits", "miss": "misses", "false_hit": "false_hits"}[event]] = count
+            if event == "hit":
+                entry["avg_hit_similarity"] = round(avg_similarity or 0, 3)
+        for entry in stats.values():
+            lookups = entry["hits"] + entry["misses"]
+            entry["hit_rate"] = round(entry["hits"] / lookups, 3) if lookups else 0.0
+            entry["false_hit_rate"] = round(entry["false_hits"] / entry["hits"], 3) if entry["hits"] else 0.0
+        return stats
+
+    def _log_event(self, user_type: str, event: str, similarity: Optional[float], entry_id: Optional[int]):
+        self._conn.execute('''
+            INSERT INTO semantic_events (created_at, user_type, event, similarity, entry_id)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (time.time(), user_type, event, similarity, entry_id))
+
+    def _prune_events(self):
+        self._conn.execute('DELETE FROM semantic_events WHERE created_at < ?',
+                           (time.time() - self.events_retention,))
+
+    def _evict_overflow(self):
+        stale = [row[0] for row in self._conn.execute('''
+            SELECT id FROM semantic_entries ORDER BY expires_at > ? ASC, created_at ASC
+            LIMIT MAX(0, (SELECT COUNT(*) FROM semantic_entries) - ?)
+        ''', (time.time(), self.max_entries)).fetchall()]
+        if stale:
+            placeholders = ",".join("?" * len(stale))
+            self._conn.execute(f'DELETE FROM semantic_bands WHERE entry_id IN ({placeholders})', stale)
+            self._conn.execute(f'DELETE FROM semantic_entries WHERE id IN ({placeholders})', stale)
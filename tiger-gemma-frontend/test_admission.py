@@ -0,0 +1,66 @@
+import pytest
+
+from admission import AdmissionCancelled, AdmissionQueue, AdmissionTimeout, QueueFull
+
+def test_sessions_take_turns_instead_of_first_come_first_served():
+    queue = AdmissionQueue(concurrency=1, max_per_owner=3)
+    busy = queue.submit("researcher", "busy")
+    a = [queue.submit("researcher", "a") for _ in range(3)]
+    b = [queue.submit("researcher", "b") for _ in range(2)]
+    assert busy.state == "admitted"
+
+    order = [t.owner for t in sorted(a + b, key=lambda t: (t.tag, t.id))]
+    assert order == ["a", "b", "a", "b", "a"]
+
+    queue.release(busy)
+    assert a[0].state == "admitted" and b[0].state == "waiting"
+    queue.release(a[0])
+    assert b[0].state == "admitted"
+
+def test_heavier_persona_gets_more_turns():
+    queue = AdmissionQueue(concurrency=1, max_per_owner=4, weights={"business": 2.0})
+    queue.submit("student", "busy")
+    light = [queue.submit("student", "light") for _ in range(2)]
+    heavy = [queue.submit("business", "heavy") for _ in range(4)]
+
+    order = [t.owner for t in sorted(light + heavy, key=lambda t: (t.tag, t.id))]
+    # Weight 2 advances the heavy session's tags half as fast
+    assert order == ["heavy", "light", "heavy", "heavy", "light", "heavy"]
+
+def test_per_owner_and_total_caps():
+    queue = AdmissionQueue(concurrency=1, max_queue=3, max_per_owner=2)
+    queue.submit("student", "running")
+    queue.submit("student", "a")
+    queue.submit("student", "a")
+    with pytest.raises(QueueFull):
+        queue.submit("student", "a")
+
+    queue.submit("student", "b")
+    with pytest.raises(QueueFull):
+        queue.submit("student", "c")
+    assert queue.status()["rejected"] == 2
+
+def test_batch_waits_for_enough_slots():
+    queue = AdmissionQueue(concurrency=2)
+    chat = queue.submit("student", "chat")
+    batch = queue.submit("student", "batch", slots=2)
+    assert batch.state == "waiting"
+
+    queue.release(chat)
+    assert batch.state == "admitted"
+    assert queue.status()["running"] == 2
+
+def test_wait_times_out_and_cancelled_tickets_raise():
+    queue = AdmissionQueue(concurrency=1)
+    queue.submit("student", "running")
+
+    late = queue.submit("student", "late")
+    with pytest.raises(AdmissionTimeout):
+        queue.wait(late, timeout=0.05, poll_seconds=0.01)
+    queue.release(late)
+
+    gone = queue.submit("student", "gone")
+    assert queue.cancel_owner("gone") == 1
+    with pytest.raises(AdmissionCancelled):
+        queue.wait(gone, timeout=1)
+    assert queue.status()["waiting"] == 0
@@ -0,0 +1,115 @@
+import pytest
+import requests
+
+import gpu_pool
+from aws_manager import AWSInstanceManager
+from ec2_simulator import SimulatedEC2
+from gpu_pool import Backend, BackendPool, NoHealthyBackend, PooledLLMClient
+
+PAYLOAD = {"prompt": "hi", "user_type": "student", "max_length": 20, "temperature": 0.5,
+           "search_enabled": False}
+
+class Response:
+    def __init__(self, status_code: int = 200, body=None):
+        self.status_code = status_code
+        self.body = body or {"response": "ok"}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} error", response=self)
+
+    def json(self):
+        return self.body
+
+def make_client(monkeypatch, outcomes):
+    """Pool of backends a and b; outcomes maps a backend URL to an exception or Response"""
+    backends = [Backend(name, url=f"http://{name}") for name in ("a", "b")]
+    for backend in backends:
+        backend.healthy = True
+    pool = BackendPool(backends, autoscale=False)
+    calls = []
+
+    def post(url, **kwargs):
+        base = url.rsplit("/", 1)[0]
+        calls.append(base)
+        outcome = outcomes.get(base, Response())
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(gpu_pool.requests, "post", post)
+    return PooledLLMClient(pool), pool, calls
+
+def test_connection_error_fails_over_and_marks_unhealthy(monkeypatch):
+    client, pool, calls = make_client(monkeypatch, {
+        "http://a": requests.exceptions.ConnectionError("refused")})
+
+    assert client._post_generate(PAYLOAD) == {"response": "ok"}
+    assert calls == ["http://a", "http://b"]
+    assert [b.name for b in pool.healthy_backends()] == ["b"]
+
+def test_connect_timeout_fails_over(monkeypatch):
+    client, pool, calls = make_client(monkeypatch, {
+        "http://a": requests.exceptions.ConnectTimeout("no answer")})
+
+    assert client._post_generate(PAYLOAD) == {"response": "ok"}
+    assert calls == ["http://a", "http://b"]
+
+def test_read_timeout_is_raised_without_failover(monkeypatch):
+    client, pool, calls = make_client(monkeypatch, {
+        "http://a": requests.exceptions.ReadTimeout("still generating")})
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client._post_generate(PAYLOAD)
+    assert calls == ["http://a"]
+    assert len(pool.healthy_backends()) == 2
+    assert all(b.in_flight == 0 for b in pool.backends)
+
+def test_client_error_is_raised_and_counted(monkeypatch):
+    client, pool, calls = make_client(monkeypatch, {"http://a": Response(422)})
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        client._post_generate(PAYLOAD)
+    assert calls == ["http://a"]
+    assert pool.backends[0].failures == 1 and pool.backends[0].served == 0
+
+def test_all_backends_down_raises_the_last_error(monkeypatch):
+    down = requests.exceptions.ConnectionError("refused")
+    client, pool, calls = make_client(monkeypatch, {"http://a": down, "http://b": down})
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client._post_generate(PAYLOAD)
+    with pytest.raises(NoHealthyBackend):
+        pool.acquire()
+
+def test_acquire_picks_the_least_loaded_backend():
+    backends = [Backend(name, url=f"http://{name}") for name in ("a", "b")]
+    for backend in backends:
+        backend.healthy = True
+    pool = BackendPool(backends, autoscale=False)
+
+    first = pool.acquire()
+    second = pool.acquire()
+    assert {first.name, second.name} == {"a", "b"}
+    pool.release(second)
+    assert pool.acquire().name == second.name
+
+def test_idle_shutdown_drains_below_min_active():
+    ec2 = SimulatedEC2(pending_seconds=0, stopping_seconds=0, jitter=0)
+    for instance_id in ("i-1", "i-2"):
+        ec2.add_instance(instance_id, "running")
+    backends = [Backend(i, manager=AWSInstanceManager(i, snapshot_ttl=0, ec2_client=ec2)) for i in ("i-1", "i-2")]
+    pool = BackendPool(backends, min_active=2, idle_shutdown_minutes=1)
+    last_activity = [pool.last_busy]
+    pool.activity_source = lambda: last_activity[0]
+
+    assert pool.autoscale() is None
+    # Recent activity keeps everything up
+    pool.last_busy -= 120
+    last_activity[0] = pool.last_busy + 90
+    assert pool.autoscale() is None
+
+    last_activity[0] -= 90
+    assert pool.autoscale() == "drain i-1, i-2"
+    pool._stop_drained()
+    assert [b.manager.get_status() for b in backends] == ["stopped", "stopped"]
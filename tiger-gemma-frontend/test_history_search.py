@@ -0,0 +1,70 @@
+import sqlite3
+
+from database import DatabaseManager
+
+def make_archived_conversation(db: DatabaseManager, user_id: int) -> int:
+    """One conversation with a sourced answer, idle long enough to be archived"""
+    conversation_id = db.get_or_create_conversation(user_id)
+    db.save_messages([
+        {"conversation_id": conversation_id, "is_user": True, "content": "How do glaciers carve fjords?",
+         "timestamp": "2020-01-01 10:00:00"},
+        {"conversation_id": conversation_id, "is_user": False, "content": "Glaciers erode valleys below sea level.",
+         "search_results": [{"title": "Fjord formation", "snippet": "Ice sheets deepen coastal valleys",
+                             "url": "https://example.org/fjords"}],
+         "search_used": True, "timestamp": "2020-01-01 10:00:05"}
+    ])
+    with db.transaction() as cursor:
+        cursor.execute("UPDATE conversations SET updated_at = '2020-01-01 10:00:05' WHERE id = ?",
+                       (conversation_id,))
+    assert db.archive_idle_conversations(idle_days=30)["conversations"] == 1
+    return conversation_id
+
+def test_search_finds_archived_conversation(tmp_path):
+    db = DatabaseManager(str(tmp_path / "chat.db"), pool_size=2)
+    user_id = db.create_or_get_user("researcher", "Dr. Researcher")
+    conversation_id = make_archived_conversation(db, user_id)
+
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 0
+
+    hits = db.search_messages(user_id, "fjords")
+    assert [hit["conversation_id"] for hit in hits] == [conversation_id]
+    assert hits[0]["is_user"] is True
+
+    # Sources of archived answers stay searchable too
+    source_hits = db.search_messages(user_id, "ice sheets")
+    assert source_hits and source_hits[0]["source_snippet"]
+    db.close()
+
+def test_deleting_user_drops_archived_search_rows(tmp_path):
+    db = DatabaseManager(str(tmp_path / "chat.db"), pool_size=2)
+    user_id = db.create_or_get_user("researcher", "Dr. Researcher")
+    make_archived_conversation(db, user_id)
+
+    status = db.delete_user_data(user_id)
+
+    assert status["deleted_messages"] == 2
+    assert status["deleted_archived_messages"] == 2
+    assert db.search_messages(user_id, "fjords") == []
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM messages_fts").fetchone()[0] == 0
+    db.close()
+
+def test_migration_reindexes_existing_archives(tmp_path):
+    db_name = str(tmp_path / "chat.db")
+    db = DatabaseManager(db_name, pool_size=2)
+    user_id = db.create_or_get_user("researcher", "Dr. Researcher")
+    make_archived_conversation(db, user_id)
+    db.close()
+
+    # Simulate a database archived before the index was kept: drop the rows and rerun migration 11
+    conn = sqlite3.connect(db_name)
+    conn.execute("DELETE FROM archived_messages")
+    conn.execute("DELETE FROM messages_fts")
+    conn.execute("PRAGMA user_version = 10")
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager(db_name, pool_size=2)
+    assert len(db.search_messages(user_id, "glaciers")) == 2
+    db.close()
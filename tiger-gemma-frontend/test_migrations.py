@@ -0,0 +1,78 @@
+import json
+import os
+import shutil
+import sqlite3
+
+from database import DatabaseManager
+from migrations import MIGRATIONS, get_schema_version, migrate
+
+# The committed history predates versioned migrations (user_version 0)
+BASELINE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_history.db")
+
+SOURCES = [{"title": "Fjord formation", "snippet": "Ice sheets deepen coastal valleys",
+            "url": "https://example.org/fjords", "source": "example.org"}]
+
+def baseline_copy(tmp_path) -> str:
+    """Copy of the baseline database plus one answer with inline search results"""
+    db_name = str(tmp_path / "chat_history.db")
+    shutil.copyfile(BASELINE_DB, db_name)
+    conn = sqlite3.connect(db_name)
+    conn.execute('''
+        INSERT INTO messages (conversation_id, is_user, content, search_results, search_used, timestamp)
+        VALUES (1, 0, 'Sourced answer', ?, 1, '2025-09-19 10:00:00')
+    ''', (json.dumps(SOURCES),))
+    conn.commit()
+    conn.close()
+    return db_name
+
+def read_baseline(db_name: str):
+    conn = sqlite3.connect(db_name)
+    users = conn.execute('SELECT id, username FROM users ORDER BY id').fetchall()
+    conversations = conn.execute('SELECT id, user_id FROM conversations ORDER BY id').fetchall()
+    messages = {}
+    for conversation_id, is_user, content, search_results, search_used, timestamp in conn.execute('''
+        SELECT conversation_id, is_user, content, search_results, search_used, timestamp
+        FROM messages ORDER BY timestamp, id
+    '''):
+        messages.setdefault(conversation_id, []).append({
+            "is_user": bool(is_user), "content": content,
+            "search_results": json.loads(search_results) if search_results else [],
+            "search_used": bool(search_used), "timestamp": timestamp
+        })
+    conn.close()
+    return users, conversations, messages
+
+def test_baseline_migrates_to_latest_keeping_contents(tmp_path):
+    db_name = baseline_copy(tmp_path)
+    users, conversations, messages = read_baseline(db_name)
+    assert users and messages
+
+    db = DatabaseManager(db_name, pool_size=2)
+    assert db.schema_version == MIGRATIONS[-1][0]
+
+    with db.connection() as conn:
+        assert conn.execute('SELECT id, username FROM users ORDER BY id').fetchall() == users
+        assert conn.execute('SELECT id, user_id FROM conversations ORDER BY id').fetchall() == conversations
+    for conversation_id, expected in messages.items():
+        assert db.get_conversation_messages(conversation_id) == expected
+
+    for user_id, _ in users:
+        user_messages = [m for c, u in conversations if u == user_id for m in messages.get(c, [])]
+        stats = db.get_user_stats(user_id)
+        assert stats["message_count"] == len(user_messages)
+        assert stats["search_count"] == sum(m["search_used"] for m in user_messages)
+    db.close()
+
+def test_migrating_again_is_a_no_op(tmp_path):
+    db_name = baseline_copy(tmp_path)
+    latest = migrate(db_name)
+
+    conn = sqlite3.connect(db_name)
+    schema = conn.execute('SELECT name, sql FROM sqlite_master ORDER BY name').fetchall()
+    conn.close()
+
+    assert migrate(db_name) == latest
+    conn = sqlite3.connect(db_name)
+    assert get_schema_version(conn) == latest
+    assert conn.execute('SELECT name, sql FROM sqlite_master ORDER BY name').fetchall() == schema
+    conn.close()
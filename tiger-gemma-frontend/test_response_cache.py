@@ -0,0 +1,56 @@
+import response_cache
+from config import USERS
+from response_cache import ResponseCache
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+def make_payload(prompt: str, user_type: str = "researcher") -> dict:
+    return {"prompt": prompt, "user_type": user_type, "max_length": 200, "temperature": 0.7,
+            "search_enabled": False}
+
+def test_entry_expires_after_persona_ttl(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache, "time", clock)
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    payload = make_payload("What is a fjord?")
+
+    cache.put(payload, {"response": "A flooded glacial valley."})
+    clock.now += USERS["researcher"]["cache_ttl_seconds"] - 1
+    assert cache.get(payload) == {"response": "A flooded glacial valley."}
+
+    clock.now += 1
+    assert cache.get(payload) is None
+    assert cache.get_stats()["researcher"]["hits"] == 1
+
+def test_search_fingerprint_is_part_of_the_key(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    payload = make_payload("Latest fjord research")
+
+    cache.put(payload, {"response": "old sources"}, search_fingerprint="search:1")
+    assert cache.get(payload, search_fingerprint="search:2") is None
+    assert cache.get(payload, search_fingerprint="search:1") == {"response": "old sources"}
+
+def test_evicts_least_recently_used(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache, "time", clock)
+    cache = ResponseCache(str(tmp_path / "cache.db"), max_entries=2)
+    first, second, third = (make_payload(p) for p in ("first", "second", "third"))
+
+    cache.put(first, {"response": "1"})
+    clock.now += 1
+    cache.put(second, {"response": "2"})
+    clock.now += 1
+    # A hit makes first the most recently used, so second goes
+    assert cache.get(first) is not None
+    clock.now += 1
+    cache.put(third, {"response": "3"})
+
+    assert cache.get(second) is None
+    assert cache.get(first) == {"response": "1"}
+    assert cache.get(third) == {"response": "3"}
+    assert cache.get_stats()["researcher"]["evictions"] == 1
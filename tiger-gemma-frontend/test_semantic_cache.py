@@ -0,0 +1,61 @@
+import semantic_cache
+from semantic_cache import SemanticCache, jaccard, normalize_tokens
+
+STORED = "best hiking boots for winter mountains"
+ANSWER = {"response": "Insulated leather boots with a stiff sole."}
+
+def make_cache(tmp_path, **kwargs) -> SemanticCache:
+    cache = SemanticCache(str(tmp_path / "cache.db"), **kwargs)
+    cache.put("bucket", "shopping", STORED, ANSWER)
+    return cache
+
+def test_rewording_matches_at_threshold(tmp_path):
+    cache = make_cache(tmp_path)
+
+    match = cache.get("bucket", "shopping", "Winter mountains: best boots for hiking?")
+    assert match["response"] == ANSWER
+    assert match["similarity"] == 1.0
+
+    # One extra word keeps 6 of 7 tokens in common, above 0.8
+    query = "best hiking boots for snowy winter mountains"
+    assert jaccard(normalize_tokens(query), normalize_tokens(STORED)) > 0.8
+    assert cache.get("bucket", "shopping", query)["response"] == ANSWER
+
+def test_below_threshold_is_a_miss(tmp_path):
+    cache = make_cache(tmp_path)
+
+    # One word swapped: 5 of 7 tokens in common
+    query = "best hiking boots for summer mountains"
+    assert jaccard(normalize_tokens(query), normalize_tokens(STORED)) < 0.8
+    assert cache.get("bucket", "shopping", query) is None
+
+    strict = make_cache(tmp_path, threshold=0.9)
+    assert strict.get("bucket", "shopping", "best hiking boots for snowy winter mountains") is None
+
+def test_other_bucket_and_short_queries_miss(tmp_path):
+    cache = make_cache(tmp_path)
+
+    assert cache.get("other-bucket", "shopping", STORED) is None
+    cache.put("bucket", "shopping", "boots", {"response": "too short to index"})
+    assert cache.get("bucket", "shopping", "boots") is None
+
+def test_false_hit_retires_the_entry(tmp_path):
+    cache = make_cache(tmp_path)
+    match = cache.get("bucket", "shopping", STORED)
+
+    cache.report_false_hit(match["entry_id"])
+
+    assert cache.get("bucket", "shopping", STORED) is None
+    stats = cache.get_stats()["shopping"]
+    assert (stats["hits"], stats["false_hits"]) == (1, 1)
+
+def test_old_events_are_pruned_on_write(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, events_retention_days=1)
+    cache.get("bucket", "shopping", "completely unrelated question about taxes")
+    assert cache.get_stats()["shopping"]["misses"] == 1
+
+    later = semantic_cache.time.time() + 2 * 86400
+    monkeypatch.setattr(semantic_cache, "time", type("Clock", (), {"time": staticmethod(lambda: later)}))
+    cache.put("bucket", "shopping", "lightweight trail running shoes review", ANSWER)
+
+    assert cache.get_stats() == {}
@@ -0,0 +1,79 @@
+import threading
+
+from database import DatabaseManager
+from write_queue import WriteBehindQueue
+
+def make_db(tmp_path):
+    db = DatabaseManager(str(tmp_path / "chat.db"), pool_size=4)
+    user_id = db.create_or_get_user("student", "Student Sam")
+    return db, db.get_or_create_conversation(user_id)
+
+def gate_writer(db: DatabaseManager):
+    """Hold the background writer inside its commit until release is set"""
+    committing, release = threading.Event(), threading.Event()
+    save_messages = db.save_messages
+
+    def gated(messages):
+        if threading.current_thread().name == "chat-write-behind":
+            committing.set()
+            release.wait(5)
+        save_messages(messages)
+
+    db.save_messages = gated
+    return committing, release
+
+def turn(conversation_id: int, n: int):
+    return [{"conversation_id": conversation_id, "is_user": True, "content": f"question {n}"},
+            {"conversation_id": conversation_id, "is_user": False, "content": f"answer {n}"}]
+
+def test_close_commits_everything_queued(tmp_path):
+    db, conversation_id = make_db(tmp_path)
+    writes = WriteBehindQueue(db, linger_ms=0)
+    for n in range(10):
+        writes.submit_many(turn(conversation_id, n))
+
+    writes.close()
+
+    contents = [m["content"] for m in db.get_conversation_messages(conversation_id)]
+    assert contents == [text for n in range(10) for text in (f"question {n}", f"answer {n}")]
+    assert writes.get_metrics()["messages_written"] == 20
+    assert not writes.is_running()
+    db.close()
+
+def test_waiting_turns_share_one_commit(tmp_path):
+    db, conversation_id = make_db(tmp_path)
+    committing, release = gate_writer(db)
+    writes = WriteBehindQueue(db, max_batch=200, linger_ms=0)
+
+    writes.submit_many(turn(conversation_id, 0))
+    assert committing.wait(5)
+    # Queued while the first commit is in progress
+    for n in range(1, 6):
+        writes.submit_many(turn(conversation_id, n))
+    release.set()
+    assert writes.flush(timeout=5)
+
+    metrics = writes.get_metrics()
+    assert metrics["messages_written"] == 12
+    assert metrics["batches"] == 2
+    assert metrics["max_batch_size"] == 10
+    writes.close()
+    db.close()
+
+def test_full_queue_falls_back_to_a_synchronous_write(tmp_path):
+    db, conversation_id = make_db(tmp_path)
+    committing, release = gate_writer(db)
+    writes = WriteBehindQueue(db, max_queue=1, put_timeout=0.05, linger_ms=0)
+
+    writes.submit_many(turn(conversation_id, 0))  # taken by the held writer
+    assert committing.wait(5)
+    writes.submit_many(turn(conversation_id, 1))  # fills the queue
+    writes.submit_many(turn(conversation_id, 2))  # no room: written on this thread
+
+    assert writes.get_metrics()["sync_fallback_writes"] == 1
+    assert [m["content"] for m in db.get_conversation_messages(conversation_id)] == ["question 2", "answer 2"]
+
+    release.set()
+    writes.close()
+    assert len(db.get_conversation_messages(conversation_id)) == 6
+    db.close()
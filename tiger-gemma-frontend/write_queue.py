@@ -0,0 +1,157 @@
+import atexit
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from database import DatabaseManager
+
+class WriteBehindQueue:
+    """Background writer that group-commits chat messages.
+
+    Sessions enqueue messages and return immediately; a single writer
+    thread drains the queue and commits up to max_batch messages per
+    transaction. When the queue is full, submit() waits up to put_timeout
+    and then writes synchronously, so a slow disk slows callers down
+    instead of dropping turns. Pending messages are flushed at exit.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, max_queue: int = 1000, max_batch: int = 200,
+                 linger_ms: float = 20, put_timeout: float = 2.0):
+        self.db_manager = db_manager
+        self.max_batch = max_batch
+        self.linger = linger_ms / 1000
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._metrics_lock = threading.Lock()
+        self._commit_ms = deque(maxlen=1000)
+        self._queued_ms = deque(maxlen=1000)
+        self._counters = {"messages_written": 0, "batches": 0, "max_batch_size": 0,
+                          "sync_fallback_writes": 0, "failed_messages": 0}
+
+        self._thread = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, conversation_id: int, is_user: bool, content: str,
+               search_results: Optional[List[Dict]] = None, search_used: bool = False):
+        """Queue one message for writing"""
+        self.submit_many([{
+            "conversation_id": conversation_id,
+            "is_user": is_user,
+            "content": content,
+            "search_results": search_results,
+            "search_used": search_used
+        }])
+
+    def submit_many(self, messages: List[Dict]):
+        """Queue messages that belong together, e.g. both halves of a turn"""
+        entry = (time.perf_counter(), messages)
+        if self._stopping.is_set():
+            self._write_sync(messages)
+            return
+        try:
+            self._queue.put(entry, timeout=self.put_timeout)
+        except queue.Full:
+            # Backpressure: the writer can't keep up, write on the caller's thread
+            self._write_sync(messages)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far is committed"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def is_running(self) -> bool:
+        return self._thread.is_alive() and not self._stopping.is_set()
+
+    def close(self, timeout: float = 30.0):
+        """Stop accepting background work and commit what is pending"""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    def get_metrics(self) -> Dict:
+        """Batch sizes, commit latency and queue depth"""
+        with self._metrics_lock:
+            metrics = dict(self._counters)
+            commit_ms = sorted(self._commit_ms)
+            queued_ms = sorted(self._queued_ms)
+        metrics["queue_depth"] = self._queue.qsize()
+        metrics["avg_batch_size"] = (round(metrics["messages_written"] / metrics["batches"], 2)
+                                     if metrics["batches"] else 0.0)
+        metrics["commit_p50_ms"] = _percentile(commit_ms, 50)
+        metrics["commit_p95_ms"] = _percentile(commit_ms, 95)
+        metrics["enqueue_to_commit_p95_ms"] = _percentile(queued_ms, 95)
+        return metrics
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            try:
+                first = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+
+            entries = [first]
+            size = len(first[1])
+            # Linger briefly so concurrent sessions share one commit
+            deadline = time.perf_counter() + self.linger
+            while size < self.max_batch:
+                try:
+                    remaining = deadline - time.perf_counter()
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                entries.append(entry)
+                size += len(entry[1])
+
+            try:
+                self._commit(entries)
+            finally:
+                for _ in entries:
+                    self._queue.task_done()
+
+    def _commit(self, entries: List):
+        messages = [message for _, batch in entries for message in batch]
+        started = time.perf_counter()
+        try:
+            self.db_manager.save_messages(messages)
+        except Exception as e:
+            print(f"Write-behind batch failed, retrying per turn: {e}")
+            for _, batch in entries:
+                try:
+                    self.db_manager.save_messages(batch)
+                except Exception as e:
+                    print(f"Dropping {len(batch)} unsaved messages: {e}")
+                    with self._metrics_lock:
+                        self._counters["failed_messages"] += len(batch)
+        finished = time.perf_counter()
+
+        with self._metrics_lock:
+            self._counters["batches"] += 1
+            self._counters["messages_written"] += len(messages)
+            self._counters["max_batch_size"] = max(self._counters["max_batch_size"], len(messages))
+            self._commit_ms.append((finished - started) * 1000)
+            for enqueued_at, _ in entries:
+                self._queued_ms.append((finished - enqueued_at) * 1000)
+
+    def _write_sync(self, messages: List[Dict]):
+        started = time.perf_counter()
+        self.db_manager.save_messages(messages)
+        with self._metrics_lock:
+            self._counters["sync_fallback_writes"] += 1
+            self._counters["messages_written"] += len(messages)
+            self._commit_ms.append((time.perf_counter() - started) * 1000)
+
+def _percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))], 2)